@@ -1,24 +1,22 @@
 import logging
 import sys
-import time
+from contextlib import nullcontext
 from datetime import datetime
-from functools import partial
 from pathlib import Path
 from typing import Annotated, Optional
 
 import typer
 
-from memium.core import main
-
 log = logging.getLogger(__name__)
 
 app = typer.Typer()
 
 
-@app.command()
+@app.callback(invoke_without_command=True)
 def cli(
+    ctx: typer.Context,
     input_dir: Annotated[
-        Path,
+        Optional[Path],  # noqa: UP007
         typer.Option(
             help="Where to extract prompts from.",
             dir_okay=True,
@@ -27,10 +25,12 @@ def cli(
             readable=True,
             writable=True,
         ),
-    ],
+    ] = None,
     watch_seconds: Annotated[
         Optional[int],  # noqa: UP007
-        typer.Option(help="Keep running, updating Anki deck every [ARG] seconds"),
+        typer.Option(
+            help="Keep running, updating Anki deck every [ARG] seconds. Only changed documents are parsed again, and status is written to .memium/daemon_status.json."
+        ),
     ] = None,
     deck_name: Annotated[
         str, typer.Option(help="Anki path to deck, e.g. 'Parent deck::Child deck'")
@@ -44,16 +44,117 @@ def cli(
     push_all: Annotated[
         bool,
         typer.Option(
-            help="Push all prompts to Anki, not just the diff. Useful if you have e.g. changed your CSS template. Note that this does not change scheduling, nor delete prompts that no longer exist in your markdown."
+            help="Push all prompts to Anki, not just the diff. Note that this does not change scheduling, nor delete prompts that no longer exist in your markdown. To only update the CSS, use --restyle instead."
+        ),
+    ] = False,
+    only_path: Annotated[
+        Optional[list[Path]],  # noqa: UP007
+        typer.Option(
+            help="Only sync documents in this folder or file. Notes from other documents are neither pushed nor deleted. Can be repeated.",
+            exists=True,
+        ),
+    ] = None,
+    only_tag: Annotated[
+        Optional[list[str]],  # noqa: UP007
+        typer.Option(
+            help="Only sync documents with this tag or a child of it, e.g. 'biology' also matches 'biology/cells'. Notes from other documents are neither pushed nor deleted. Can be repeated."
+        ),
+    ] = None,
+    restyle: Annotated[
+        bool,
+        typer.Option(
+            help="Only update the styling of memium's note types in Anki, e.g. after changing the CSS. Skips extracting and pushing prompts, so it takes seconds even for large decks."
+        ),
+    ] = False,
+    css_path: Annotated[
+        Optional[Path],  # noqa: UP007
+        typer.Option(
+            help="CSS for the cards, instead of memium's default styling. Used for both syncs and --restyle.",
+            dir_okay=False,
+            exists=True,
+            readable=True,
+        ),
+    ] = None,
+    direct_update_threshold: Annotated[
+        int,
+        typer.Option(
+            help="Pushes of at most this many cards update existing notes directly, instead of importing an .apkg. Set to 0 to always import."
+        ),
+    ] = 25,
+    export_apkg: Annotated[
+        Optional[Path],  # noqa: UP007
+        typer.Option(
+            help="Write all prompts to an .apkg at this path instead of syncing with Anki. Does not require Anki to be running.",
+            dir_okay=False,
+        ),
+    ] = None,
+    anki_collection: Annotated[
+        Optional[Path],  # noqa: UP007
+        typer.Option(
+            help="Path to your Anki collection.anki2. If set, the current state of the deck is read directly from the file, which is much faster for large collections. The file is only read, never written. Anki usually locks the file while a profile is open. The deck is then read via AnkiConnect instead, as without this option.",
+            dir_okay=False,
+            exists=True,
+            readable=True,
+        ),
+    ] = None,
+    reconcile_every: Annotated[
+        int,
+        typer.Option(
+            help="Between syncs, memium diffs against a local manifest of the deck instead of reading it from Anki. Read the full deck every [ARG] syncs to detect changes made outside memium."
+        ),
+    ] = 20,
+    full_reconcile: Annotated[
+        bool,
+        typer.Option(
+            help="Read the full deck from Anki on this sync, e.g. if you have edited or deleted memium's notes in Anki."
+        ),
+    ] = False,
+    prometheus_textfile: Annotated[
+        Optional[Path],  # noqa: UP007
+        typer.Option(
+            help="Also write per-stage metrics of each sync to this Prometheus textfile, e.g. for node_exporter's textfile collector. Metrics are always appended to .memium/metrics.jsonl.",
+            dir_okay=False,
+        ),
+    ] = None,
+    low_memory_diff: Annotated[
+        bool,
+        typer.Option(
+            help="Diff prompts using NumPy arrays, which uses less memory for very large decks. Requires `pip install memium[numpy]`."
         ),
     ] = False,
+    workers: Annotated[
+        Optional[int],  # noqa: UP007
+        typer.Option(
+            help="Read, extract and hash documents in a pipeline with [ARG] threads per stage, instead of one stage after the other. Only documents in the pipeline are held in memory. The result is the same. Not used with --watch-seconds.",
+            min=1,
+        ),
+    ] = None,
+    document_time_budget: Annotated[
+        Optional[float],  # noqa: UP007
+        typer.Option(
+            help="Skip documents which take longer than [ARG] seconds to sanitize or to extract prompts from with one extractor, e.g. a huge or malformed note. Documents are processed in separate processes, so they can be stopped. Skipped documents are recorded in .memium/slow_documents.json, and skipped on later syncs until they change.",
+            min=0,
+        ),
+    ] = None,
     dry_run: Annotated[
         bool, typer.Option(help="Don't update via AnkiConnect, just log what would happen")
     ] = False,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            help="Profile the sync, and write the profile and a summary of the slowest functions to .memium. Combine with --dry-run to profile without changing Anki."
+        ),
+    ] = False,
     skip_sync: Annotated[
         bool, typer.Option(help="Skip all syncing, useful for smoketesting of the interface")
     ] = False,
 ):
+    """Sync prompts from your markdown files to Anki."""
+    if ctx.invoked_subcommand is not None:
+        return
+    if input_dir is None:
+        raise typer.BadParameter("--input-dir is required to sync", param_hint="--input-dir")
+
     start_time = datetime.now()
     config_dir = input_dir / ".memium"
     config_dir.mkdir(exist_ok=True)
@@ -72,22 +173,132 @@ def cli(
         log.info("Skipping sync")
         return
 
-    main_fn = partial(
-        main,
-        base_deck=deck_name,
-        input_dir=input_dir,
-        max_deletions_per_run=max_deletions_per_run,
-        dry_run=dry_run,
-        push_all=push_all,
-    )
-    main_fn()
+    # Imported here, so e.g. --help does not load genanki, BeautifulSoup etc.
+    from memium.core import main, restyle_models, run_daemon
+    from memium.source.scope import SyncScope
+    from memium.utils.profiling import profiled
 
-    if watch_seconds:
-        log.info(
-            f"Sync complete in {(datetime.now() - start_time).total_seconds()} seconds, sleeping for {watch_seconds} seconds"
+    scope = SyncScope(paths=only_path or [], tags=only_tag or []) if only_path or only_tag else None
+    if scope is not None and watch_seconds:
+        raise typer.BadParameter(
+            "Scoped syncs cannot be combined with --watch-seconds", param_hint="--only-path"
+        )
+
+    card_css = css_path.read_text() if css_path else None
+    with profiled(config_dir) if profile else nullcontext():
+        if restyle:
+            restyle_models(
+                base_deck=deck_name, input_dir=input_dir, dry_run=dry_run, card_css=card_css
+            )
+            log.info(f"Restyle complete in {(datetime.now() - start_time).total_seconds()} seconds")
+        elif watch_seconds and export_apkg is None:
+            log.info(f"Syncing every {watch_seconds} seconds. Status is written to {config_dir}")
+            run_daemon(
+                base_deck=deck_name,
+                input_dir=input_dir,
+                max_deletions_per_run=max_deletions_per_run,
+                dry_run=dry_run,
+                watch_seconds=watch_seconds,
+                push_all=push_all,
+                direct_update_threshold=direct_update_threshold,
+                anki_collection=anki_collection,
+                low_memory_diff=low_memory_diff,
+                reconcile_every=reconcile_every,
+                full_reconcile=full_reconcile,
+                prometheus_textfile=prometheus_textfile,
+                card_css=card_css,
+                document_time_budget=document_time_budget,
+            )
+        else:
+            main(
+                base_deck=deck_name,
+                input_dir=input_dir,
+                max_deletions_per_run=max_deletions_per_run,
+                dry_run=dry_run,
+                push_all=push_all,
+                direct_update_threshold=direct_update_threshold,
+                export_apkg=export_apkg,
+                anki_collection=anki_collection,
+                low_memory_diff=low_memory_diff,
+                reconcile_every=reconcile_every,
+                full_reconcile=full_reconcile,
+                prometheus_textfile=prometheus_textfile,
+                card_css=card_css,
+                scope=scope,
+                workers=workers,
+                document_time_budget=document_time_budget,
+            )
+            log.info(f"Sync complete in {(datetime.now() - start_time).total_seconds()} seconds")
+
+
+@app.command()
+def index(
+    input_dir: Annotated[
+        Path,
+        typer.Option(
+            help="The directory to look up prompts in. Its index is updated on each sync.",
+            dir_okay=True,
+            file_okay=False,
+            exists=True,
+        ),
+    ],
+    uid: Annotated[
+        Optional[int],  # noqa: UP007
+        typer.Option(
+            help="Find the prompt with this UID, e.g. from the UUID field of an Anki card."
+        ),
+    ] = None,
+    document: Annotated[
+        Optional[Path],  # noqa: UP007
+        typer.Option(help="List the prompts in this document, relative to --input-dir."),
+    ] = None,
+    folder: Annotated[
+        Optional[Path],  # noqa: UP007
+        typer.Option(help="List the prompts in this folder, relative to --input-dir."),
+    ] = None,
+    tag: Annotated[
+        Optional[str],  # noqa: UP007
+        typer.Option(help="List the prompts from documents with this tag, or one of its children."),
+    ] = None,
+    deck: Annotated[
+        Optional[str],  # noqa: UP007
+        typer.Option(help="List the prompts in this deck, or one of its subdecks."),
+    ] = None,
+    count: Annotated[bool, typer.Option(help="Only print the number of matching prompts.")] = False,
+):
+    """Look up prompts in the local index, without extracting them."""
+    # Not importing memium.core keeps lookups fast
+    from memium.prompt_index import PromptIndex, prompt_index_path
+
+    index_path = prompt_index_path(input_dir)
+    if not index_path.exists():
+        raise typer.BadParameter(
+            f"No index at {index_path}, sync first to create it", param_hint="--input-dir"
+        )
+    prompt_index = PromptIndex(index_path, input_dir)
+
+    if uid is not None:
+        prompt = prompt_index.get_prompt(uid)
+        prompts = [prompt] if prompt else []
+    elif document is not None:
+        prompts = prompt_index.get_document_prompts(document)
+    elif tag is not None:
+        prompts = prompt_index.get_tag_prompts(tag)
+    elif deck is not None:
+        prompts = prompt_index.get_deck_prompts(deck)
+    elif count:
+        typer.echo(prompt_index.count_folder_prompts(folder or Path()))
+        return
+    else:
+        prompts = prompt_index.get_folder_prompts(folder or Path())
+
+    if count:
+        typer.echo(len(prompts))
+        return
+    for prompt in prompts:
+        typer.echo(
+            f"{prompt.path}:{prompt.line_nr}\t{prompt.deck}\t{prompt.scheduling_uid}\t{prompt.text}"
         )
-        time.sleep(watch_seconds)
-        main_fn()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+"""Benchmark PromptDiffDeterminer and NumpyPromptDiffDeterminer against the previous dictionary-based diff.
+
+Run with `python -m memium.benchmarks.bench_diff`.
+"""
+
+import argparse
+import time
+from collections.abc import Callable, Sequence
+
+from ..destination.destination import DeletePrompts, PromptDestinationCommand, PushPrompts
+from ..diff_determiner import GeneralSyncer, NumpyPromptDiffDeterminer, PromptDiffDeterminer
+from ..source.prompts.prompt import BasePrompt, DestinationPrompt
+from ..source.prompts.prompt_qa import QAWithoutDoc
+from ..source.prompts.prompt_uid import UIDPrompt
+
+
+def dict_based_sync(
+    source_prompts: Sequence[BasePrompt], destination_prompts: Sequence[DestinationPrompt]
+) -> Sequence[PromptDestinationCommand]:
+    """The diff before precomputing UIDs, for comparison."""
+    prompts_to_update = GeneralSyncer(
+        source={prompt.update_uid: prompt for prompt in source_prompts},
+        destination={prompt.prompt.update_uid: prompt for prompt in destination_prompts},
+    ).only_in_source()
+    prompts_to_delete = GeneralSyncer(
+        source={prompt.scheduling_uid: prompt for prompt in source_prompts},
+        destination={prompt.prompt.scheduling_uid: prompt for prompt in destination_prompts},
+    ).only_in_destination()
+    return [DeletePrompts(prompts_to_delete), PushPrompts(prompts_to_update)]
+
+
+def generate_prompts(
+    n: int, changed_fraction: float
+) -> tuple[Sequence[BasePrompt], Sequence[DestinationPrompt]]:
+    source_prompts = [
+        QAWithoutDoc(question=f"Question {i}?", answer=f"Answer {i}", add_tags=["tag"])
+        for i in range(n)
+    ]
+    n_changed = int(n * changed_fraction)
+
+    destination_prompts = [
+        DestinationPrompt(
+            UIDPrompt(
+                scheduling_uid=prompt.scheduling_uid,
+                update_uid=prompt.update_uid if i >= n_changed else 10**10 + i,
+                tags=prompt.tags,
+            ),
+            destination_id=str(i),
+        )
+        for i, prompt in enumerate(source_prompts)
+    ]
+    return source_prompts, destination_prompts
+
+
+def _time(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run(n: int, changed_fraction: float) -> None:
+    source_prompts, destination_prompts = generate_prompts(n, changed_fraction)
+
+    legacy_seconds = _time(lambda: dict_based_sync(source_prompts, destination_prompts))
+    diff_seconds = _time(lambda: PromptDiffDeterminer().diff(source_prompts, destination_prompts))
+    numpy_seconds = _time(
+        lambda: NumpyPromptDiffDeterminer().diff(source_prompts, destination_prompts)
+    )
+    diff = PromptDiffDeterminer().diff(source_prompts, destination_prompts)
+
+    print(f"{n} prompts on each side, {diff}")
+    print(f"Dictionary-based diff: {legacy_seconds:.2f}s")
+    print(f"Single-pass diff:      {diff_seconds:.2f}s")
+    print(f"Numpy diff:            {numpy_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--changed-fraction", type=float, default=0.01)
+    args = parser.parse_args()
+    run(n=args.n, changed_fraction=args.changed_fraction)
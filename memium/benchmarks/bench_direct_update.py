@@ -0,0 +1,79 @@
+"""Compare latency of direct note updates against .apkg imports, to choose the direct update threshold.
+
+Requires a running AnkiConnect. Run with `python -m memium.benchmarks.bench_direct_update`.
+"""
+
+import argparse
+import tempfile
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+from ..destination.ankiconnect.anki_converter import AnkiPromptConverter
+from ..destination.ankiconnect.ankiconnect_gateway import ANKICONNECT_URL, AnkiConnectGateway
+from ..destination.destination import PushPrompts
+from ..destination.destination_ankiconnect import AnkiConnectDestination
+from ..environment import host_input_dir, in_docker
+from ..source.prompts.prompt_qa import QAWithoutDoc
+
+BENCHMARK_DECK = "Memium Benchmark"
+
+
+def _prompts(n: int, tag: str) -> Sequence[QAWithoutDoc]:
+    return [
+        QAWithoutDoc(question=f"Benchmark question {i}", answer=f"Answer {i}", add_tags=[tag])
+        for i in range(n)
+    ]
+
+
+def _timed_push(
+    gateway: AnkiConnectGateway, prompts: Sequence[QAWithoutDoc], direct_update_threshold: int
+) -> float:
+    destination = AnkiConnectDestination(
+        gateway=gateway,
+        prompt_converter=AnkiPromptConverter(base_deck=BENCHMARK_DECK, card_css=""),
+        direct_update_threshold=direct_update_threshold,
+    )
+    start = time.perf_counter()
+    destination.update([PushPrompts(prompts)])
+    return time.perf_counter() - start
+
+
+def run(sizes: Sequence[int], ankiconnect_url: str) -> None:
+    tmp_write_dir = Path(tempfile.mkdtemp())
+    gateway = AnkiConnectGateway(
+        ankiconnect_url=ankiconnect_url,
+        base_deck=BENCHMARK_DECK,
+        tmp_read_dir=host_input_dir() if in_docker() else tmp_write_dir,
+        tmp_write_dir=tmp_write_dir,
+        max_deletions_per_run=max(sizes),
+        max_wait_seconds=0,
+    )
+
+    print(f"{'n_notes':>8} {'direct (s)':>12} {'apkg (s)':>12}")
+    crossover: int | None = None
+    for n in sizes:
+        # Create the notes, then time updating their tags through each path
+        _timed_push(gateway, _prompts(n, tag="Created"), direct_update_threshold=0)
+        direct_seconds = _timed_push(gateway, _prompts(n, tag="Direct"), direct_update_threshold=n)
+        apkg_seconds = _timed_push(gateway, _prompts(n, tag="Apkg"), direct_update_threshold=0)
+        print(f"{n:>8} {direct_seconds:>12.3f} {apkg_seconds:>12.3f}")
+
+        if crossover is None and apkg_seconds < direct_seconds:
+            crossover = n
+
+        gateway.delete_notes([note.noteId for note in gateway.get_all_note_infos()])
+
+    print(
+        f"Package imports are faster from {crossover} notes"
+        if crossover
+        else "Direct updates were faster for all sizes"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 25, 50, 100, 250])
+    parser.add_argument("--ankiconnect-url", default=ANKICONNECT_URL)
+    args = parser.parse_args()
+    run(sizes=args.sizes, ankiconnect_url=args.ankiconnect_url)
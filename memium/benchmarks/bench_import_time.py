@@ -0,0 +1,72 @@
+"""Measure cold-start latency of `python -m memium --help`, and which imports dominate it.
+
+Run with `python -m memium.benchmarks.bench_import_time`.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Sequence
+
+HEAVY_MODULES = ("genanki", "bs4", "markdown", "pydantic", "unidecode", "tqdm", "iterpy")
+
+
+def time_help(n_runs: int) -> Sequence[float]:
+    durations: list[float] = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-m", "memium", "--help"], capture_output=True, check=False
+        )
+        durations.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            # Still measures startup, e.g. if the installed click and typer versions cannot render help
+            print(f"`memium --help` exited with {result.returncode}")
+    return durations
+
+
+def slowest_imports(n: int) -> Sequence[tuple[int, str]]:
+    """The n imports with the highest cumulative import time in microseconds, from `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import memium.__main__"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    imports: list[tuple[int, str]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        imports.append((int(cumulative), module.strip()))
+    return sorted(imports, reverse=True)[:n]
+
+
+def loaded_heavy_modules() -> Sequence[str]:
+    code = f"import sys, memium.__main__; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    stdout = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return stdout.split()
+
+
+def run(n_runs: int, n_imports: int) -> None:
+    durations = time_help(n_runs)
+    print(
+        f"`memium --help` over {n_runs} runs: median {statistics.median(durations):.3f}s, min {min(durations):.3f}s"
+    )
+    print(f"Heavy modules loaded by importing memium.__main__: {loaded_heavy_modules() or 'none'}")
+    print("Slowest imports (cumulative):")
+    for cumulative_us, module in slowest_imports(n_imports):
+        print(f"  {cumulative_us / 1000:8.1f}ms  {module}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--imports", type=int, default=10)
+    args = parser.parse_args()
+    run(n_runs=args.runs, n_imports=args.imports)
@@ -0,0 +1,71 @@
+"""Measure memory held by documents, prompts, destination prompts and cards, using tracemalloc.
+
+Run with `python -m memium.benchmarks.bench_memory`.
+"""
+
+import argparse
+import gc
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from ..destination.ankiconnect.anki_converter import AnkiPromptConverter
+from ..source.document_source import MarkdownDocumentSource
+from ..source.extractors.extractor_cloze import ClozePromptExtractor
+from ..source.extractors.extractor_qa import QAPromptExtractor
+from ..source.extractors.extractor_table import TableExtractor
+from ..source.prompts.prompt import DestinationPrompt
+from ..source.prompts.prompt_uid import UIDPrompt
+from .synthetic_vault import VaultSpec, generate_vault
+
+
+def _mb(n_bytes: int) -> str:
+    return f"{n_bytes / 1e6:8.1f}MB"
+
+
+def run(spec: VaultSpec) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generate_vault(Path(tmp_dir), spec)
+
+        gc.collect()
+        tracemalloc.start()
+        documents = MarkdownDocumentSource(directory=Path(tmp_dir)).get_documents()
+        extractors = [
+            QAPromptExtractor(question_prefix="Q.", answer_prefix="A."),
+            ClozePromptExtractor(),
+            TableExtractor(),
+        ]
+        prompts = [p for doc in documents for e in extractors for p in e.extract_prompts(doc)]
+        # Documents are only referenced by prompts from here on
+        del documents
+        gc.collect()
+        after_prompts, _ = tracemalloc.get_traced_memory()
+
+        destination_prompts = [
+            DestinationPrompt(
+                UIDPrompt(scheduling_uid=i, update_uid=i, tags=list(p.tags)), destination_id=str(i)
+            )
+            for i, p in enumerate(prompts)
+        ]
+        after_destination, _ = tracemalloc.get_traced_memory()
+
+        converter = AnkiPromptConverter(base_deck="Benchmark", card_css="")
+        cards = [converter.prompt_to_card(p) for p in prompts]
+        after_cards, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(
+        f"{len(prompts)} prompts, {len(destination_prompts)} destination prompts, {len(cards)} cards"
+    )
+    print(f"Documents and prompts: {_mb(after_prompts)}")
+    print(f"Destination prompts:   {_mb(after_destination - after_prompts)}")
+    print(f"Cards:                 {_mb(after_cards - after_destination)}")
+    print(f"Peak:                  {_mb(peak)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--prompts-per-file", type=int, default=40)
+    args = parser.parse_args()
+    run(VaultSpec(n_files=args.files, prompts_per_file=args.prompts_per_file))
@@ -0,0 +1,218 @@
+"""Benchmark each stage of a sync on a synthetic vault, and compare against a stored baseline.
+
+Run with `python -m memium.benchmarks.suite --output results.json`. To check for regressions, store a run as a baseline and pass it with `--baseline`.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from ..destination.ankiconnect.anki_converter import AnkiPromptConverter
+from ..destination.ankiconnect.ankiconnect_gateway import SpieAnkiconnectGateway
+from ..destination.destination import PushPrompts
+from ..destination.destination_ankiconnect import AnkiConnectDestination
+from ..diff_determiner import PromptDiffDeterminer
+from ..source.document import Document
+from ..source.document_source import MarkdownDocumentSource
+from ..source.extractors.extractor import BasePromptExtractor
+from ..source.extractors.extractor_cloze import ClozePromptExtractor
+from ..source.extractors.extractor_qa import QAPromptExtractor
+from ..source.extractors.extractor_table import TableExtractor
+from ..source.prompts.prompt import BasePrompt, DestinationPrompt
+from ..source.prompts.prompt_qa import QAPrompt
+from ..source.prompts.prompt_uid import UIDPrompt
+from ..utils.hash_cleaned_str import clean_str, hash_str_to_int
+from ..utils.markdown_parser import to_html
+from .synthetic_vault import VaultSpec, generate_vault
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    seconds: float
+    """Fastest of the repeats, which is the least affected by noise."""
+    n_items: int
+
+    @property
+    def items_per_second(self) -> float:
+        return self.n_items / self.seconds if self.seconds > 0 else float("inf")
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    n_items: int
+    fn: Callable[[], object]
+    setup: Callable[[], None] = lambda: None
+
+
+def _time(benchmark: Benchmark, repeats: int) -> BenchmarkResult:
+    durations: list[float] = []
+    for _ in range(repeats):
+        benchmark.setup()
+        start = time.perf_counter()
+        benchmark.fn()
+        durations.append(time.perf_counter() - start)
+    return BenchmarkResult(seconds=min(durations), n_items=benchmark.n_items)
+
+
+def _extract_all(
+    extractors: Sequence[BasePromptExtractor], documents: Sequence[Document]
+) -> list[BasePrompt]:
+    return [prompt for doc in documents for e in extractors for prompt in e.extract_prompts(doc)]
+
+
+def _destination_prompts(prompts: Sequence[BasePrompt]) -> Sequence[DestinationPrompt]:
+    """The destination state after a previous sync, with 1% of prompts since edited."""
+    return [
+        DestinationPrompt(
+            UIDPrompt(
+                scheduling_uid=p.scheduling_uid,
+                update_uid=p.update_uid if i % 100 else p.update_uid + 1,
+                tags=p.tags,
+            ),
+            destination_id=str(i),
+        )
+        for i, p in enumerate(prompts)
+    ]
+
+
+def benchmarks(vault_dir: Path) -> Sequence[Benchmark]:
+    document_source = MarkdownDocumentSource(directory=vault_dir)
+    documents = document_source.get_documents()
+    extractors: Sequence[BasePromptExtractor] = [
+        QAPromptExtractor(question_prefix="Q.", answer_prefix="A."),
+        ClozePromptExtractor(),
+        TableExtractor(),
+    ]
+    prompts = _extract_all(extractors, documents)
+    qa_prompts = [p for p in prompts if isinstance(p, QAPrompt)]
+    destination_prompts = _destination_prompts(prompts)
+    converter = AnkiPromptConverter(base_deck="Benchmark", card_css="")
+
+    push_destination: list[AnkiConnectDestination] = []
+
+    def setup_push() -> None:
+        push_destination[:] = [
+            AnkiConnectDestination(gateway=SpieAnkiconnectGateway(), prompt_converter=converter)
+        ]
+
+    return [
+        Benchmark("document_source", len(documents), document_source.get_documents),
+        *[
+            Benchmark(
+                f"extract.{type(extractor).__name__}",
+                len(documents),
+                lambda extractor=extractor: _extract_all([extractor], documents),
+            )
+            for extractor in extractors
+        ],
+        Benchmark(
+            "clean_str", len(qa_prompts), lambda: [clean_str(p.question) for p in qa_prompts]
+        ),
+        Benchmark(
+            "hash_str_to_int",
+            len(qa_prompts),
+            lambda: [hash_str_to_int(p.question) for p in qa_prompts],
+        ),
+        Benchmark(
+            "uids", len(prompts), lambda: [(p.scheduling_uid, p.update_uid) for p in prompts]
+        ),
+        Benchmark(
+            "diff", len(prompts), lambda: PromptDiffDeterminer().diff(prompts, destination_prompts)
+        ),
+        Benchmark("to_html", len(qa_prompts), lambda: [to_html(p.answer) for p in qa_prompts]),
+        Benchmark(
+            "push_prompts",
+            len(prompts),
+            lambda: push_destination[0]._push_prompts(PushPrompts(prompts)),  # type: ignore[PrivateMethodUsage]
+            setup=setup_push,
+        ),
+    ]
+
+
+def run(spec: VaultSpec, repeats: int) -> Mapping[str, BenchmarkResult]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generate_vault(Path(tmp_dir), spec)
+        results: dict[str, BenchmarkResult] = {}
+        for benchmark in benchmarks(Path(tmp_dir)):
+            results[benchmark.name] = _time(benchmark, repeats)
+            print(
+                f"{benchmark.name:40} {results[benchmark.name].seconds:8.3f}s {results[benchmark.name].items_per_second:12.0f} items/s",
+                file=sys.stderr,
+            )
+    return results
+
+
+def to_json(spec: VaultSpec, results: Mapping[str, BenchmarkResult]) -> Mapping[str, object]:
+    return {
+        "spec": asdict(spec),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {
+            name: {**asdict(result), "items_per_second": result.items_per_second}
+            for name, result in results.items()
+        },
+    }
+
+
+def compare(
+    baseline: Mapping[str, object], current: Mapping[str, object], tolerance: float
+) -> Sequence[str]:
+    """Names of benchmarks which are more than tolerance slower than in the baseline, e.g. 0.2 for 20%."""
+    if baseline["spec"] != current["spec"]:
+        raise ValueError(
+            "The baseline was run with a different VaultSpec, results are not comparable"
+        )
+
+    baseline_results: Mapping[str, Mapping[str, float]] = baseline["results"]  # type: ignore
+    current_results: Mapping[str, Mapping[str, float]] = current["results"]  # type: ignore
+    regressions: list[str] = []
+    for name, result in current_results.items():
+        if name not in baseline_results:
+            continue
+        ratio = result["seconds"] / baseline_results[name]["seconds"]
+        print(f"{name:40} {ratio:6.2f}x baseline", file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=VaultSpec.n_files)
+    parser.add_argument("--prompts-per-file", type=int, default=VaultSpec.prompts_per_file)
+    parser.add_argument("--cloze-fraction", type=float, default=VaultSpec.cloze_fraction)
+    parser.add_argument("--table-fraction", type=float, default=VaultSpec.table_fraction)
+    parser.add_argument("--wikilink-density", type=float, default=VaultSpec.wikilink_density)
+    parser.add_argument("--tags-per-file", type=int, default=VaultSpec.tags_per_file)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", type=Path, help="Compare against results from this path")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.3, help="Allowed slowdown against the baseline"
+    )
+    args = parser.parse_args()
+
+    spec = VaultSpec(
+        n_files=args.files,
+        prompts_per_file=args.prompts_per_file,
+        cloze_fraction=args.cloze_fraction,
+        table_fraction=args.table_fraction,
+        wikilink_density=args.wikilink_density,
+        tags_per_file=args.tags_per_file,
+    )
+    current = to_json(spec, run(spec, repeats=args.repeats))
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+
+    if args.baseline:
+        regressions = compare(json.loads(args.baseline.read_text()), current, args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,113 @@
+"""Generate synthetic vaults of markdown documents with prompts, for benchmarking."""
+
+import random
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+WORDS = (
+    "memory spacing retrieval practice neuron synapse protein enzyme theorem proof vector matrix "
+    "entropy gradient market price contract river mountain empire treaty language grammar"
+).split()
+
+
+@dataclass(frozen=True)
+class VaultSpec:
+    n_files: int = 100
+    prompts_per_file: int = 10
+    cloze_fraction: float = 0.2
+    """Fraction of prompt blocks which are cloze deletions. The rest, excluding tables, are Q/A prompts."""
+    table_fraction: float = 0.1
+    """Fraction of prompt blocks which are tables. Each table yields table_rows prompts."""
+    table_rows: int = 3
+    wikilink_density: float = 0.1
+    """Fraction of words which are wikilinks. A quarter of those have an alias, e.g. [[Name|Alias]]."""
+    tags_per_file: int = 3
+    words_per_sentence: int = 8
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class SyntheticVault:
+    paths: Sequence[Path]
+    n_qa: int
+    n_cloze: int
+    n_table_prompts: int
+
+
+class _DocumentWriter:
+    def __init__(self, spec: VaultSpec, rng: random.Random) -> None:
+        self.spec = spec
+        self.rng = rng
+        self.n_qa = 0
+        self.n_cloze = 0
+        self.n_table_prompts = 0
+
+    def word(self, uid: int, allow_alias: bool = True) -> str:
+        word = f"{self.rng.choice(WORDS)}{uid}"
+        if self.rng.random() >= self.spec.wikilink_density:
+            return word
+        if allow_alias and self.rng.random() < 0.25:
+            return f"[[{word}|{self.rng.choice(WORDS)}]]"
+        return f"[[{word}]]"
+
+    def sentence(self, uid: int, allow_alias: bool = True) -> str:
+        # The uid makes each sentence, and thereby each prompt, unique
+        return " ".join(
+            self.word(uid, allow_alias=allow_alias) for _ in range(self.spec.words_per_sentence)
+        )
+
+    def qa(self, uid: int) -> str:
+        self.n_qa += 1
+        return f"Q. {self.sentence(uid)}?\nA. {self.sentence(uid)}."
+
+    def cloze(self, uid: int) -> str:
+        self.n_cloze += 1
+        return f"{self.sentence(uid)} {{{self.rng.choice(WORDS)}{uid}}} {self.sentence(uid)}."
+
+    def table(self, uid: int) -> str:
+        self.n_table_prompts += self.spec.table_rows
+        rows = [
+            f"| {self.sentence(uid * 1000 + row, allow_alias=False)} | {self.sentence(uid, allow_alias=False)} |"
+            for row in range(self.spec.table_rows)
+        ]
+        return "\n".join(
+            ["| Term | Definition |", "| --- | --- |", *rows, "Rowwise // |Term|? // |Definition|."]
+        )
+
+    def document(self, file_nr: int) -> str:
+        tags = " ".join(
+            f"#{self.rng.choice(WORDS)}/{self.rng.choice(WORDS)}"
+            for _ in range(self.spec.tags_per_file)
+        )
+        blocks = [f"# Document {file_nr}", tags]
+        for prompt_nr in range(self.spec.prompts_per_file):
+            uid = file_nr * self.spec.prompts_per_file + prompt_nr
+            kind = self.rng.random()
+            if kind < self.spec.table_fraction:
+                blocks.append(self.table(uid))
+            elif kind < self.spec.table_fraction + self.spec.cloze_fraction:
+                blocks.append(self.cloze(uid))
+            else:
+                blocks.append(self.qa(uid))
+            # Prose between prompts, as in real notes
+            blocks.append(f"{self.sentence(uid)}.")
+        return "\n\n".join(blocks) + "\n"
+
+
+def generate_vault(directory: Path, spec: VaultSpec) -> SyntheticVault:
+    """Write spec.n_files markdown documents to directory, spread over a few subfolders. The same spec always generates the same vault."""
+    writer = _DocumentWriter(spec, random.Random(spec.seed))
+    paths: list[Path] = []
+    for file_nr in range(spec.n_files):
+        path = directory / f"folder_{file_nr % 10}" / f"note_{file_nr}.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(writer.document(file_nr))
+        paths.append(path)
+
+    return SyntheticVault(
+        paths=paths,
+        n_qa=writer.n_qa,
+        n_cloze=writer.n_cloze,
+        n_table_prompts=writer.n_table_prompts,
+    )
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from ..source.document_source import MarkdownDocumentSource
+from ..source.extractors.extractor_cloze import ClozePromptExtractor
+from ..source.extractors.extractor_qa import QAPromptExtractor
+from ..source.extractors.extractor_table import TableExtractor
+from .synthetic_vault import VaultSpec, generate_vault
+
+
+def test_generated_vault_yields_expected_prompts(tmp_path: Path):
+    spec = VaultSpec(n_files=5, prompts_per_file=8, cloze_fraction=0.3, table_fraction=0.2)
+    vault = generate_vault(tmp_path, spec)
+    documents = MarkdownDocumentSource(tmp_path).get_documents()
+
+    assert len(documents) == spec.n_files
+    assert vault.n_qa + vault.n_cloze > 0
+    for extractor, expected in [
+        (QAPromptExtractor(question_prefix="Q.", answer_prefix="A."), vault.n_qa),
+        (ClozePromptExtractor(), vault.n_cloze),
+        (TableExtractor(), vault.n_table_prompts),
+    ]:
+        assert sum(len(extractor.extract_prompts(doc)) for doc in documents) == expected
+
+
+def test_generate_vault_is_deterministic(tmp_path: Path):
+    first = generate_vault(tmp_path / "first", VaultSpec(n_files=3))
+    second = generate_vault(tmp_path / "second", VaultSpec(n_files=3))
+
+    assert [p.read_text() for p in first.paths] == [p.read_text() for p in second.paths]
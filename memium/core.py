@@ -1,61 +1,368 @@
+import logging
+from collections.abc import Sequence
 from pathlib import Path
 
+from memium.daemon import SyncDaemon
+from memium.destination.ankiconnect.anki_collection_reader import AnkiCollectionReader
 from memium.destination.ankiconnect.anki_converter import AnkiPromptConverter
+from memium.destination.ankiconnect.anki_media import MediaCache, MediaReferences, MediaUploader
 from memium.destination.ankiconnect.ankiconnect_gateway import ANKICONNECT_URL, AnkiConnectGateway
-from memium.destination.destination import PushPrompts
+from memium.destination.destination import DeletePrompts, PromptDestination, PushPrompts
 from memium.destination.destination_ankiconnect import AnkiConnectDestination
+from memium.destination.destination_apkg import ApkgExportDestination
 from memium.destination.destination_dryrun import DryRunDestination
-from memium.diff_determiner import PromptDiffDeterminer
+from memium.destination.destination_manifest import ManifestDestination, SyncManifest
+from memium.destination.push_journal import PushJournal
+from memium.diff_determiner import NumpyPromptDiffDeterminer, PromptDiffDeterminer
 from memium.environment import host_input_dir, in_docker
-from memium.source.document_source import MarkdownDocumentSource
+from memium.prompt_index import PromptIndex, prompt_index_path
+from memium.source.document import Document
+from memium.source.document_source import FileNotRetrievedError, MarkdownDocumentSource
+from memium.source.extractors.extractor import BasePromptExtractor
 from memium.source.extractors.extractor_qa import QAPromptExtractor
 from memium.source.extractors.extractor_table import TableExtractor
-from memium.source.prompt_source import DocumentPromptSource
+from memium.source.prompt_source import (
+    DocumentPromptSource,
+    ExtractedPrompt,
+    IncrementalDocumentPromptSource,
+    deduplicate_extracted_prompts,
+    with_uids,
+)
+from memium.source.prompts.prompt import BasePrompt, DestinationPrompt
+from memium.source.scope import SyncScope
+from memium.source.time_budget import TimeBudget
+from memium.utils.background import run_in_background
+from memium.utils.metrics import MetricsWriter, recording, stage
+from memium.utils.pipeline import PipelineStage, run_pipeline
 
+log = logging.getLogger(__name__)
 
-def main(
+DEFAULT_CARD_CSS_PATH = (
+    Path(__file__).parent / "destination" / "ankiconnect" / "default_styling.css"
+)
+
+
+def _prompt_extractors() -> Sequence[BasePromptExtractor]:
+    return [QAPromptExtractor(question_prefix="Q.", answer_prefix="A."), TableExtractor()]
+
+
+def _extract_prompts(
+    document_source: MarkdownDocumentSource, workers: int | None = None
+) -> tuple[Sequence[ExtractedPrompt], Sequence[Path]]:
+    """Prompts, and the paths of the documents they were extracted from. Documents are released on return.
+
+    With workers, documents are read, extracted and hashed in a pipeline with that many threads per stage, so documents are released as soon as they are hashed. Prompts are in the same order either way.
+    """
+    prompt_source = DocumentPromptSource(
+        document_ingester=document_source,
+        prompt_extractors=_prompt_extractors(),
+        time_budget=document_source.time_budget,
+    )
+    if workers is None:
+        documents = document_source.get_documents()
+        prompts = prompt_source.get_prompts_from_documents(documents)
+        return with_uids(prompts), [document.source_path for document in documents]
+
+    def extract(
+        document: Document | FileNotRetrievedError,
+    ) -> tuple[Path, Sequence[BasePrompt]] | None:
+        if isinstance(document, FileNotRetrievedError) or not document_source.in_scope(document):
+            return None
+        return document.source_path, prompt_source.get_prompts_from_document(document)
+
+    def hash_uids(
+        extracted: tuple[Path, Sequence[BasePrompt]] | None,
+    ) -> tuple[Path, Sequence[ExtractedPrompt]] | None:
+        return None if extracted is None else (extracted[0], with_uids(extracted[1]))
+
+    documents = [
+        document
+        for document in run_pipeline(
+            document_source.get_paths(),
+            stages=[
+                PipelineStage("read", document_source.get_document, workers=workers),
+                PipelineStage("extract", extract, workers=workers),
+                PipelineStage("hash", hash_uids, workers=workers),
+            ],
+        )
+        if document is not None
+    ]
+    return deduplicate_extracted_prompts(
+        [prompt for _, prompts in documents for prompt in prompts]
+    ), [path for path, _ in documents]
+
+
+def _create_time_budget(input_dir: Path, seconds: float | None) -> TimeBudget | None:
+    if seconds is None:
+        return None
+    return TimeBudget(seconds, record_path=input_dir / ".memium" / "slow_documents.json")
+
+
+def _create_media_references(input_dir: Path) -> MediaReferences:
+    return MediaReferences(
+        root_dir=input_dir, cache=MediaCache(input_dir / ".memium" / "media_cache.json")
+    )
+
+
+def _create_gateway(
     base_deck: str,
     input_dir: Path,
     max_deletions_per_run: int,
-    dry_run: bool,
-    push_all: bool = False,
-):
-    # Setup gateway as first step. If Anki is not running, no need to parse all the prompts.
-    gateway = AnkiConnectGateway(
-        ankiconnect_url=ANKICONNECT_URL,
+    anki_collection: Path | None,
+    ankiconnect_url: str,
+) -> AnkiConnectGateway:
+    return AnkiConnectGateway(
+        ankiconnect_url=ankiconnect_url,
         base_deck=base_deck,
         tmp_read_dir=host_input_dir() if in_docker() else input_dir,
         tmp_write_dir=input_dir,
         max_deletions_per_run=max_deletions_per_run,
         max_wait_seconds=3600,
+        note_info_reader=AnkiCollectionReader(anki_collection) if anki_collection else None,
     )
 
-    dest_class = AnkiConnectDestination if not dry_run else DryRunDestination
-    destination = dest_class(
-        gateway=gateway,
-        prompt_converter=AnkiPromptConverter(
-            base_deck=base_deck,
-            card_css=Path("memium/destination/ankiconnect/default_styling.css").read_text(),
+
+def _create_destination(
+    base_deck: str,
+    input_dir: Path,
+    max_deletions_per_run: int,
+    dry_run: bool,
+    prompt_converter: AnkiPromptConverter,
+    direct_update_threshold: int,
+    export_apkg: Path | None,
+    anki_collection: Path | None,
+    reconcile_every: int,
+    full_reconcile: bool,
+    ankiconnect_url: str,
+    media_references: MediaReferences,
+) -> PromptDestination:
+    if export_apkg is not None:
+        # Exporting to an .apkg does not need Anki
+        return ApkgExportDestination(prompt_converter=prompt_converter, output_path=export_apkg)
+
+    gateway = _create_gateway(
+        base_deck=base_deck,
+        input_dir=input_dir,
+        max_deletions_per_run=max_deletions_per_run,
+        anki_collection=anki_collection,
+        ankiconnect_url=ankiconnect_url,
+    )
+    if dry_run:
+        return DryRunDestination(gateway=gateway, prompt_converter=prompt_converter)
+
+    return ManifestDestination(
+        destination=AnkiConnectDestination(
+            gateway=gateway,
+            prompt_converter=prompt_converter,
+            direct_update_threshold=direct_update_threshold,
+            push_journal=PushJournal(input_dir / ".memium" / "push_journal.txt"),
+            media_uploader=MediaUploader(gateway=gateway, references=media_references),
         ),
+        manifest=SyncManifest(input_dir / ".memium" / "sync_manifest.json"),
+        reconcile_every=reconcile_every,
+        full_reconcile=full_reconcile,
     )
 
-    # Get the inputs
-    source_prompts = DocumentPromptSource(
-        document_ingester=MarkdownDocumentSource(directory=input_dir),
-        prompt_extractors=[
-            QAPromptExtractor(question_prefix="Q.", answer_prefix="A."),
-            TableExtractor(),
-        ],
-    ).get_prompts()
-
-    # Get the updates
-    update_commands = (
-        [PushPrompts(prompts=source_prompts)]
-        if push_all
-        else PromptDiffDeterminer().sync(
-            source_prompts=source_prompts, destination_prompts=destination.get_all_prompts()
+
+def main(
+    base_deck: str,
+    input_dir: Path,
+    max_deletions_per_run: int,
+    dry_run: bool,
+    push_all: bool = False,
+    direct_update_threshold: int = 25,
+    export_apkg: Path | None = None,
+    anki_collection: Path | None = None,
+    low_memory_diff: bool = False,
+    reconcile_every: int = 20,
+    full_reconcile: bool = False,
+    prometheus_textfile: Path | None = None,
+    ankiconnect_url: str = ANKICONNECT_URL,
+    card_css: str | None = None,
+    scope: SyncScope | None = None,
+    workers: int | None = None,
+    document_time_budget: float | None = None,
+):
+    """Sync prompts from input_dir to Anki. With a scope, only prompts from documents in the scope are pushed or deleted. With workers, documents are processed in a pipeline, see _extract_prompts.
+
+    With a document_time_budget, each document is sanitized and extracted in a worker process, and steps taking longer than the budget in seconds are skipped, see TimeBudget. The notes of documents which are skipped, or fail to load, are kept as last indexed."""
+    with recording() as recorder:
+        prompt_converter = AnkiPromptConverter(
+            base_deck=base_deck, card_css=card_css or DEFAULT_CARD_CSS_PATH.read_text()
+        )
+        prompt_index = PromptIndex(prompt_index_path(input_dir), input_dir, prompt_converter)
+        media_references = _create_media_references(input_dir)
+
+        # Connect to Anki and fetch its current prompts in the background, so waiting for Anki overlaps with parsing the prompts.
+        # Errors from either are re-raised on .result().
+        def connect_and_fetch() -> tuple[PromptDestination, Sequence[DestinationPrompt]]:
+            with stage("connect"):
+                destination = _create_destination(
+                    base_deck=base_deck,
+                    input_dir=input_dir,
+                    max_deletions_per_run=max_deletions_per_run,
+                    dry_run=dry_run,
+                    prompt_converter=prompt_converter,
+                    direct_update_threshold=direct_update_threshold,
+                    export_apkg=export_apkg,
+                    anki_collection=anki_collection,
+                    reconcile_every=reconcile_every,
+                    full_reconcile=full_reconcile,
+                    ankiconnect_url=ankiconnect_url,
+                    media_references=media_references,
+                )
+            if push_all or scope is not None:
+                # Scoped syncs fetch their prompts once the documents in scope are known
+                return destination, []
+
+            with stage("remote_fetch") as timer:
+                destination_prompts = destination.get_all_prompts()
+                timer.add_items(len(destination_prompts))
+            return destination, destination_prompts
+
+        remote_future = run_in_background(connect_and_fetch)
+
+        # Get the inputs
+        time_budget = _create_time_budget(input_dir, document_time_budget)
+        document_source = MarkdownDocumentSource(
+            directory=input_dir, scope=scope, time_budget=time_budget
         )
+        try:
+            extracted_prompts, document_paths = _extract_prompts(document_source, workers=workers)
+        finally:
+            if time_budget is not None:
+                time_budget.close()
+        extracted_prompts = media_references.with_media_uids(extracted_prompts)
+        source_prompts = [p.prompt for p in extracted_prompts]
+
+        destination, destination_prompts = remote_future.result()
+
+        index_paths: list[Path] | None = None
+        if scope is not None:
+            # Documents which had prompts in the scope at the last sync, including deleted ones, so their notes can be deleted
+            scope_documents = prompt_index.get_scope_documents(
+                scope, existing_paths=document_source.get_paths(), in_scope_paths=document_paths
+            )
+            index_paths = [*document_paths, *(input_dir / d.path for d in scope_documents)]
+            if not push_all:
+                with stage("remote_fetch") as timer:
+                    destination_prompts = destination.get_prompts(
+                        {uid for d in scope_documents for uid in d.scheduling_uids}
+                    )
+                    timer.add_items(len(destination_prompts))
+
+        # Get the updates
+        if push_all:
+            update_commands = [PushPrompts(prompts=source_prompts)]
+        else:
+            # Diff on the UIDs computed at extraction, so prompts are not hashed again
+            prompt_by_uids = {id(p.uids): p.prompt for p in extracted_prompts}
+            diff = (
+                (NumpyPromptDiffDeterminer() if low_memory_diff else PromptDiffDeterminer())
+                .diff(
+                    source_prompts=[p.uids for p in extracted_prompts],
+                    destination_prompts=destination_prompts,
+                )
+                .keeping(prompt_index.get_scheduling_uids(document_source.incomplete_paths))
+            )
+            log.info(f"Diff: {diff}")
+            update_commands = [
+                DeletePrompts(prompts=diff.to_delete),
+                PushPrompts(prompts=[prompt_by_uids[id(p)] for p in diff.to_push]),
+            ]
+        # Send them
+
+        destination.update(commands=update_commands)
+
+        if not dry_run and export_apkg is None:
+            # The index records what is in Anki, e.g. so scoped syncs find the notes of deleted documents
+            prompt_index.update(
+                extracted_prompts,
+                only_paths=index_paths,
+                keep_paths=document_source.incomplete_paths,
+            )
+
+    MetricsWriter(input_dir / ".memium" / "metrics.jsonl", prometheus_textfile).write(recorder)
+
+
+def restyle_models(
+    base_deck: str,
+    input_dir: Path,
+    dry_run: bool,
+    card_css: str | None = None,
+    ankiconnect_url: str = ANKICONNECT_URL,
+):
+    """Update the styling of memium's note types in Anki. Does not extract, render or push any prompts."""
+    prompt_converter = AnkiPromptConverter(
+        base_deck=base_deck, card_css=card_css or DEFAULT_CARD_CSS_PATH.read_text()
+    )
+    gateway = _create_gateway(
+        base_deck=base_deck,
+        input_dir=input_dir,
+        max_deletions_per_run=0,
+        anki_collection=None,
+        ankiconnect_url=ankiconnect_url,
     )
-    # Send them
+    destination_type = DryRunDestination if dry_run else AnkiConnectDestination
+    destination_type(gateway=gateway, prompt_converter=prompt_converter).restyle()
 
-    destination.update(commands=update_commands)
+
+def run_daemon(
+    base_deck: str,
+    input_dir: Path,
+    max_deletions_per_run: int,
+    dry_run: bool,
+    watch_seconds: float,
+    push_all: bool = False,
+    direct_update_threshold: int = 25,
+    anki_collection: Path | None = None,
+    low_memory_diff: bool = False,
+    reconcile_every: int = 20,
+    full_reconcile: bool = False,
+    prometheus_textfile: Path | None = None,
+    ankiconnect_url: str = ANKICONNECT_URL,
+    card_css: str | None = None,
+    max_iterations: int | None = None,
+    document_time_budget: float | None = None,
+):
+    """Sync every watch_seconds, keeping state in memory between syncs."""
+    prompt_converter = AnkiPromptConverter(
+        base_deck=base_deck, card_css=card_css or DEFAULT_CARD_CSS_PATH.read_text()
+    )
+    time_budget = _create_time_budget(input_dir, document_time_budget)
+    media_references = _create_media_references(input_dir)
+    # A dry run writes nothing to Anki, so must not record its prompts as synced
+    prompt_index = (
+        None if dry_run else PromptIndex(prompt_index_path(input_dir), input_dir, prompt_converter)
+    )
+    daemon = SyncDaemon(
+        prompt_source=IncrementalDocumentPromptSource(
+            document_source=MarkdownDocumentSource(directory=input_dir, time_budget=time_budget),
+            prompt_extractors=_prompt_extractors(),
+        ),
+        destination=_create_destination(
+            base_deck=base_deck,
+            input_dir=input_dir,
+            max_deletions_per_run=max_deletions_per_run,
+            dry_run=dry_run,
+            prompt_converter=prompt_converter,
+            direct_update_threshold=direct_update_threshold,
+            export_apkg=None,
+            anki_collection=anki_collection,
+            reconcile_every=reconcile_every,
+            full_reconcile=full_reconcile,
+            ankiconnect_url=ankiconnect_url,
+            media_references=media_references,
+        ),
+        status_path=input_dir / ".memium" / "daemon_status.json",
+        diff_determiner=NumpyPromptDiffDeterminer() if low_memory_diff else PromptDiffDeterminer(),
+        push_all=push_all,
+        metrics_writer=MetricsWriter(input_dir / ".memium" / "metrics.jsonl", prometheus_textfile),
+        prompt_index=prompt_index,
+        media_references=media_references,
+    )
+    try:
+        daemon.run(interval_seconds=watch_seconds, max_iterations=max_iterations)
+    finally:
+        if time_budget is not None:
+            time_budget.close()
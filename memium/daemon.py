@@ -0,0 +1,151 @@
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+from .destination.ankiconnect.anki_media import MediaReferences
+from .destination.destination import DeletePrompts, PromptDestination, PushPrompts
+from .diff_determiner import PromptDiffDeterminer
+from .prompt_index import PromptIndex
+from .source.prompt_source import IncrementalDocumentPromptSource
+from .utils.metrics import MetricsWriter, recording, stage
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SyncStats:
+    finished_at: str
+    duration_seconds: float
+    n_documents: int
+    n_documents_extracted: int
+    n_prompts: int
+    n_pushed: int
+    n_deleted: int
+
+
+class SyncDaemon:
+    """Syncs repeatedly, keeping extracted prompts, the destination and its state in memory between syncs.
+
+    Only documents which changed since the previous sync are re-extracted. If a prompt_index is given, it is updated after each sync, and the notes of documents which could not be read or fully extracted are kept as last indexed. If media_references are given, prompts are pushed again when their images change. After each sync, health and statistics are written as JSON to status_path.
+    """
+
+    def __init__(
+        self,
+        prompt_source: IncrementalDocumentPromptSource,
+        destination: PromptDestination,
+        status_path: Path,
+        diff_determiner: PromptDiffDeterminer | None = None,
+        push_all: bool = False,
+        metrics_writer: MetricsWriter | None = None,
+        prompt_index: PromptIndex | None = None,
+        media_references: MediaReferences | None = None,
+    ) -> None:
+        self.prompt_source = prompt_source
+        self.destination = destination
+        self.status_path = status_path
+        self.diff_determiner = diff_determiner or PromptDiffDeterminer()
+        self.push_all = push_all
+        self.metrics_writer = metrics_writer
+        self.prompt_index = prompt_index
+        self.media_references = media_references
+        self.started_at = datetime.now().isoformat()
+        self.n_syncs = 0
+        self.n_failed_syncs = 0
+        self.last_sync: SyncStats | None = None
+        self.last_error: str | None = None
+
+    def sync_once(self) -> SyncStats:
+        with recording() as recorder:
+            stats = self._sync()
+        if self.metrics_writer is not None:
+            self.metrics_writer.write(recorder)
+        return stats
+
+    def _sync(self) -> SyncStats:
+        start = time.perf_counter()
+        extracted_prompts = self.prompt_source.get_prompts()
+        incomplete_paths = self.prompt_source.document_source.incomplete_paths
+        if self.media_references is not None:
+            # Images can change without their documents changing, so check them on every sync
+            extracted_prompts = self.media_references.with_media_uids(extracted_prompts)
+
+        pushing_all = self.push_all
+        if pushing_all:
+            commands = [PushPrompts(prompts=[p.prompt for p in extracted_prompts])]
+            n_pushed, n_deleted = len(extracted_prompts), 0
+        else:
+            # Diff on the UIDs computed at extraction, so unchanged documents are not hashed again
+            prompt_by_uids = {id(p.uids): p.prompt for p in extracted_prompts}
+            with stage("remote_fetch") as timer:
+                destination_prompts = self.destination.get_all_prompts()
+                timer.add_items(len(destination_prompts))
+            diff = self.diff_determiner.diff(
+                source_prompts=[p.uids for p in extracted_prompts],
+                destination_prompts=destination_prompts,
+            )
+            if self.prompt_index is not None:
+                # Keep the notes of documents which could not be read or fully extracted
+                diff = diff.keeping(self.prompt_index.get_scheduling_uids(incomplete_paths))
+            log.info(f"Diff: {diff}")
+            commands = [
+                DeletePrompts(prompts=diff.to_delete),
+                PushPrompts(prompts=[prompt_by_uids[id(p)] for p in diff.to_push]),
+            ]
+            n_pushed, n_deleted = len(diff.to_push), diff.n_deleted
+
+        self.destination.update(commands=commands)
+        if pushing_all:
+            # Only push everything until a sync succeeds, later syncs push the diff
+            self.push_all = False
+        if self.prompt_index is not None:
+            self.prompt_index.update(extracted_prompts, keep_paths=incomplete_paths)
+
+        self.n_syncs += 1
+        self.last_error = None
+        self.last_sync = SyncStats(
+            finished_at=datetime.now().isoformat(),
+            duration_seconds=round(time.perf_counter() - start, 3),
+            n_documents=self.prompt_source.n_documents,
+            n_documents_extracted=self.prompt_source.n_documents_extracted,
+            n_prompts=len(extracted_prompts),
+            n_pushed=n_pushed,
+            n_deleted=n_deleted,
+        )
+        self.write_status()
+        return self.last_sync
+
+    def status(self) -> dict[str, object]:
+        return {
+            "healthy": self.last_error is None,
+            "started_at": self.started_at,
+            "n_syncs": self.n_syncs,
+            "n_failed_syncs": self.n_failed_syncs,
+            "last_error": self.last_error,
+            "last_sync": asdict(self.last_sync) if self.last_sync else None,
+        }
+
+    def write_status(self) -> None:
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        self.status_path.write_text(json.dumps(self.status(), indent=2))
+
+    def run(self, interval_seconds: float, max_iterations: int | None = None) -> None:
+        iteration = 0
+        while max_iterations is None or iteration < max_iterations:
+            iteration += 1
+            try:
+                stats = self.sync_once()
+                log.info(
+                    f"Sync complete in {stats.duration_seconds} seconds, re-extracted {stats.n_documents_extracted}/{stats.n_documents} documents. Sleeping for {interval_seconds} seconds"
+                )
+            except Exception as e:
+                # Keep running, e.g. if Anki was closed, and retry on the next iteration
+                log.exception(f"Sync failed, retrying in {interval_seconds} seconds")
+                self.n_failed_syncs += 1
+                self.last_error = repr(e)
+                self.write_status()
+
+            if max_iterations is None or iteration < max_iterations:
+                time.sleep(interval_seconds)
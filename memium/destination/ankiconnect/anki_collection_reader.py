@@ -0,0 +1,133 @@
+import json
+import logging
+import sqlite3
+from collections.abc import Mapping, Sequence
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+
+from .ankiconnect_gateway import AnkiField, NoteInfo
+
+log = logging.getLogger(__name__)
+
+FIELD_SEPARATOR = "\x1f"
+
+
+@dataclass(frozen=True)
+class _NoteType:
+    name: str
+    field_names: Sequence[str]
+
+
+class AnkiCollectionReader:
+    """Reads notes directly from an Anki collection file, e.g. collection.anki2 in the Anki profile folder.
+
+    The collection is opened read-only, so it is never modified. A running Anki usually holds the collection locked, in which case reading raises sqlite3.OperationalError after lock_timeout_seconds. Supports both the legacy schema, where decks and note types are stored as JSON in the col table, and the current schema with separate tables.
+    """
+
+    def __init__(self, collection_path: Path, lock_timeout_seconds: float = 1) -> None:
+        self.collection_path = collection_path
+        self.lock_timeout_seconds = lock_timeout_seconds
+
+    def _connect(self) -> sqlite3.Connection:
+        # mode=ro never writes to the collection, but still reads changes from Anki's write-ahead log.
+        # Anki holds its lock while open, so waiting long for it is pointless.
+        conn = sqlite3.connect(
+            f"{self.collection_path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            timeout=self.lock_timeout_seconds,
+        )
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, table_name: str) -> bool:
+        return (
+            conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+            ).fetchone()
+            is not None
+        )
+
+    def _get_deck_names(self, conn: sqlite3.Connection) -> Mapping[int, str]:
+        if self._has_table(conn, "decks"):
+            return {
+                deck_id: name.replace(FIELD_SEPARATOR, "::")
+                for deck_id, name in conn.execute("SELECT id, name FROM decks")
+            }
+
+        (decks_json,) = conn.execute("SELECT decks FROM col").fetchone()
+        return {int(deck_id): deck["name"] for deck_id, deck in json.loads(decks_json).items()}
+
+    def _get_note_types(self, conn: sqlite3.Connection) -> Mapping[int, _NoteType]:
+        if self._has_table(conn, "notetypes"):
+            field_names: dict[int, list[str]] = {}
+            for note_type_id, field_name in conn.execute(
+                "SELECT ntid, name FROM fields ORDER BY ntid, ord"
+            ):
+                field_names.setdefault(note_type_id, []).append(field_name)
+
+            return {
+                note_type_id: _NoteType(name=name, field_names=field_names.get(note_type_id, []))
+                for note_type_id, name in conn.execute("SELECT id, name FROM notetypes")
+            }
+
+        (models_json,) = conn.execute("SELECT models FROM col").fetchone()
+        return {
+            int(model_id): _NoteType(
+                name=model["name"],
+                field_names=[
+                    field["name"] for field in sorted(model["flds"], key=lambda f: f["ord"])
+                ],
+            )
+            for model_id, model in json.loads(models_json).items()
+        }
+
+    @staticmethod
+    def _in_deck(deck_name: str, base_deck: str) -> bool:
+        # Matches Anki's 'deck:' search, which is case-insensitive and includes subdecks
+        return deck_name.casefold() == base_deck.casefold() or deck_name.casefold().startswith(
+            f"{base_deck.casefold()}::"
+        )
+
+    def get_note_infos(self, base_deck: str) -> Sequence[NoteInfo]:
+        with closing(self._connect()) as conn:
+            deck_ids = [
+                deck_id
+                for deck_id, deck_name in self._get_deck_names(conn).items()
+                if self._in_deck(deck_name, base_deck)
+            ]
+            if not deck_ids:
+                return []
+            note_types = self._get_note_types(conn)
+
+            placeholders = ", ".join("?" for _ in deck_ids)
+            rows = conn.execute(
+                f"""SELECT notes.id, notes.mid, notes.tags, notes.flds, group_concat(cards.id)
+                FROM cards JOIN notes ON notes.id = cards.nid
+                WHERE cards.did IN ({placeholders}) OR cards.odid IN ({placeholders})
+                GROUP BY notes.id""",
+                [*deck_ids, *deck_ids],
+            ).fetchall()
+
+        note_infos: list[NoteInfo] = []
+        for note_id, note_type_id, tags, fields, card_ids in rows:
+            note_type = note_types[note_type_id]
+            field_values = fields.split(FIELD_SEPARATOR)
+            note_infos.append(
+                NoteInfo(
+                    noteId=note_id,
+                    tags=tags.split(),
+                    fields={
+                        name: AnkiField(value=value, order=order)
+                        for order, (name, value) in enumerate(
+                            zip(note_type.field_names, field_values, strict=False)
+                        )
+                    },
+                    modelName=note_type.name,
+                    cards=[int(card_id) for card_id in card_ids.split(",")],
+                )
+            )
+
+        log.info(f"Read {len(note_infos)} notes from {self.collection_path}")
+        return note_infos
@@ -1,6 +1,11 @@
+from collections.abc import Sequence
+
+import genanki
+
 from ...source.prompts.prompt import BasePrompt, DestinationPrompt
 from ...source.prompts.prompt_cloze import ClozePrompt, ClozeWithoutDoc
 from ...source.prompts.prompt_qa import QAPrompt, QAWithoutDoc
+from ...source.prompts.prompt_uid import UIDPrompt
 from .anki_prompt import AnkiPrompt
 from .anki_prompt_cloze import AnkiCloze
 from .anki_prompt_qa import AnkiQA
@@ -13,7 +18,15 @@ class AnkiPromptConverter:
         self.deck_prefix = deck_prefix
         self.card_css = card_css
 
-    def prompt_to_card(self, prompt: BasePrompt) -> AnkiPrompt:
+    @property
+    def models(self) -> Sequence[genanki.Model]:
+        """The note types of all cards. They only depend on the css."""
+        return [AnkiQA.model_for_css(self.card_css), AnkiCloze.model_for_css(self.card_css)]
+
+    def prompt_to_card(self, prompt: BasePrompt, uids: UIDPrompt | None = None) -> AnkiPrompt:
+        """If uids are given, e.g. computed at extraction, they are used instead of hashing the prompt again."""
+        scheduling_uid = prompt.scheduling_uid if uids is None else uids.scheduling_uid
+        update_uid = prompt.update_uid if uids is None else uids.update_uid
         deck_in_tags = [tag for tag in prompt.tags if tag.startswith(self.deck_prefix)]
         deck = deck_in_tags[0] if deck_in_tags else self.base_deck
 
@@ -25,7 +38,8 @@ class AnkiPromptConverter:
                     base_deck=deck,
                     tags=prompt.tags,
                     css=self.card_css,
-                    uuid=prompt.scheduling_uid,
+                    uuid=scheduling_uid,
+                    update_uid=update_uid,
                     edit_url=prompt.edit_url,
                 )
             case ClozePrompt():
@@ -34,13 +48,32 @@ class AnkiPromptConverter:
                     base_deck=deck,
                     tags=prompt.tags,
                     css=self.card_css,
-                    uuid=prompt.scheduling_uid,
+                    uuid=scheduling_uid,
+                    update_uid=update_uid,
                     edit_url=prompt.edit_url,
                 )
             case BasePrompt():
                 raise ValueError("BasePrompt is the base class for all prompts, use a subclass")
 
+    @staticmethod
+    def _stored_uid(note_info: NoteInfo, field_name: str) -> int | None:
+        field = note_info.fields.get(field_name)
+        if field is None or not field.value.strip().isdigit():
+            return None
+        return int(field.value)
+
     def note_info_to_prompt(self, note_info: NoteInfo) -> DestinationPrompt:
+        # Read the UIDs stored on the note. Re-hashing the rendered fields is expensive, so only do it for legacy notes which predate the stored UIDs.
+        scheduling_uid = self._stored_uid(note_info, "UUID")
+        update_uid = self._stored_uid(note_info, "UpdateUID")
+        if scheduling_uid is not None and update_uid is not None:
+            return DestinationPrompt(
+                UIDPrompt(
+                    scheduling_uid=scheduling_uid, update_uid=update_uid, tags=note_info.tags
+                ),
+                destination_id=str(note_info.noteId),
+            )
+
         if "Question" in note_info.fields and "Answer" in note_info.fields:
             return DestinationPrompt(
                 QAWithoutDoc(
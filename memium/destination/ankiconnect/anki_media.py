@@ -0,0 +1,245 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import re
+from collections.abc import Collection, Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import unquote
+
+from ...source.prompt_source import ExtractedPrompt
+from ...source.prompts.prompt import BasePrompt
+from ...source.prompts.prompt_cloze import ClozePrompt
+from ...source.prompts.prompt_from_doc import PromptFromDocMixin
+from ...source.prompts.prompt_qa import QAPrompt
+from ...utils.hash_cleaned_str import hash_str_to_int
+from ...utils.metrics import stage
+from .anki_prompt import AnkiPrompt
+from .anki_prompt_cloze import AnkiCloze
+from .anki_prompt_qa import AnkiQA
+from .ankiconnect_gateway import AnkiConnectGateway
+
+log = logging.getLogger(__name__)
+
+# The reference is the second group, e.g. ![alt](images/cell.png "title") and <img src="images/cell.png">
+MARKDOWN_IMAGE = re.compile(r"(!\[[^\]]*\]\()([^)\s]+)((?:\s+\"[^\"]*\")?\))")
+HTML_IMAGE = re.compile(r"""(<img\b[^>]*?\bsrc=["'])([^"']+)(["'])""", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class CachedFile:
+    mtime_ns: int
+    size: int
+    sha256: str
+
+
+class MediaCache:
+    """Stores the hashes of media files, and which have been stored in Anki, so unchanged files are neither hashed nor stored again. Stored files are checked against Anki before they are skipped, see MediaUploader."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._hashes: dict[str, CachedFile] | None = None
+        self._stored: set[str] = set()
+
+    def _load(self) -> dict[str, CachedFile]:
+        if self._hashes is not None:
+            return self._hashes
+
+        self._hashes = {}
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text())
+                self._hashes = {
+                    path: CachedFile(*cached_file) for path, cached_file in data["hashes"].items()
+                }
+                self._stored = set(data["stored"])
+            except (ValueError, KeyError, TypeError) as e:
+                log.warning(f"Ignoring unreadable media cache at {self.path}: {e}")
+        return self._hashes
+
+    def sha256(self, path: Path) -> str:
+        hashes = self._load()
+        stat = path.stat()
+        cached = hashes.get(str(path))
+        if cached is None or (cached.mtime_ns, cached.size) != (stat.st_mtime_ns, stat.st_size):
+            with path.open("rb") as f:
+                # Reads the file in chunks, so large files are not loaded into memory
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            cached = CachedFile(mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=digest)
+            hashes[str(path)] = cached
+        return cached.sha256
+
+    def is_stored(self, anki_filename: str) -> bool:
+        self._load()
+        return anki_filename in self._stored
+
+    def mark_stored(self, anki_filenames: Sequence[str]) -> None:
+        self._load()
+        self._stored.update(anki_filenames)
+
+    def forget_stored(self, anki_filenames: Collection[str]) -> None:
+        self._load()
+        self._stored.difference_update(anki_filenames)
+
+    def save(self) -> None:
+        hashes = self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "hashes": {path: dataclasses.astuple(cached) for path, cached in hashes.items()},
+            "stored": sorted(self._stored),
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data))
+        tmp_path.replace(self.path)
+
+
+class MediaReferences:
+    """Finds the local images referenced by prompts and cards, and names them in Anki.
+
+    References are resolved relative to the prompt's document, then to root_dir. Files are named in Anki by a hash of their content, so identical files are only stored once, and changed files get a new name. Cards get an update UID which includes these names, so their notes are pushed again when an image changes.
+    """
+
+    def __init__(self, root_dir: Path, cache: MediaCache) -> None:
+        self.root_dir = root_dir
+        self.cache = cache
+
+    def _resolve(self, reference: str, document_dir: Path | None) -> Path | None:
+        if "://" in reference or reference.startswith("data:"):
+            return None
+
+        relative_path = unquote(reference)
+        for base_dir in [document_dir, self.root_dir]:
+            if base_dir is None:
+                continue
+            path = base_dir / relative_path
+            # Only files in the input dir are available to Anki when running in Docker
+            if path.is_file() and path.resolve().is_relative_to(self.root_dir.resolve()):
+                return path
+        return None
+
+    def _anki_filename(self, path: Path) -> str:
+        return f"memium-{self.cache.sha256(path)[:20]}{path.suffix.lower()}"
+
+    def _replace_references(
+        self, text: str, document_dir: Path | None, files: dict[str, Path]
+    ) -> str:
+        def replace(match: re.Match[str]) -> str:
+            path = self._resolve(match.group(2), document_dir)
+            if path is None:
+                return match.group(0)
+            anki_filename = self._anki_filename(path)
+            files[anki_filename] = path
+            return f"{match.group(1)}{anki_filename}{match.group(3)}"
+
+        return HTML_IMAGE.sub(replace, MARKDOWN_IMAGE.sub(replace, text))
+
+    @staticmethod
+    def _update_uid(update_uid: int, anki_filenames: Collection[str]) -> int:
+        if not anki_filenames:
+            return update_uid
+        return hash_str_to_int(f"{update_uid}:{':'.join(sorted(anki_filenames))}")
+
+    @staticmethod
+    def _document_dir(prompt: BasePrompt) -> Path | None:
+        if isinstance(prompt, PromptFromDocMixin):
+            return prompt.parent_doc.source_path.parent
+        return None
+
+    def with_media(
+        self, prompt: BasePrompt, card: AnkiPrompt, files: dict[str, Path]
+    ) -> AnkiPrompt:
+        """The card, converted from prompt, with references to the media's names in Anki. Adds the referenced files to files, keyed by their name in Anki."""
+        document_dir = self._document_dir(prompt)
+        card_files: dict[str, Path] = {}
+        match card:
+            case AnkiQA():
+                card = dataclasses.replace(
+                    card,
+                    question=self._replace_references(card.question, document_dir, card_files),
+                    answer=self._replace_references(card.answer, document_dir, card_files),
+                )
+            case AnkiCloze():
+                card = dataclasses.replace(
+                    card, text=self._replace_references(card.text, document_dir, card_files)
+                )
+            case _:
+                return card
+
+        files.update(card_files)
+        return dataclasses.replace(card, update_uid=self._update_uid(card.update_uid, card_files))
+
+    def _prompt_files(self, prompt: BasePrompt) -> dict[str, Path]:
+        match prompt:
+            case QAPrompt():
+                texts = [prompt.question, prompt.answer]
+            case ClozePrompt():
+                texts = [prompt.text]
+            case _:
+                texts = []
+
+        files: dict[str, Path] = {}
+        for text in texts:
+            self._replace_references(text, self._document_dir(prompt), files)
+        return files
+
+    def with_media_uids(self, prompts: Sequence[ExtractedPrompt]) -> Sequence[ExtractedPrompt]:
+        """The prompts with the update UIDs their cards get from with_media, so prompts whose images changed are pushed again."""
+        updated: list[ExtractedPrompt] = []
+        has_media = False
+        with stage("media_uids", n_items=len(prompts)):
+            for extracted in prompts:
+                files = self._prompt_files(extracted.prompt)
+                if not files:
+                    updated.append(extracted)
+                    continue
+
+                has_media = True
+                update_uid = self._update_uid(extracted.uids.update_uid, files)
+                updated.append(
+                    ExtractedPrompt(
+                        prompt=extracted.prompt,
+                        uids=dataclasses.replace(extracted.uids, update_uid=update_uid),
+                    )
+                )
+
+        if has_media:
+            # Keep the hashes, so unchanged images are not hashed again on the next sync
+            self.cache.save()
+        return updated
+
+
+class MediaUploader:
+    """Stores local images referenced by cards in Anki's media folder, and points the cards to them, see MediaReferences."""
+
+    def __init__(self, gateway: AnkiConnectGateway, references: MediaReferences) -> None:
+        self.gateway = gateway
+        self.references = references
+
+    def upload(
+        self, prompts: Sequence[BasePrompt], cards: Sequence[AnkiPrompt]
+    ) -> Sequence[AnkiPrompt]:
+        """Store the media of the cards, which were converted from prompts, and return the cards with references to the stored media."""
+        files: dict[str, Path] = {}
+        cards = [
+            self.references.with_media(prompt, card, files)
+            for prompt, card in zip(prompts, cards, strict=True)
+        ]
+
+        cache = self.references.cache
+        cached_filenames = [name for name in files if cache.is_stored(name)]
+        if cached_filenames:
+            # Files may have been deleted in Anki since they were stored, e.g. by Check Media
+            stored_filenames = self.gateway.get_stored_media_files(cached_filenames)
+            cache.forget_stored(set(cached_filenames) - stored_filenames)
+
+        new_files: Mapping[str, Path] = {
+            anki_filename: path
+            for anki_filename, path in files.items()
+            if not cache.is_stored(anki_filename)
+        }
+        if files:
+            self.gateway.store_media_files(new_files)
+            cache.mark_stored(list(new_files))
+            cache.save()
+        return cards
@@ -0,0 +1,68 @@
+import itertools
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from collections.abc import Iterable
+from pathlib import Path
+
+import genanki
+from genanki.apkg_col import APKG_COL  # type: ignore
+from genanki.apkg_schema import APKG_SCHEMA  # type: ignore
+
+from ...utils.hash_cleaned_str import clean_str, hash_str_to_int
+from .anki_prompt import AnkiPrompt
+
+# Fixed zip entry timestamps, so the same cards always result in the same file
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def genanki_deck(deck_name: str) -> genanki.Deck:
+    return genanki.Deck(name=deck_name, deck_id=hash_str_to_int(clean_str(deck_name)))
+
+
+def write_apkg(
+    cards: Iterable[AnkiPrompt], path: Path, timestamp: float, flush_every: int = 1000
+) -> int:
+    """Write cards to an .apkg in a single pass. Returns the number of cards written.
+
+    Unlike genanki.Package.write_to_file, notes are flushed to the collection every flush_every cards, so memory use does not grow with the number of cards, and the output only depends on the cards and the timestamp.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection_path = Path(tmp_dir) / "collection.anki2"
+        conn = sqlite3.connect(collection_path)
+        cursor = conn.cursor()
+        cursor.executescript(APKG_SCHEMA)
+        cursor.executescript(APKG_COL)
+
+        id_gen = itertools.count(int(timestamp * 1000))
+        decks: dict[str, genanki.Deck] = {}
+
+        def flush() -> None:
+            for deck in decks.values():
+                deck.write_to_db(cursor, timestamp, id_gen)  # type: ignore
+                deck.notes.clear()  # type: ignore
+
+        n_cards = 0
+        for card in cards:
+            if card.deck not in decks:
+                decks[card.deck] = genanki_deck(card.deck)
+            decks[card.deck].add_note(card.to_genanki_note())  # type: ignore
+
+            n_cards += 1
+            if n_cards % flush_every == 0:
+                flush()
+        flush()
+
+        conn.commit()
+        conn.close()
+
+        with zipfile.ZipFile(path, "w") as outzip:
+            with (
+                collection_path.open("rb") as src,
+                outzip.open(zipfile.ZipInfo("collection.anki2", ZIP_DATE_TIME), "w") as dst,
+            ):
+                shutil.copyfileobj(src, dst)
+            outzip.writestr(zipfile.ZipInfo("media", ZIP_DATE_TIME), "{}")
+
+    return n_cards
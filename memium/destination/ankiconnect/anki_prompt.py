@@ -7,12 +7,13 @@ import genanki
 from memium.utils.markdown_parser import to_html
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AnkiPrompt(ABC):
     base_deck: str
     tags: Sequence[str]
     uuid: int  # UUID is a unique identifier for the prompt, used for scheduling. If a new prompt is added with the same uuid, it will be treated as an update to the existing prompt. Otherwise, they will be interpreted as separate prompts.
     edit_url: str | None
+    update_uid: int  # Stored alongside the uuid, so the destination can determine whether the prompt has changed without re-hashing its rendered fields.
 
     def _to_html(self, field: str) -> str:
         return to_html(field)
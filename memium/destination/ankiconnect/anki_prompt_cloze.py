@@ -1,3 +1,4 @@
+import functools
 from collections.abc import Sequence
 from dataclasses import dataclass
 
@@ -7,7 +8,7 @@ from ...utils.hash_cleaned_str import hash_str_to_int
 from .anki_prompt import AnkiPrompt
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AnkiCloze(AnkiPrompt):
     base_deck: str
     tags: Sequence[str]
@@ -16,12 +17,24 @@ class AnkiCloze(AnkiPrompt):
 
     @property
     def genanki_model(self) -> genanki.Model:
+        return self.model_for_css(self.css)
+
+    @staticmethod
+    @functools.cache
+    def model_for_css(css: str) -> genanki.Model:
+        """The model only depends on the css, so build it once and share it between cards."""
         model_name = "Ankdown Cloze with UUID"
 
         return genanki.Model(
             model_id=hash_str_to_int(model_name),
             name=model_name,
-            fields=[{"name": "Text"}, {"name": "Extra"}, {"name": "Tags"}, {"name": "UUID"}],
+            fields=[
+                {"name": "Text"},
+                {"name": "Extra"},
+                {"name": "Tags"},
+                {"name": "UUID"},
+                {"name": "UpdateUID"},
+            ],
             templates=[
                 {
                     "name": "Ankdown Cloze Card with UUID",
@@ -29,7 +42,7 @@ class AnkiCloze(AnkiPrompt):
                     "afmt": r"{{{{cloze:Text}}}}\n<div class='extra'>{{{{Extra}}}}</div>\n{}",
                 }
             ],
-            css=self.css,
+            css=css,
             model_type=1,  # This is the model_type number for genanki, takes 0 for QA or 1 for cloze
         )
 
@@ -37,6 +50,12 @@ class AnkiCloze(AnkiPrompt):
         return genanki.Note(
             guid=str(self.uuid),
             model=self.genanki_model,
-            fields=[self._to_html(self.text), "", " ".join(self.tags), str(self.uuid)],
+            fields=[
+                self._to_html(self.text),
+                "",
+                " ".join(self.tags),
+                str(self.uuid),
+                str(self.update_uid),
+            ],
             tags=self.tags,
         )
@@ -1,3 +1,4 @@
+import functools
 from collections.abc import Sequence
 from dataclasses import dataclass
 
@@ -9,7 +10,7 @@ from ...utils.hash_cleaned_str import hash_str_to_int
 from .anki_prompt import AnkiPrompt
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AnkiQA(AnkiPrompt):
     base_deck: str
     tags: Sequence[str]
@@ -20,11 +21,18 @@ class AnkiQA(AnkiPrompt):
 
     @property
     def genanki_model(self) -> genanki.Model:
+        return self.model_for_css(self.css)
+
+    @staticmethod
+    @functools.cache
+    def model_for_css(css: str) -> genanki.Model:
+        """The model only depends on the css, so build it once and share it between cards."""
         model_fields = [
             {"name": "Question"},
             {"name": "Answer"},
             {"name": "Extra"},
             {"name": "UUID"},
+            {"name": "UpdateUID"},
         ]
 
         QUESTION_STR = r"{{ Question }}"
@@ -67,7 +75,7 @@ class AnkiQA(AnkiPrompt):
             name=("Ankdown QA with UUID"),
             fields=model_fields,
             templates=model_template,
-            css=self.css,
+            css=css,
             model_type=0,
         )
 
@@ -84,13 +92,15 @@ class AnkiQA(AnkiPrompt):
                 self._to_html(self.answer),
                 self._extra_field_content,
                 str(self.uuid),
+                str(self.update_uid),
             ],
             tags=self.tags,
         )
 
     @property
     def deck(self) -> str:
-        base_deck = super().deck
+        # Zero-argument super() does not work in slotted dataclasses, since slots=True creates a new class
+        base_deck = super(AnkiQA, self).deck  # noqa: UP008
         wiki_links = get_terms_surrounded_by_underscores(self.question)
         wiki_subdeck = "-".join(sorted(wiki_links))
 
@@ -2,14 +2,16 @@
 import datetime
 import json
 import logging
-import traceback
+import random
+import sqlite3
+import time
 import urllib.request
 from collections.abc import Iterator, Mapping, Sequence
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from time import sleep
-from typing import Any
+from typing import Any, Protocol
 
 from memium.environment import in_docker
 
@@ -51,18 +53,49 @@ class NoteInfo(pydantic.BaseModel):
     cards: Sequence[int]
 
 
+@dataclass(frozen=True)
+class NoteUpdate:
+    """Update of an existing note, applied directly rather than through a package import."""
+
+    note_id: int
+    card_ids: Sequence[int]
+    fields: Mapping[str, str]
+    tags: Sequence[str]
+    deck: str
+
+
+class NoteInfoReader(Protocol):
+    """Reads notes without going through AnkiConnect, e.g. from the collection file."""
+
+    def get_note_infos(self, base_deck: str) -> Sequence[NoteInfo]: ...
+
+
 class AnkiConnectCommand(Enum):
     CARDS_TO_NOTES = "cardsToNotes"
     DELETE_NOTES = "deleteNotes"
     FIND_CARDS = "findCards"
     GET_NOTE_INFOS = "notesInfo"
     IMPORT_PACKAGE = "importPackage"
+    MULTI = "multi"
+
+    # Direct note updates
+    FIND_NOTES = "findNotes"
+    UPDATE_NOTE_FIELDS = "updateNoteFields"
+    UPDATE_NOTE_TAGS = "updateNoteTags"
+    CHANGE_DECK = "changeDeck"
+    CREATE_DECK = "createDeck"
 
     # Models
     CREATE_MODEL = "createModel"
     UPDATE_MODEL_TEMPLATES = "updateModelTemplates"
     UPDATE_MODEL_STYLING = "updateModelStyling"
     GET_MODEL_NAMES = "modelNames"
+    GET_MODEL_FIELD_NAMES = "modelFieldNames"
+    ADD_MODEL_FIELD = "modelFieldAdd"
+
+    # Media
+    STORE_MEDIA_FILE = "storeMediaFile"
+    GET_MEDIA_FILES_NAMES = "getMediaFilesNames"
 
 
 @dataclass(frozen=True)
@@ -73,22 +106,18 @@ class AnkiConnectGateway:
     tmp_write_dir: Path
     max_deletions_per_run: int
     max_wait_seconds: int
+    note_info_reader: NoteInfoReader | None = None
 
     def __post_init__(self) -> None:
-        seconds_waited = 0
-        while not anki_connect_is_live(ankiconnect_url=self.ankiconnect_url):
-            if seconds_waited >= self.max_wait_seconds:
-                raise ConnectionError(f"Could not connect to AnkiConnect at {self.ankiconnect_url}")
-
-            poll_seconds = 10
-            log.info(f"AnkiConnect is not live, waiting {poll_seconds} seconds...")
-            seconds_waited += poll_seconds
-            sleep(poll_seconds)
+        wait_for_anki_connect(
+            ankiconnect_url=self.ankiconnect_url, max_wait_seconds=self.max_wait_seconds
+        )
 
     def update_model(self, model: genanki.Model) -> None:
         existing_model_names = self._invoke(AnkiConnectCommand.GET_MODEL_NAMES)
 
         if model.name in existing_model_names:  # type: ignore
+            self._add_missing_model_fields(model)
             self._invoke(
                 AnkiConnectCommand.UPDATE_MODEL_TEMPLATES,
                 model={
@@ -115,6 +144,22 @@ class AnkiConnectGateway:
                 ],
             )
 
+    def _add_missing_model_fields(self, model: genanki.Model) -> None:
+        """Models created by older versions may lack fields, e.g. UpdateUID. Add them, so imported notes match the model."""
+        existing_field_names: list[str] = self._invoke(
+            AnkiConnectCommand.GET_MODEL_FIELD_NAMES,
+            modelName=model.name,  # type: ignore
+        )
+
+        for index, field in enumerate(model.fields):  # type: ignore
+            if field["name"] not in existing_field_names:
+                self._invoke(
+                    AnkiConnectCommand.ADD_MODEL_FIELD,
+                    modelName=model.name,  # type: ignore
+                    fieldName=field["name"],
+                    index=index,
+                )
+
     def import_package(self, package: genanki.Package) -> None:
         subdir = "tmp_apkg_dir"
         with tempdir(self.tmp_write_dir / subdir) as tmp_write_subdir:
@@ -127,7 +172,117 @@ class AnkiConnectGateway:
                 log.info(f"Imported from {read_path}!")
             except Exception as e:
                 log.error(f"""Unable to sync from {read_path}, {e}""")
-                traceback.print_exc()
+                raise
+
+    def update_notes(self, updates: Sequence[NoteUpdate]) -> None:
+        """Update fields, tags and deck of existing notes, batched into a single request."""
+        if not updates:
+            return
+
+        actions = [
+            self._request(AnkiConnectCommand.CREATE_DECK.value, deck=deck)
+            for deck in sorted({update.deck for update in updates})
+        ]
+        for update in updates:
+            actions += [
+                self._request(
+                    AnkiConnectCommand.UPDATE_NOTE_FIELDS.value,
+                    note={"id": update.note_id, "fields": dict(update.fields)},
+                ),
+                self._request(
+                    AnkiConnectCommand.UPDATE_NOTE_TAGS.value,
+                    note=update.note_id,
+                    tags=list(update.tags),
+                ),
+                self._request(
+                    AnkiConnectCommand.CHANGE_DECK.value,
+                    cards=list(update.card_ids),
+                    deck=update.deck,
+                ),
+            ]
+
+        results: list[Any] = self._invoke(AnkiConnectCommand.MULTI, actions=actions)
+        errors = [
+            result["error"]
+            for result in results
+            if isinstance(result, dict) and result.get("error") is not None  # type: ignore
+        ]
+        if errors:
+            raise Exception(f"Unable to update {len(errors)} notes: {errors}")
+
+        log.info(f"Updated {len(updates)} notes directly")
+
+    def _path_for_anki(self, path: Path) -> Path:
+        """Where Anki finds a file in the input dir. When running in Docker, Anki sees the input dir at tmp_read_dir."""
+        return (
+            self.tmp_read_dir / path.resolve().relative_to(self.tmp_write_dir.resolve())
+        ).resolve()
+
+    def store_media_files(self, files: Mapping[str, Path]) -> None:
+        """Store files in the input dir in Anki's media folder, keyed by their filename in Anki. Anki reads the files from disk, so they are never loaded into memory here."""
+        if not files:
+            return
+
+        results: list[Any] = self._invoke(
+            AnkiConnectCommand.MULTI,
+            actions=[
+                self._request(
+                    AnkiConnectCommand.STORE_MEDIA_FILE.value,
+                    filename=filename,
+                    path=str(self._path_for_anki(path)),
+                )
+                for filename, path in files.items()
+            ],
+        )
+        errors = [
+            result["error"]
+            for result in results
+            if isinstance(result, dict) and result.get("error") is not None  # type: ignore
+        ]
+        if errors:
+            raise Exception(f"Unable to store {len(errors)} media files: {errors}")
+
+        log.info(f"Stored {len(files)} media files")
+
+    def get_stored_media_files(self, filenames: Sequence[str]) -> set[str]:
+        """The filenames which exist in Anki's media folder, e.g. to check whether files stored earlier have been deleted in Anki since."""
+        if not filenames:
+            return set()
+
+        results: list[Any] = self._invoke(
+            AnkiConnectCommand.MULTI,
+            actions=[
+                self._request(AnkiConnectCommand.GET_MEDIA_FILES_NAMES.value, pattern=filename)
+                for filename in filenames
+            ],
+        )
+        return {
+            name
+            for result in results
+            if isinstance(result, dict) and result.get("error") is None  # type: ignore
+            for name in result["result"]  # type: ignore
+        }
+
+    def get_note_infos_by_uuid(self, uuids: Sequence[int]) -> Mapping[int, NoteInfo]:
+        """Get the existing notes in the base deck, keyed by the UUID field."""
+        if not uuids:
+            return {}
+
+        uuid_query = " OR ".join(f"UUID:{uuid}" for uuid in uuids)
+        note_ids: list[int] = self._invoke(
+            AnkiConnectCommand.FIND_NOTES, query=f'"deck:{self.base_deck}" ({uuid_query})'
+        )
+        if not note_ids:
+            return {}
+
+        note_infos: list[dict[str, Any]] = self._invoke(
+            AnkiConnectCommand.GET_NOTE_INFOS, notes=note_ids
+        )
+        return {
+            int(note_info.fields["UUID"].value): note_info
+            for note_info in (NoteInfo(**info) for info in note_infos)
+            if "UUID" in note_info.fields
+        }
 
     def delete_notes(self, note_ids: Sequence[int]) -> None:
         if len(note_ids) > self.max_deletions_per_run:
@@ -142,6 +297,14 @@ class AnkiConnectGateway:
         self._invoke(AnkiConnectCommand.DELETE_NOTES, notes=note_ids)
 
     def get_all_note_infos(self) -> Sequence[NoteInfo]:
+        if self.note_info_reader is not None:
+            try:
+                return self.note_info_reader.get_note_infos(self.base_deck)
+            except sqlite3.OperationalError as e:
+                log.warning(
+                    f"Could not read the Anki collection directly, e.g. because Anki has it locked. Reading the deck via AnkiConnect instead: {e}"
+                )
+
         anki_card_ids: list[int] = self._invoke(
             AnkiConnectCommand.FIND_CARDS, query=f'"deck:{self.base_deck}"'
         )
@@ -195,11 +358,22 @@ class UpdateModel(FakeAnkiCommand):
     model: genanki.Model
 
 
+@dataclass(frozen=True)
+class UpdateNotes(FakeAnkiCommand):
+    updates: Sequence[NoteUpdate]
+
+
+@dataclass(frozen=True)
+class StoreMediaFiles(FakeAnkiCommand):
+    files: Mapping[str, Path]
+
+
 class SpieAnkiconnectGateway(AnkiConnectGateway):
     def __init__(self, note_infos: Sequence[NoteInfo] = ()) -> None:
         self.deck_name = "FakeDeck"
         self.note_infos: list[NoteInfo] = list(note_infos)
         self.executed_commands: list[FakeAnkiCommand] = []
+        self.media_files: set[str] = set()
 
     def update_model(self, model: genanki.Model) -> None:
         self.executed_commands.append(UpdateModel(model=model))
@@ -210,21 +384,68 @@ class SpieAnkiconnectGateway(AnkiConnectGateway):
     def import_package(self, package: genanki.Package) -> None:
         self.executed_commands.append(ImportPackage(package=package))
 
+    def update_notes(self, updates: Sequence[NoteUpdate]) -> None:
+        self.executed_commands.append(UpdateNotes(updates=updates))
+
+    def store_media_files(self, files: Mapping[str, Path]) -> None:
+        if files:
+            self.executed_commands.append(StoreMediaFiles(files=files))
+            self.media_files.update(files)
+
+    def get_stored_media_files(self, filenames: Sequence[str]) -> set[str]:
+        return self.media_files.intersection(filenames)
+
+    def get_note_infos_by_uuid(self, uuids: Sequence[int]) -> Mapping[int, NoteInfo]:
+        return {
+            int(note_info.fields["UUID"].value): note_info
+            for note_info in self.note_infos
+            if "UUID" in note_info.fields and int(note_info.fields["UUID"].value) in uuids
+        }
+
 
 ANKICONNECT_URL = "http://host.docker.internal:8765" if in_docker() else "http://localhost:8765"
 # On host machine, port is 8765
 
 
-def anki_connect_is_live(ankiconnect_url: str = ANKICONNECT_URL) -> bool:
+def anki_connect_is_live(
+    ankiconnect_url: str = ANKICONNECT_URL, timeout_seconds: float = 2
+) -> bool:
+    """Probe AnkiConnect with the 'version' action, which is cheap and does not touch the collection."""
+    request = json.dumps({"action": "version", "version": 6}).encode("utf-8")
     try:
-        if urllib.request.urlopen(ankiconnect_url).getcode() == 200:
-            return True
-        raise Exception
+        with urllib.request.urlopen(
+            urllib.request.Request(ankiconnect_url, request), timeout=timeout_seconds
+        ) as response:
+            return json.load(response).get("error") is None
     except Exception as err:
-        log.info(f"Attempted connection on {ankiconnect_url}")
-        log.info(
-            "Unable to reach anki connect. Make sure anki is running and the Anki Connect addon is installed."
-        )
-        log.error(f"Error was {err}")
+        log.debug(f"AnkiConnect not reachable at {ankiconnect_url}: {err}")
 
     return False
+
+
+def wait_for_anki_connect(
+    ankiconnect_url: str,
+    max_wait_seconds: float,
+    initial_poll_seconds: float = 0.1,
+    max_poll_seconds: float = 10,
+) -> None:
+    """Wait until AnkiConnect is live, polling with exponential backoff and jitter.
+
+    Starts polling quickly, so little time is lost once Anki is up, and backs off to max_poll_seconds while waiting for Anki to start.
+    """
+    deadline = time.monotonic() + max_wait_seconds
+    poll_seconds = initial_poll_seconds
+
+    while not anki_connect_is_live(ankiconnect_url=ankiconnect_url):
+        remaining_seconds = deadline - time.monotonic()
+        if remaining_seconds <= 0:
+            raise ConnectionError(
+                f"""Could not connect to AnkiConnect at {ankiconnect_url} within {max_wait_seconds} seconds.
+                Make sure Anki is running and the AnkiConnect add-on is installed."""
+            )
+
+        if poll_seconds == initial_poll_seconds:
+            log.info(f"AnkiConnect is not live at {ankiconnect_url}, waiting for it to start...")
+
+        sleep(min(poll_seconds * random.uniform(0.5, 1.5), remaining_seconds))
+        poll_seconds = min(poll_seconds * 2, max_poll_seconds)
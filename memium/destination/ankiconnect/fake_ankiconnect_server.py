@@ -0,0 +1,286 @@
+"""An in-process stand-in for AnkiConnect, for tests and benchmarks which should exercise HTTP without a running Anki."""
+
+import base64
+import fnmatch
+import itertools
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from collections.abc import Callable, Mapping, Sequence
+from contextlib import closing
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import TracebackType
+from typing import Any
+
+from .anki_collection_reader import FIELD_SEPARATOR
+
+
+@dataclass
+class FakeNote:
+    note_id: int
+    guid: str
+    model_name: str
+    fields: dict[str, str]
+    tags: list[str]
+    card_ids: list[int]
+    deck: str
+
+
+@dataclass
+class FakeModel:
+    field_names: list[str]
+    css: str = ""
+    templates: Mapping[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RequestStats:
+    n_requests: int = 0
+    bytes_received: int = 0
+    bytes_sent: int = 0
+    actions: Counter[str] = field(default_factory=Counter)
+    """Actions, including those batched in 'multi' requests."""
+
+    @property
+    def n_read_actions(self) -> int:
+        return sum(self.actions[action] for action in READ_ACTIONS)
+
+
+# Actions which read notes from the collection
+READ_ACTIONS = ("findCards", "cardsToNotes", "findNotes", "notesInfo")
+
+
+class FakeAnkiConnect:
+    """Implements the AnkiConnect actions memium uses on an in-memory note store, and counts requests and bytes.
+
+    Each request is delayed by latency_seconds, to simulate the round-trip to Anki. Use as a context manager, which starts the server on a free port.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0) -> None:
+        self.latency_seconds = latency_seconds
+        self.notes: dict[int, FakeNote] = {}
+        self.models: dict[str, FakeModel] = {}
+        self.decks: set[str] = {"Default"}
+        self.media: dict[str, bytes] = {}
+        self.stats = RequestStats()
+        self._ids = itertools.count(1_000_000)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "Server is not running"
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self) -> "FakeAnkiConnect":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                response = json.dumps(fake.handle(body)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+                with fake._lock:
+                    fake.stats.bytes_sent += len(response)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = RequestStats()
+
+    def handle(self, body: bytes) -> Mapping[str, Any]:
+        time.sleep(self.latency_seconds)
+        request = json.loads(body)
+        with self._lock:
+            self.stats.n_requests += 1
+            self.stats.bytes_received += len(body)
+            return self._handle_action(request["action"], request.get("params", {}))
+
+    def _handle_action(self, action: str, params: Mapping[str, Any]) -> Mapping[str, Any]:
+        self.stats.actions[action] += 1
+        handler: Callable[..., Any] | None = getattr(self, f"_action_{action}", None)
+        if handler is None:
+            return {"result": None, "error": f"unsupported action: {action}"}
+        try:
+            return {"result": handler(**params), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+    # Queries
+    def _in_deck(self, note: FakeNote, query: str) -> bool:
+        match = re.search(r'deck:([^"]+)"', query)
+        if match is None:
+            return True
+        deck = match.group(1).casefold()
+        return note.deck.casefold() == deck or note.deck.casefold().startswith(f"{deck}::")
+
+    def _matching_notes(self, query: str) -> list[FakeNote]:
+        notes = [note for note in self.notes.values() if self._in_deck(note, query)]
+        uuids = set(re.findall(r"UUID:(\d+)", query))
+        if uuids:
+            notes = [note for note in notes if note.fields.get("UUID") in uuids]
+        return notes
+
+    def _card_to_note(self) -> Mapping[int, FakeNote]:
+        return {card_id: note for note in self.notes.values() for card_id in note.card_ids}
+
+    # Actions
+    def _action_version(self) -> int:
+        return 6
+
+    def _action_multi(self, actions: Sequence[Mapping[str, Any]]) -> list[Mapping[str, Any]]:
+        return [self._handle_action(a["action"], a.get("params", {})) for a in actions]
+
+    def _action_findCards(self, query: str) -> list[int]:
+        return [card_id for note in self._matching_notes(query) for card_id in note.card_ids]
+
+    def _action_findNotes(self, query: str) -> list[int]:
+        return [note.note_id for note in self._matching_notes(query)]
+
+    def _action_cardsToNotes(self, cards: Sequence[int]) -> list[int]:
+        card_to_note = self._card_to_note()
+        return list(dict.fromkeys(card_to_note[card].note_id for card in cards))
+
+    def _action_notesInfo(self, notes: Sequence[int]) -> list[Mapping[str, Any]]:
+        return [
+            {
+                "noteId": note.note_id,
+                "tags": note.tags,
+                "fields": {
+                    name: {"value": value, "order": order}
+                    for order, (name, value) in enumerate(note.fields.items())
+                },
+                "modelName": note.model_name,
+                "cards": note.card_ids,
+            }
+            for note in (self.notes[note_id] for note_id in notes)
+        ]
+
+    def _action_deleteNotes(self, notes: Sequence[int]) -> None:
+        for note_id in notes:
+            self.notes.pop(note_id, None)
+
+    def _action_modelNames(self) -> list[str]:
+        return list(self.models)
+
+    def _action_modelFieldNames(self, modelName: str) -> list[str]:
+        return self.models[modelName].field_names
+
+    def _action_modelFieldAdd(self, modelName: str, fieldName: str, index: int) -> None:
+        self.models[modelName].field_names.insert(index, fieldName)
+
+    def _action_createModel(
+        self,
+        modelName: str,
+        inOrderFields: Sequence[str],
+        css: str,
+        cardTemplates: Sequence[Mapping[str, str]],
+    ) -> None:
+        self.models[modelName] = FakeModel(
+            field_names=list(inOrderFields),
+            css=css,
+            templates={t["Name"]: t for t in cardTemplates},
+        )
+
+    def _action_updateModelTemplates(self, model: Mapping[str, Any]) -> None:
+        self.models[model["name"]].templates = model["templates"]
+
+    def _action_updateModelStyling(self, model: Mapping[str, Any]) -> None:
+        self.models[model["name"]].css = model["css"]
+
+    def _action_createDeck(self, deck: str) -> int:
+        self.decks.add(deck)
+        return hash(deck)
+
+    def _action_updateNoteFields(self, note: Mapping[str, Any]) -> None:
+        self.notes[note["id"]].fields.update(note["fields"])
+
+    def _action_updateNoteTags(self, note: int, tags: Sequence[str]) -> None:
+        self.notes[note].tags = list(tags)
+
+    def _action_changeDeck(self, cards: Sequence[int], deck: str) -> None:
+        card_to_note = self._card_to_note()
+        for card in cards:
+            card_to_note[card].deck = deck
+
+    def _action_storeMediaFile(
+        self, filename: str, path: str | None = None, data: str | None = None
+    ) -> str:
+        self.media[filename] = Path(path).read_bytes() if path else base64.b64decode(data or "")
+        return filename
+
+    def _action_getMediaFilesNames(self, pattern: str) -> list[str]:
+        return fnmatch.filter(self.media, pattern)
+
+    def _action_importPackage(self, path: str) -> bool:
+        """Add the notes in the package, or update existing notes with the same GUID, as Anki does."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with zipfile.ZipFile(path) as apkg:
+                apkg.extract("collection.anki2", tmp_dir)
+
+            with closing(sqlite3.connect(Path(tmp_dir) / "collection.anki2")) as conn:
+                decks_json, models_json = conn.execute("SELECT decks, models FROM col").fetchone()
+                deck_names = {int(i): d["name"] for i, d in json.loads(decks_json).items()}
+                models = {
+                    int(i): (
+                        m["name"],
+                        [f["name"] for f in sorted(m["flds"], key=lambda f: f["ord"])],
+                    )
+                    for i, m in json.loads(models_json).items()
+                }
+                rows = conn.execute(
+                    """SELECT notes.guid, notes.mid, notes.tags, notes.flds, count(cards.id), min(cards.did)
+                    FROM notes JOIN cards ON cards.nid = notes.id GROUP BY notes.id"""
+                ).fetchall()
+
+        notes_by_guid = {note.guid: note for note in self.notes.values()}
+        for guid, model_id, tags, fields, n_cards, deck_id in rows:
+            model_name, field_names = models[model_id]
+            note_fields = dict(zip(field_names, fields.split(FIELD_SEPARATOR), strict=False))
+            existing = notes_by_guid.get(guid)
+            if existing is not None:
+                existing.fields.update(note_fields)
+                existing.tags = tags.split()
+                continue
+
+            note_id = next(self._ids)
+            self.decks.add(deck_names[deck_id])
+            self.notes[note_id] = FakeNote(
+                note_id=note_id,
+                guid=guid,
+                model_name=model_name,
+                fields=note_fields,
+                tags=tags.split(),
+                card_ids=[next(self._ids) for _ in range(n_cards)],
+                deck=deck_names[deck_id],
+            )
+        return True
@@ -0,0 +1,119 @@
+import sqlite3
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from ...source.prompts.prompt_cloze import ClozeWithoutDoc
+from ...source.prompts.prompt_qa import QAWithoutDoc
+from .anki_collection_reader import AnkiCollectionReader
+from .anki_converter import AnkiPromptConverter
+from .anki_package import write_apkg
+from .ankiconnect_gateway import AnkiConnectGateway
+from .fake_ankiconnect_server import FakeAnkiConnect
+
+
+def generate_collection(tmp_path: Path) -> Path:
+    in_deck = [
+        QAWithoutDoc(question="FakeQuestion", answer="FakeAnswer", add_tags=["FakeTag"]),
+        ClozeWithoutDoc(text="FakeText {{c1::cloze}}", add_tags=["anki/deck/FakeSubdeck"]),
+    ]
+    other_deck = [QAWithoutDoc(question="OtherQuestion", answer="OtherAnswer", add_tags=[])]
+
+    converter = AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS")
+    other_converter = AnkiPromptConverter(base_deck="FakeDeckSibling", card_css="FakeCSS")
+    write_apkg(
+        [
+            *[converter.prompt_to_card(p) for p in in_deck],
+            *[other_converter.prompt_to_card(p) for p in other_deck],
+        ],
+        path=tmp_path / "collection.apkg",
+        timestamp=0,
+    )
+
+    with zipfile.ZipFile(tmp_path / "collection.apkg") as apkg:
+        apkg.extract("collection.anki2", tmp_path)
+    return tmp_path / "collection.anki2"
+
+
+def test_collection_reader_reads_notes_in_base_deck(tmp_path: Path):
+    collection_path = generate_collection(tmp_path)
+    modified_before = collection_path.stat().st_mtime_ns
+
+    note_infos = AnkiCollectionReader(collection_path).get_note_infos(base_deck="FakeDeck")
+
+    assert collection_path.stat().st_mtime_ns == modified_before
+    assert {note_info.modelName for note_info in note_infos} == {
+        "Ankdown QA with UUID",
+        "Ankdown Cloze with UUID",
+    }
+
+    qa_note = next(n for n in note_infos if "Question" in n.fields)
+    assert qa_note.tags == ["FakeTag"]
+    assert qa_note.fields["Question"].value == "<p>FakeQuestion</p>"
+    assert len(qa_note.cards) == 1
+
+    prompts = [
+        AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS").note_info_to_prompt(n)
+        for n in note_infos
+    ]
+    assert {p.prompt.scheduling_uid for p in prompts} == {
+        QAWithoutDoc(question="FakeQuestion", answer="FakeAnswer", add_tags=[]).scheduling_uid,
+        ClozeWithoutDoc(text="FakeText {{c1::cloze}}", add_tags=[]).scheduling_uid,
+    }
+
+
+def test_collection_reader_supports_current_schema(tmp_path: Path):
+    collection_path = tmp_path / "collection.anki2"
+    conn = sqlite3.connect(collection_path)
+    conn.executescript(
+        """
+        CREATE TABLE decks (id integer primary key, name text);
+        CREATE TABLE notetypes (id integer primary key, name text);
+        CREATE TABLE fields (ntid integer, ord integer, name text);
+        CREATE TABLE notes (id integer primary key, mid integer, tags text, flds text);
+        CREATE TABLE cards (id integer primary key, nid integer, did integer, odid integer);
+        INSERT INTO decks VALUES (1, 'FakeDeck'), (2, 'FakeDeck' || char(31) || 'Sub'), (3, 'Other');
+        INSERT INTO notetypes VALUES (10, 'FakeModel');
+        INSERT INTO fields VALUES (10, 1, 'Back'), (10, 0, 'Front');
+        INSERT INTO notes VALUES (100, 10, ' tag1 tag2 ', 'front' || char(31) || 'back');
+        INSERT INTO notes VALUES (101, 10, '', 'other' || char(31) || 'other');
+        INSERT INTO cards VALUES (1000, 100, 2, 0), (1001, 101, 3, 0);
+        """
+    )
+    conn.close()
+
+    note_infos = AnkiCollectionReader(collection_path).get_note_infos(base_deck="FakeDeck")
+
+    assert len(note_infos) == 1
+    assert note_infos[0].noteId == 100
+    assert note_infos[0].tags == ["tag1", "tag2"]
+    assert note_infos[0].fields["Front"].value == "front"
+    assert note_infos[0].fields["Back"].order == 1
+    assert note_infos[0].cards == [1000]
+
+
+def test_locked_collection_falls_back_to_ankiconnect(tmp_path: Path):
+    collection_path = generate_collection(tmp_path)
+    # Like a running Anki, hold an exclusive lock on the collection
+    lock = sqlite3.connect(collection_path, isolation_level=None)
+    lock.execute("BEGIN EXCLUSIVE")
+    try:
+        reader = AnkiCollectionReader(collection_path, lock_timeout_seconds=0.1)
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            reader.get_note_infos(base_deck="FakeDeck")
+
+        with FakeAnkiConnect() as anki:
+            gateway = AnkiConnectGateway(
+                ankiconnect_url=anki.url,
+                base_deck="FakeDeck",
+                tmp_read_dir=tmp_path,
+                tmp_write_dir=tmp_path,
+                max_deletions_per_run=0,
+                max_wait_seconds=1,
+                note_info_reader=reader,
+            )
+            assert gateway.get_all_note_infos() == []
+            assert anki.stats.actions["findCards"] == 1
+    finally:
+        lock.close()
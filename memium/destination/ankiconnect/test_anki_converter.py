@@ -3,9 +3,12 @@ import pytest
 from ...source.prompts.prompt import BasePrompt
 from ...source.prompts.prompt_cloze import ClozeWithoutDoc
 from ...source.prompts.prompt_qa import QAWithoutDoc
+from ...source.prompts.prompt_uid import UIDPrompt
 from .anki_converter import AnkiPromptConverter
 from .anki_prompt import AnkiPrompt
+from .ankiconnect_gateway import AnkiField
 from .test_anki_prompt_qa import FakeAnkiCloze, FakeAnkiQA
+from .test_ankiconnect_gateway import MockNoteInfo
 
 
 @pytest.mark.parametrize(
@@ -32,3 +35,38 @@ def test_anki_prompt_converter(input_prompt: BasePrompt, expected_card: AnkiProm
     ).prompt_to_card(input_prompt)
 
     assert generated_card.uuid == expected_card.uuid
+
+
+def test_note_info_to_prompt_reads_stored_uids():
+    prompt = QAWithoutDoc(question="FakeQuestion", answer="FakeAnswer", add_tags=["FakeTag"])
+    converter = AnkiPromptConverter(base_deck="FakeBaseDeck", card_css="FakeCSS")
+    note = converter.prompt_to_card(prompt).to_genanki_note()
+
+    note_info = MockNoteInfo(
+        fields={
+            field["name"]: AnkiField(value=value, order=i)
+            for i, (field, value) in enumerate(zip(note.model.fields, note.fields, strict=True))  # type: ignore
+        },
+        tags=["FakeTag"],
+    )
+    remote_prompt = converter.note_info_to_prompt(note_info).prompt
+
+    assert isinstance(remote_prompt, UIDPrompt)
+    assert remote_prompt.scheduling_uid == prompt.scheduling_uid
+    assert remote_prompt.update_uid == prompt.update_uid
+
+
+def test_note_info_to_prompt_recomputes_uids_for_legacy_notes():
+    note_info = MockNoteInfo(
+        fields={
+            "Question": AnkiField(value="FakeQuestion", order=0),
+            "Answer": AnkiField(value="FakeAnswer", order=1),
+            "UUID": AnkiField(value="4875918425", order=2),
+        }
+    )
+    remote_prompt = AnkiPromptConverter(
+        base_deck="FakeBaseDeck", card_css="FakeCSS"
+    ).note_info_to_prompt(note_info)
+
+    assert isinstance(remote_prompt.prompt, QAWithoutDoc)
+    assert remote_prompt.prompt.scheduling_uid == 4875918425
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from ...source.document import Document
+from ...source.prompt_source import with_uids
+from ...source.prompts.prompt_qa import QAFromDoc
+from .anki_converter import AnkiPromptConverter
+from .anki_media import MediaCache, MediaReferences, MediaUploader
+from .anki_prompt_qa import AnkiQA
+from .ankiconnect_gateway import SpieAnkiconnectGateway, StoreMediaFiles
+
+
+def upload(tmp_path: Path, gateway: SpieAnkiconnectGateway, answer: str) -> AnkiQA:
+    document = Document(content="", source_path=tmp_path / "notes" / "biology.md")
+    prompt = QAFromDoc(
+        question="What does a cell look like?", answer=answer, parent_doc=document.handle, line_nr=1
+    )
+    card = AnkiPromptConverter(base_deck="FakeDeck", card_css="").prompt_to_card(prompt)
+    references = MediaReferences(
+        root_dir=tmp_path, cache=MediaCache(tmp_path / ".memium" / "media_cache.json")
+    )
+    (uploaded,) = MediaUploader(gateway=gateway, references=references).upload([prompt], [card])
+    assert isinstance(uploaded, AnkiQA)
+    # The diff sees the same update UID as is stored on the note
+    (extracted,) = references.with_media_uids(with_uids([prompt]))
+    assert (uploaded.uuid, uploaded.update_uid) == (card.uuid, extracted.uids.update_uid)
+    return uploaded
+
+
+def test_media_uploader(tmp_path: Path):
+    (tmp_path / "notes" / "images").mkdir(parents=True)
+    (tmp_path / "notes" / "images" / "cell.png").write_bytes(b"cell")
+    (tmp_path / "attachments").mkdir()
+    (tmp_path / "attachments" / "copy of cell.png").write_bytes(b"cell")
+
+    gateway = SpieAnkiconnectGateway()
+    card = upload(
+        tmp_path,
+        gateway,
+        answer='![A cell](images/cell.png) <img src="attachments/copy%20of%20cell.png"> ![Remote](https://example.com/cell.png)',
+    )
+
+    # Identical files are stored once, and remote images are left as is
+    (command,) = gateway.executed_commands
+    assert isinstance(command, StoreMediaFiles)
+    (anki_filename,) = command.files
+    assert card.answer == (
+        f'![A cell]({anki_filename}) <img src="{anki_filename}"> ![Remote](https://example.com/cell.png)'
+    )
+
+    # Stored files are remembered between syncs
+    gateway.executed_commands.clear()
+    unchanged_card = upload(tmp_path, gateway, answer="![A cell](images/cell.png)")
+    assert gateway.executed_commands == []
+
+    # Unless they were deleted in Anki since
+    gateway = SpieAnkiconnectGateway()
+    upload(tmp_path, gateway, answer="![A cell](images/cell.png)")
+    (command,) = gateway.executed_commands
+    assert isinstance(command, StoreMediaFiles)
+    assert list(command.files) == [anki_filename]
+
+    # Changed files get a new name, and change the update UID
+    gateway.executed_commands.clear()
+    (tmp_path / "notes" / "images" / "cell.png").write_bytes(b"changed cell")
+    changed_card = upload(tmp_path, gateway, answer="![A cell](images/cell.png)")
+    (command,) = gateway.executed_commands
+    assert isinstance(command, StoreMediaFiles)
+    assert list(command.files) != [anki_filename]
+    assert changed_card.update_uid != unchanged_card.update_uid
@@ -19,6 +19,7 @@ class FakeAnkiCloze(AnkiCloze):
     css: str = "FakeCSS"
     uuid: int = 0
     edit_url: str = "FakeEditURL"
+    update_uid: int = 0
 
 
 @dataclass(frozen=True)
@@ -30,6 +31,7 @@ class FakeAnkiQA(AnkiQA):
     css: str = "FakeCSS"
     uuid: int = 0
     edit_url: str = "FakeEditURL"
+    update_uid: int = 0
 
 
 from dataclasses import dataclass
@@ -1,3 +1,5 @@
+import itertools
+import time
 from collections.abc import Mapping, Sequence
 from pathlib import Path
 
@@ -5,6 +7,7 @@ import genanki
 import pytest
 
 from ...environment import get_host_home_dir
+from . import ankiconnect_gateway
 from .ankiconnect_gateway import (
     ANKICONNECT_URL,
     AnkiConnectGateway,
@@ -103,3 +106,21 @@ def test_error_if_not_running():
             max_deletions_per_run=0,
             max_wait_seconds=0,
         )
+
+
+def test_wait_for_anki_connect_backs_off_until_live(monkeypatch: pytest.MonkeyPatch):
+    probes: list[float] = []
+
+    def fake_is_live(ankiconnect_url: str) -> bool:  # noqa: ARG001
+        probes.append(time.monotonic())
+        return len(probes) == 4
+
+    monkeypatch.setattr(ankiconnect_gateway, "anki_connect_is_live", fake_is_live)
+    ankiconnect_gateway.wait_for_anki_connect(
+        ankiconnect_url="http://localhost:1234", max_wait_seconds=10, initial_poll_seconds=0.01
+    )
+
+    assert len(probes) == 4
+    intervals = [later - earlier for earlier, later in itertools.pairwise(probes)]
+    assert intervals[-1] > intervals[0]
+    assert probes[-1] - probes[0] < 1
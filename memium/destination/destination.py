@@ -1,4 +1,4 @@
-from collections.abc import Sequence
+from collections.abc import Collection, Sequence
 from dataclasses import dataclass
 from typing import Protocol, TypeAlias
 
@@ -21,4 +21,8 @@ PromptDestinationCommand: TypeAlias = PushPrompts | DeletePrompts
 class PromptDestination(Protocol):
     def get_all_prompts(self) -> Sequence[DestinationPrompt]: ...
 
+    def get_prompts(self, scheduling_uids: Collection[int]) -> Sequence[DestinationPrompt]:
+        """The prompts with the given scheduling UIDs, e.g. for scoped syncs. UIDs not in the destination are ignored."""
+        ...
+
     def update(self, commands: Sequence[PromptDestinationCommand]) -> None: ...
@@ -1,24 +1,45 @@
 import logging
 import warnings
-from collections.abc import Sequence
+from collections.abc import Collection, Mapping, Sequence
 
 import genanki
 from iterpy import Iter
 
 from ..source.prompts.prompt import DestinationPrompt
-from ..utils.hash_cleaned_str import clean_str, hash_str_to_int
+from ..utils.hash_cleaned_str import hash_str_to_int
+from ..utils.metrics import stage
 from .ankiconnect.anki_converter import AnkiPromptConverter
+from .ankiconnect.anki_media import MediaUploader
+from .ankiconnect.anki_package import genanki_deck
 from .ankiconnect.anki_prompt import AnkiPrompt
-from .ankiconnect.ankiconnect_gateway import AnkiConnectGateway
+from .ankiconnect.ankiconnect_gateway import AnkiConnectGateway, NoteInfo, NoteUpdate
 from .destination import DeletePrompts, PromptDestination, PromptDestinationCommand, PushPrompts
+from .push_journal import PushJournal
 
 log = logging.getLogger(__name__)
 
+UID_QUERY_BATCH_SIZE = 500
+# Looking up more UIDs than this reads the whole deck instead
+FULL_READ_THRESHOLD = 10 * UID_QUERY_BATCH_SIZE
+
 
 class AnkiConnectDestination(PromptDestination):
-    def __init__(self, gateway: AnkiConnectGateway, prompt_converter: AnkiPromptConverter) -> None:
+    def __init__(
+        self,
+        gateway: AnkiConnectGateway,
+        prompt_converter: AnkiPromptConverter,
+        direct_update_threshold: int = 25,
+        chunk_size: int = 1000,
+        push_journal: PushJournal | None = None,
+        media_uploader: MediaUploader | None = None,
+    ) -> None:
+        """Pushes of at most direct_update_threshold cards update existing notes directly, instead of importing a package. If a media_uploader is given, images referenced by pushed cards are stored in Anki."""
         self.gateway = gateway
         self.prompt_converter = prompt_converter
+        self.direct_update_threshold = direct_update_threshold
+        self.chunk_size = chunk_size
+        self.push_journal = push_journal
+        self.media_uploader = media_uploader
 
         # Don't care about genanki warnings, have our own tests
         warnings.filterwarnings(
@@ -32,15 +53,45 @@ class AnkiConnectDestination(PromptDestination):
             .to_list()
         )
 
+    def get_note_infos_by_uuid(self, scheduling_uids: Collection[int]) -> Mapping[int, NoteInfo]:
+        """The existing notes with the UIDs, keyed by UID."""
+        uids = list(scheduling_uids)
+        if len(uids) > FULL_READ_THRESHOLD:
+            # E.g. after a first sync, reading the deck once is faster than many searches
+            wanted = set(uids)
+            return {
+                uid: note_info
+                for note_info in self.gateway.get_all_note_infos()
+                if "UUID" in note_info.fields
+                and (uid := int(note_info.fields["UUID"].value)) in wanted
+            }
+
+        # Each UID is a clause in Anki's search, so query in batches to keep searches small
+        note_infos: dict[int, NoteInfo] = {}
+        for i in range(0, len(uids), UID_QUERY_BATCH_SIZE):
+            note_infos.update(
+                self.gateway.get_note_infos_by_uuid(uids[i : i + UID_QUERY_BATCH_SIZE])
+            )
+        return note_infos
+
+    def get_prompts(self, scheduling_uids: Collection[int]) -> Sequence[DestinationPrompt]:
+        return [
+            self.prompt_converter.note_info_to_prompt(info)
+            for info in self.get_note_infos_by_uuid(scheduling_uids).values()
+        ]
+
     def _delete_prompts(self, prompts: Sequence[DestinationPrompt]) -> None:
         prompt_ids = {int(remote_prompt.destination_id) for remote_prompt in prompts}
-        self.gateway.delete_notes(list(prompt_ids))
+        if not prompt_ids:
+            return
+
+        with stage("delete", n_items=len(prompt_ids)):
+            self.gateway.delete_notes(list(prompt_ids))
 
     def _grouped_cards_to_deck(
         self, grouped_cards: tuple[str, Sequence[AnkiPrompt]]
     ) -> genanki.Deck:
-        deck_name = grouped_cards[0]
-        deck = genanki.Deck(name=deck_name, deck_id=hash_str_to_int(clean_str(deck_name)))
+        deck = genanki_deck(grouped_cards[0])
 
         for card in grouped_cards[1]:
             deck.add_note(card.to_genanki_note())  # type: ignore
@@ -54,8 +105,83 @@ class AnkiConnectDestination(PromptDestination):
 
         return genanki.Package(deck_or_decks=decks)
 
+    def _to_chunks(self, cards: Sequence[AnkiPrompt]) -> Sequence[Sequence[AnkiPrompt]]:
+        """Split cards into chunks of at most chunk_size, keeping cards from the same deck together.
+
+        Within a deck, cards are sorted by uuid, so the same cards result in the same chunks across runs."""
+        deck_order = {deck: i for i, deck in enumerate(dict.fromkeys(card.deck for card in cards))}
+        sorted_cards = sorted(cards, key=lambda card: (deck_order[card.deck], card.uuid))
+        return [
+            sorted_cards[i : i + self.chunk_size]
+            for i in range(0, len(sorted_cards), self.chunk_size)
+        ]
+
+    @staticmethod
+    def _chunk_key(chunk: Sequence[AnkiPrompt]) -> int:
+        return hash_str_to_int(
+            ",".join(f"{card.uuid}:{card.update_uid}" for card in chunk), max_length=18
+        )
+
+    def _import_chunks(self, cards: Sequence[AnkiPrompt]) -> None:
+        # A different push may contain the same chunks, e.g. after its notes were deleted, so only resume the same push
+        completed_chunks = (
+            self.push_journal.start(self._chunk_key(cards)) if self.push_journal else set()
+        )
+        chunks = self._to_chunks(cards)
+
+        for i, chunk in enumerate(chunks):
+            chunk_key = self._chunk_key(chunk)
+            if chunk_key in completed_chunks:
+                log.info(f"Skipping chunk {i + 1}/{len(chunks)}, imported in a previous run")
+                continue
+
+            log.info(f"Pushing chunk {i + 1}/{len(chunks)} with {len(chunk)} cards to Anki")
+            with stage("package_build", n_items=len(chunk)):
+                package = self._create_package(chunk)
+            with stage("import", n_items=len(chunk)):
+                self.gateway.import_package(package)
+
+            if self.push_journal:
+                self.push_journal.record(chunk_key)
+
+        if self.push_journal:
+            self.push_journal.clear()
+
+    @staticmethod
+    def _to_note_update(card: AnkiPrompt, note_info: NoteInfo) -> NoteUpdate:
+        note = card.to_genanki_note()
+        field_names = [field["name"] for field in note.model.fields]  # type: ignore
+        return NoteUpdate(
+            note_id=note_info.noteId,
+            card_ids=note_info.cards,
+            fields=dict(zip(field_names, note.fields, strict=True)),  # type: ignore
+            tags=card.tags,
+            deck=card.deck,
+        )
+
+    def _update_existing_notes(self, cards: Sequence[AnkiPrompt]) -> Sequence[AnkiPrompt]:
+        """Update cards which already exist as notes directly. Returns the cards which do not exist yet.
+
+        New cards are still imported as a package, since AnkiConnect cannot set the note GUID, which package imports use for matching notes.
+        """
+        with stage("direct_update", n_items=len(cards)):
+            existing_notes = self.gateway.get_note_infos_by_uuid([card.uuid for card in cards])
+            self.gateway.update_notes(
+                [
+                    self._to_note_update(card, existing_notes[card.uuid])
+                    for card in cards
+                    if card.uuid in existing_notes
+                ]
+            )
+        return [card for card in cards if card.uuid not in existing_notes]
+
     def _push_prompts(self, command: PushPrompts) -> None:
-        cards = [self.prompt_converter.prompt_to_card(e) for e in command.prompts]
+        with stage("convert", n_items=len(command.prompts)):
+            cards = [self.prompt_converter.prompt_to_card(e) for e in command.prompts]
+
+        if self.media_uploader is not None:
+            with stage("media", n_items=len(cards)):
+                cards = self.media_uploader.upload(command.prompts, cards)
 
         models = [card.genanki_model for card in cards]
         unique_models: dict[int, genanki.Model] = {
@@ -63,13 +189,25 @@ class AnkiConnectDestination(PromptDestination):
             for model in models  # type: ignore
         }
 
-        for model in unique_models.values():
-            self.gateway.update_model(model)
+        with stage("model_update", n_items=len(unique_models)):
+            for model in unique_models.values():
+                self.gateway.update_model(model)
+
+        if 0 < len(cards) <= self.direct_update_threshold:
+            cards = self._update_existing_notes(cards)
 
-        package = self._create_package(cards)
+        if not cards:
+            return
 
         log.info(f"Pushing {len(cards)} cards to Anki")
-        self.gateway.import_package(package)
+        self._import_chunks(cards)
+
+    def restyle(self) -> None:
+        """Update the templates and css of memium's note types, without pushing any notes. Anki re-renders existing cards with the new styling."""
+        models = self.prompt_converter.models
+        with stage("model_update", n_items=len(models)):
+            for model in models:
+                self.gateway.update_model(model)
 
     def update(self, commands: Sequence[PromptDestinationCommand]) -> None:
         for command in commands:
@@ -0,0 +1,63 @@
+import logging
+import warnings
+from collections.abc import Collection, Sequence
+from pathlib import Path
+
+from ..source.prompts.prompt import BasePrompt, DestinationPrompt
+from ..utils.metrics import stage
+from .ankiconnect.anki_converter import AnkiPromptConverter
+from .ankiconnect.anki_package import write_apkg
+from .destination import DeletePrompts, PromptDestination, PromptDestinationCommand, PushPrompts
+
+log = logging.getLogger(__name__)
+
+# Fixed timestamp for note and card ids, so repeated exports are identical
+EXPORT_TIMESTAMP = 1_600_000_000.0
+
+
+class ApkgExportDestination(PromptDestination):
+    """Writes prompts to an .apkg file, without a running Anki. Useful for building decks in batch jobs."""
+
+    def __init__(
+        self,
+        prompt_converter: AnkiPromptConverter,
+        output_path: Path,
+        timestamp: float = EXPORT_TIMESTAMP,
+    ) -> None:
+        self.prompt_converter = prompt_converter
+        self.output_path = output_path
+        self.timestamp = timestamp
+
+        # Don't care about genanki warnings, have our own tests
+        warnings.filterwarnings(
+            "ignore", module="genanki", message="^Field contained the following invalid HTML tags"
+        )
+
+    def get_all_prompts(self) -> Sequence[DestinationPrompt]:
+        # Each export is written from scratch, so it contains no prompts beforehand
+        return []
+
+    def get_prompts(self, scheduling_uids: Collection[int]) -> Sequence[DestinationPrompt]:  # noqa: ARG002
+        return []
+
+    def update(self, commands: Sequence[PromptDestinationCommand]) -> None:
+        prompts: list[BasePrompt] = []
+        for command in commands:
+            match command:
+                case DeletePrompts(_):
+                    pass
+                case PushPrompts(push_prompts):
+                    prompts += push_prompts
+
+        # Sort, so the export does not depend on the order in which files were read
+        sorted_prompts = sorted(prompts, key=lambda prompt: prompt.scheduling_uid)
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with stage("package_build") as timer:
+            n_cards = write_apkg(
+                (self.prompt_converter.prompt_to_card(prompt) for prompt in sorted_prompts),
+                path=self.output_path,
+                timestamp=self.timestamp,
+            )
+            timer.add_items(n_cards)
+        log.info(f"Exported {n_cards} cards to {self.output_path}")
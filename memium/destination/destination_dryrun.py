@@ -8,6 +8,10 @@ log = logging.getLogger(__name__)
 
 
 class DryRunDestination(AnkiConnectDestination):
+    def restyle(self) -> None:
+        for model in self.prompt_converter.models:
+            log.info(f"Updating styling of note type: {model.name}\n")  # type: ignore
+
     def update(self, commands: Sequence[PromptDestinationCommand]) -> None:
         for command in commands:
             match command:
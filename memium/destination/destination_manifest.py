@@ -0,0 +1,239 @@
+import json
+import logging
+from collections.abc import Collection, Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from ..source.prompts.prompt import BasePrompt, DestinationPrompt
+from ..source.prompts.prompt_uid import UIDPrompt
+from .destination import DeletePrompts, PromptDestination, PromptDestinationCommand, PushPrompts
+from .destination_ankiconnect import AnkiConnectDestination
+
+log = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    scheduling_uid: int
+    update_uid: int
+
+
+@dataclass(frozen=True)
+class Manifest:
+    base_deck: str
+    syncs_since_reconcile: int
+    entries: Mapping[int, ManifestEntry]
+    """Keyed by note id."""
+
+
+class SyncManifest:
+    """Stores the UIDs and note ids of everything in the deck after the last successful sync."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def load(self) -> Manifest | None:
+        if not self.path.exists():
+            return None
+
+        try:
+            data = json.loads(self.path.read_text())
+            if data["version"] != MANIFEST_VERSION:
+                return None
+            return Manifest(
+                base_deck=data["base_deck"],
+                syncs_since_reconcile=data["syncs_since_reconcile"],
+                entries={
+                    note_id: ManifestEntry(scheduling_uid=scheduling_uid, update_uid=update_uid)
+                    for note_id, scheduling_uid, update_uid in data["notes"]
+                },
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning(f"Ignoring unreadable sync manifest at {self.path}: {e}")
+            return None
+
+    def save(self, manifest: Manifest) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "base_deck": manifest.base_deck,
+            "syncs_since_reconcile": manifest.syncs_since_reconcile,
+            "notes": [
+                [note_id, entry.scheduling_uid, entry.update_uid]
+                for note_id, entry in manifest.entries.items()
+            ],
+        }
+        # Write to a temporary file first, so an interrupted write never leaves a truncated manifest
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data))
+        tmp_path.replace(self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _entries_from_prompts(prompts: Sequence[DestinationPrompt]) -> dict[int, ManifestEntry]:
+    return {
+        int(prompt.destination_id): ManifestEntry(
+            scheduling_uid=prompt.prompt.scheduling_uid, update_uid=prompt.prompt.update_uid
+        )
+        for prompt in prompts
+    }
+
+
+class ManifestDestination(PromptDestination):
+    """Diffs against a local manifest instead of reading the whole deck from Anki.
+
+    Memium is the only writer to its deck, so after each successful update, the manifest is the state of the deck. The deck is still read in full every reconcile_every syncs, or when full_reconcile is set, and any drift from the manifest is logged.
+    """
+
+    def __init__(
+        self,
+        destination: AnkiConnectDestination,
+        manifest: SyncManifest,
+        reconcile_every: int = 20,
+        full_reconcile: bool = False,
+    ) -> None:
+        self.destination = destination
+        self.manifest = manifest
+        self.reconcile_every = reconcile_every
+        self.full_reconcile = full_reconcile
+        self._base_deck = destination.prompt_converter.base_deck
+        self._cached: Manifest | None = None
+
+    def _load(self) -> Manifest | None:
+        if self._cached is None:
+            self._cached = self.manifest.load()
+        if self._cached is not None and self._cached.base_deck != self._base_deck:
+            return None
+        return self._cached
+
+    def _needs_reconcile(self, manifest: Manifest | None) -> bool:
+        return (
+            manifest is None
+            or self.full_reconcile
+            or manifest.syncs_since_reconcile >= self.reconcile_every
+        )
+
+    @staticmethod
+    def _log_drift(expected: Mapping[int, ManifestEntry], actual: Mapping[int, ManifestEntry]):
+        missing = expected.keys() - actual.keys()
+        unexpected = actual.keys() - expected.keys()
+        changed = {
+            note_id
+            for note_id in expected.keys() & actual.keys()
+            if expected[note_id] != actual[note_id]
+        }
+        if missing or unexpected or changed:
+            log.warning(
+                f"Deck drifted from the sync manifest: {len(missing)} notes missing, {len(unexpected)} unexpected, {len(changed)} changed. Using the deck's current state."
+            )
+        else:
+            log.info("Deck matches the sync manifest")
+
+    def _reconcile(self, manifest: Manifest | None) -> Sequence[DestinationPrompt]:
+        log.info("Reading all notes from Anki to reconcile the sync manifest")
+        prompts = self.destination.get_all_prompts()
+        entries = _entries_from_prompts(prompts)
+        if manifest is not None:
+            self._log_drift(manifest.entries, entries)
+
+        self._cached = Manifest(base_deck=self._base_deck, syncs_since_reconcile=0, entries=entries)
+        self.manifest.save(self._cached)
+        self.full_reconcile = False
+        return prompts
+
+    def get_all_prompts(self) -> Sequence[DestinationPrompt]:
+        manifest = self._load()
+        if self._needs_reconcile(manifest):
+            return self._reconcile(manifest)
+
+        assert manifest is not None
+        log.info(f"Diffing against the sync manifest with {len(manifest.entries)} notes")
+        return [
+            DestinationPrompt(
+                UIDPrompt(
+                    scheduling_uid=entry.scheduling_uid, update_uid=entry.update_uid, tags=[]
+                ),
+                destination_id=str(note_id),
+            )
+            for note_id, entry in manifest.entries.items()
+        ]
+
+    def get_prompts(self, scheduling_uids: Collection[int]) -> Sequence[DestinationPrompt]:
+        manifest = self._load()
+        if manifest is None:
+            # Scoped reads are cheap, so do not reconcile the full deck for them
+            return self.destination.get_prompts(scheduling_uids)
+
+        uids = set(scheduling_uids)
+        return [
+            DestinationPrompt(
+                UIDPrompt(
+                    scheduling_uid=entry.scheduling_uid, update_uid=entry.update_uid, tags=[]
+                ),
+                destination_id=str(note_id),
+            )
+            for note_id, entry in manifest.entries.items()
+            if entry.scheduling_uid in uids
+        ]
+
+    def _pushed_entries(self, prompts: Sequence[BasePrompt]) -> dict[int, ManifestEntry] | None:
+        """Look up the note ids of pushed prompts. Returns None if any of them are not in the deck."""
+        by_scheduling_uid = {prompt.scheduling_uid: prompt for prompt in prompts}
+        note_infos = self.destination.get_note_infos_by_uuid(by_scheduling_uid.keys())
+        if note_infos.keys() != by_scheduling_uid.keys():
+            return None
+
+        # Record the update UIDs stored on the notes, which also cover e.g. the notes' images
+        converter = self.destination.prompt_converter
+        return {
+            note_info.noteId: ManifestEntry(
+                scheduling_uid=scheduling_uid,
+                update_uid=converter.note_info_to_prompt(note_info).prompt.update_uid,
+            )
+            for scheduling_uid, note_info in note_infos.items()
+        }
+
+    def _invalidate(self, reason: str) -> None:
+        log.warning(f"{reason}, the deck will be fully read on the next sync")
+        self._cached = None
+        self.manifest.clear()
+
+    def update(self, commands: Sequence[PromptDestinationCommand]) -> None:
+        manifest = self._load()
+        try:
+            self.destination.update(commands)
+        except Exception:
+            self._invalidate("Update failed")
+            raise
+
+        if manifest is None:
+            # E.g. when pushing all prompts without diffing. Reconcile on the next sync instead.
+            return
+
+        entries = dict(manifest.entries)
+        for command in commands:
+            match command:
+                case DeletePrompts(prompts):
+                    for prompt in prompts:
+                        entries.pop(int(prompt.destination_id), None)
+                case PushPrompts(prompts):
+                    try:
+                        pushed_entries = self._pushed_entries(prompts)
+                    except Exception:
+                        self._invalidate("Could not look up the pushed notes in Anki")
+                        raise
+                    if pushed_entries is None:
+                        self._invalidate("Could not find all pushed notes in Anki")
+                        return
+                    entries.update(pushed_entries)
+
+        self._cached = Manifest(
+            base_deck=self._base_deck,
+            syncs_since_reconcile=manifest.syncs_since_reconcile + 1,
+            entries=entries,
+        )
+        self.manifest.save(self._cached)
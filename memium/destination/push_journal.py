@@ -0,0 +1,41 @@
+import logging
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+class PushJournal:
+    """Records which chunks of a push have been imported, so an interrupted push can resume from the last successful chunk.
+
+    The journal belongs to a single push, identified by a key for all of its cards. Starting a different push discards it, so chunks are never skipped because another push imported them.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def completed_chunks(self, push_key: int) -> set[int]:
+        if not self.path.exists():
+            return set()
+
+        lines = self.path.read_text().splitlines()
+        if lines[:1] != [f"push {push_key}"]:
+            return set()
+        # Ignore partially written lines, e.g. if the process was killed while recording
+        return {int(line) for line in lines[1:] if line.strip().isdigit()}
+
+    def start(self, push_key: int) -> set[int]:
+        """Start or resume the push with push_key. Returns the chunks imported by it so far."""
+        completed_chunks = self.completed_chunks(push_key)
+        if not completed_chunks:
+            if self.path.exists():
+                log.info("Discarding the push journal, since it belongs to a different push")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(f"push {push_key}\n")
+        return completed_chunks
+
+    def record(self, chunk_key: int) -> None:
+        with self.path.open("a") as f:
+            f.write(f"{chunk_key}\n")
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
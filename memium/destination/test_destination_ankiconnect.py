@@ -1,5 +1,7 @@
 from collections.abc import Mapping
+from pathlib import Path
 
+import genanki
 import pytest
 
 from ..source.prompts.prompt_cloze import ClozeWithoutDoc
@@ -10,10 +12,12 @@ from .ankiconnect.ankiconnect_gateway import (
     ImportPackage,
     SpieAnkiconnectGateway,
     UpdateModel,
+    UpdateNotes,
 )
 from .ankiconnect.test_ankiconnect_gateway import MockNoteInfo
 from .destination import PushPrompts
 from .destination_ankiconnect import AnkiConnectDestination
+from .push_journal import PushJournal
 
 
 @pytest.mark.parametrize(
@@ -76,3 +80,128 @@ def test_ankiconnect_push_prompts():
         assert (
             len([c for c in gateway.executed_commands if isinstance(c, command[0])]) == command[1]
         )
+
+
+def test_ankiconnect_restyle_only_updates_models():
+    gateway = SpieAnkiconnectGateway()
+    AnkiConnectDestination(
+        gateway=gateway,
+        prompt_converter=AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS"),
+    ).restyle()
+
+    assert [type(c) for c in gateway.executed_commands] == [UpdateModel, UpdateModel]
+    assert all(c.model.css == "FakeCSS" for c in gateway.executed_commands)  # type: ignore
+
+
+@pytest.mark.parametrize(
+    ("direct_update_threshold", "n_direct_updates", "n_imported_notes"), [(25, 1, 1), (0, 0, 2)]
+)
+def test_ankiconnect_push_prompts_updates_existing_notes_directly(
+    direct_update_threshold: int, n_direct_updates: int, n_imported_notes: int
+):
+    existing_prompt = QAWithoutDoc(question="FakeQuestion", answer="FakeAnswer", add_tags=[])
+    gateway = SpieAnkiconnectGateway(
+        note_infos=[
+            MockNoteInfo(
+                noteId=42,
+                fields={"UUID": AnkiField(value=str(existing_prompt.scheduling_uid), order=0)},
+            )
+        ]
+    )
+    dest = AnkiConnectDestination(
+        gateway=gateway,
+        prompt_converter=AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS"),
+        direct_update_threshold=direct_update_threshold,
+    )
+    dest.update(
+        [
+            PushPrompts(
+                prompts=[
+                    QAWithoutDoc(question="FakeQuestion", answer="FakeAnswer", add_tags=["NewTag"]),
+                    ClozeWithoutDoc(text="FakeText", add_tags=["FakeTag"]),
+                ]
+            )
+        ]
+    )
+
+    updates = [
+        update
+        for c in gateway.executed_commands
+        if isinstance(c, UpdateNotes)
+        for update in c.updates
+    ]
+    assert len(updates) == n_direct_updates
+    if updates:
+        assert updates[0].note_id == 42
+        assert updates[0].tags == ["NewTag"]
+
+    import_package_command = next(
+        c for c in gateway.executed_commands if isinstance(c, ImportPackage)
+    )
+    assert (
+        sum(len(deck.notes) for deck in import_package_command.package.decks)  # type: ignore
+        == n_imported_notes
+    )
+
+
+class FailingImportGateway(SpieAnkiconnectGateway):
+    def __init__(self, fail_on_import_nr: int) -> None:
+        super().__init__()
+        self.fail_on_import_nr = fail_on_import_nr
+
+    def import_package(self, package: genanki.Package) -> None:
+        n_imports = len([c for c in self.executed_commands if isinstance(c, ImportPackage)])
+        if n_imports + 1 == self.fail_on_import_nr:
+            raise ConnectionError("Anki went away")
+        super().import_package(package)
+
+
+def push_with_journal(
+    gateway: SpieAnkiconnectGateway, journal: PushJournal, prompts: PushPrompts
+) -> None:
+    AnkiConnectDestination(
+        gateway=gateway,
+        prompt_converter=AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS"),
+        direct_update_threshold=0,
+        chunk_size=1,
+        push_journal=journal,
+    ).update([prompts])
+
+
+def n_imports(gateway: SpieAnkiconnectGateway) -> int:
+    return len([c for c in gateway.executed_commands if isinstance(c, ImportPackage)])
+
+
+def test_ankiconnect_push_prompts_resumes_from_journal(tmp_path: Path):
+    journal = PushJournal(tmp_path / ".memium" / "push_journal.txt")
+    prompts = PushPrompts(
+        prompts=[
+            QAWithoutDoc(question=f"FakeQuestion{i}", answer="FakeAnswer", add_tags=[])
+            for i in range(3)
+        ]
+    )
+
+    with pytest.raises(ConnectionError):
+        push_with_journal(FailingImportGateway(fail_on_import_nr=2), journal, prompts)
+
+    resumed_gateway = SpieAnkiconnectGateway()
+    push_with_journal(resumed_gateway, journal, prompts)
+    assert n_imports(resumed_gateway) == 2
+    assert not journal.path.exists()
+
+
+def test_ankiconnect_different_push_does_not_resume_journal(tmp_path: Path):
+    journal = PushJournal(tmp_path / ".memium" / "push_journal.txt")
+    prompts = [
+        QAWithoutDoc(question=f"FakeQuestion{i}", answer="FakeAnswer", add_tags=[])
+        for i in range(3)
+    ]
+    with pytest.raises(ConnectionError):
+        push_with_journal(
+            FailingImportGateway(fail_on_import_nr=2), journal, PushPrompts(prompts=prompts)
+        )
+
+    # The first chunk matches the failed push's, but must still be imported, e.g. since its notes may have been deleted since
+    gateway = SpieAnkiconnectGateway()
+    push_with_journal(gateway, journal, PushPrompts(prompts=prompts[:1]))
+    assert n_imports(gateway) == 1
@@ -0,0 +1,39 @@
+import sqlite3
+import zipfile
+from pathlib import Path
+
+from ..source.prompts.prompt_cloze import ClozeWithoutDoc
+from ..source.prompts.prompt_qa import QAWithoutDoc
+from .ankiconnect.anki_converter import AnkiPromptConverter
+from .destination import PushPrompts
+from .destination_apkg import ApkgExportDestination
+
+
+def export(output_path: Path, prompts: PushPrompts) -> None:
+    ApkgExportDestination(
+        prompt_converter=AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS"),
+        output_path=output_path,
+    ).update([prompts])
+
+
+def test_apkg_export_is_deterministic(tmp_path: Path):
+    prompts = [
+        QAWithoutDoc(
+            question="FakeQuestion", answer="FakeAnswer", add_tags=["anki/deck/FakeSubdeck"]
+        ),
+        ClozeWithoutDoc(text="FakeText {{c1::cloze}}", add_tags=["FakeTag"]),
+    ]
+
+    export(tmp_path / "first.apkg", PushPrompts(prompts))
+    export(tmp_path / "second.apkg", PushPrompts(list(reversed(prompts))))
+
+    first = (tmp_path / "first.apkg").read_bytes()
+    assert first == (tmp_path / "second.apkg").read_bytes()
+
+    with zipfile.ZipFile(tmp_path / "first.apkg") as apkg:
+        apkg.extract("collection.anki2", tmp_path)
+    conn = sqlite3.connect(tmp_path / "collection.anki2")
+    guids = {guid for (guid,) in conn.execute("SELECT guid FROM notes")}
+    conn.close()
+
+    assert guids == {str(prompt.scheduling_uid) for prompt in prompts}
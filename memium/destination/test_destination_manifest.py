@@ -0,0 +1,152 @@
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import genanki
+import pytest
+
+from ..source.prompts.prompt_qa import QAWithoutDoc
+from .ankiconnect.anki_converter import AnkiPromptConverter
+from .ankiconnect.ankiconnect_gateway import AnkiField, NoteInfo, SpieAnkiconnectGateway
+from .ankiconnect.test_ankiconnect_gateway import MockNoteInfo
+from .destination import DeletePrompts, PushPrompts
+from .destination_ankiconnect import (
+    FULL_READ_THRESHOLD,
+    UID_QUERY_BATCH_SIZE,
+    AnkiConnectDestination,
+)
+from .destination_manifest import ManifestDestination, SyncManifest
+
+
+class CountingGateway(SpieAnkiconnectGateway):
+    def __init__(self, note_infos: Sequence[NoteInfo] = ()) -> None:
+        super().__init__(note_infos)
+        self.n_full_reads = 0
+
+    def get_all_note_infos(self) -> Sequence[NoteInfo]:
+        self.n_full_reads += 1
+        return super().get_all_note_infos()
+
+    def delete_notes(self, note_ids: Sequence[int]) -> None:
+        self.note_infos = [info for info in self.note_infos if info.noteId not in note_ids]
+
+
+class FailingGateway(CountingGateway):
+    def import_package(self, package: genanki.Package) -> None:  # noqa: ARG002
+        raise ConnectionError("Anki went away")
+
+
+class FailingLookupGateway(CountingGateway):
+    def get_note_infos_by_uuid(self, uuids: Sequence[int]) -> Mapping[int, NoteInfo]:  # noqa: ARG002
+        raise ConnectionError("Anki went away")
+
+
+class BatchRecordingGateway(CountingGateway):
+    def __init__(self, note_infos: Sequence[NoteInfo] = ()) -> None:
+        super().__init__(note_infos)
+        self.batch_sizes: list[int] = []
+
+    def get_note_infos_by_uuid(self, uuids: Sequence[int]) -> Mapping[int, NoteInfo]:
+        self.batch_sizes.append(len(uuids))
+        return super().get_note_infos_by_uuid(uuids)
+
+
+def note_info(note_id: int, scheduling_uid: int, update_uid: int) -> NoteInfo:
+    return MockNoteInfo(
+        noteId=note_id,
+        fields={
+            "UUID": AnkiField(value=str(scheduling_uid), order=0),
+            "UpdateUID": AnkiField(value=str(update_uid), order=1),
+        },
+    )
+
+
+def manifest_destination(
+    gateway: CountingGateway, tmp_path: Path, reconcile_every: int = 20
+) -> ManifestDestination:
+    return ManifestDestination(
+        destination=AnkiConnectDestination(
+            gateway=gateway,
+            prompt_converter=AnkiPromptConverter(base_deck="FakeDeck", card_css="FakeCSS"),
+        ),
+        manifest=SyncManifest(tmp_path / "sync_manifest.json"),
+        reconcile_every=reconcile_every,
+    )
+
+
+def test_warm_sync_diffs_against_manifest(tmp_path: Path):
+    gateway = CountingGateway(note_infos=[note_info(1, 10, 11), note_info(2, 20, 21)])
+    assert len(manifest_destination(gateway, tmp_path).get_all_prompts()) == 2
+
+    new_prompt = QAWithoutDoc(question="FakeQuestion", answer="FakeAnswer", add_tags=[])
+    # The note Anki creates on import
+    gateway.note_infos.append(note_info(3, new_prompt.scheduling_uid, new_prompt.update_uid))
+    destination = manifest_destination(gateway, tmp_path)
+    destination.update(
+        [
+            DeletePrompts(
+                prompts=[p for p in destination.get_all_prompts() if p.destination_id == "1"]
+            ),
+            PushPrompts(prompts=[new_prompt]),
+        ]
+    )
+
+    prompts = manifest_destination(gateway, tmp_path).get_all_prompts()
+    assert gateway.n_full_reads == 1
+    assert {
+        (int(p.destination_id), p.prompt.scheduling_uid, p.prompt.update_uid) for p in prompts
+    } == {(2, 20, 21), (3, new_prompt.scheduling_uid, new_prompt.update_uid)}
+
+
+def test_periodic_reconcile_logs_drift(tmp_path: Path, caplog: pytest.LogCaptureFixture):
+    gateway = CountingGateway(note_infos=[note_info(1, 10, 11)])
+    destination = manifest_destination(gateway, tmp_path, reconcile_every=1)
+    destination.get_all_prompts()
+    destination.update([])
+
+    gateway.note_infos = [note_info(1, 10, 12)]  # Edited in Anki
+    prompts = destination.get_all_prompts()
+
+    assert gateway.n_full_reads == 2
+    assert prompts[0].prompt.update_uid == 12
+    assert "1 changed" in caplog.text
+
+
+def test_failed_update_invalidates_manifest(tmp_path: Path):
+    gateway = FailingGateway(note_infos=[note_info(1, 10, 11)])
+    destination = manifest_destination(gateway, tmp_path)
+    destination.get_all_prompts()
+
+    with pytest.raises(ConnectionError):
+        destination.update(
+            [PushPrompts(prompts=[QAWithoutDoc(question="Q", answer="A", add_tags=[])])]
+        )
+
+    assert not (tmp_path / "sync_manifest.json").exists()
+    manifest_destination(gateway, tmp_path).get_all_prompts()
+    assert gateway.n_full_reads == 2
+
+
+def test_failed_lookup_of_pushed_notes_invalidates_manifest(tmp_path: Path):
+    gateway = FailingLookupGateway(note_infos=[note_info(1, 10, 11)])
+    destination = manifest_destination(gateway, tmp_path)
+    destination.get_all_prompts()
+
+    with pytest.raises(ConnectionError):
+        destination.update(
+            [PushPrompts(prompts=[QAWithoutDoc(question="Q", answer="A", add_tags=[])])]
+        )
+
+    assert not (tmp_path / "sync_manifest.json").exists()
+
+
+def test_pushed_notes_are_looked_up_in_batches(tmp_path: Path):
+    gateway = BatchRecordingGateway()
+    destination = manifest_destination(gateway, tmp_path).destination
+
+    destination.get_note_infos_by_uuid(range(UID_QUERY_BATCH_SIZE + 1))
+    assert gateway.batch_sizes == [UID_QUERY_BATCH_SIZE, 1]
+
+    # For many UIDs, the deck is read once instead
+    destination.get_note_infos_by_uuid(range(FULL_READ_THRESHOLD + 1))
+    assert gateway.n_full_reads == 1
+    assert len(gateway.batch_sizes) == 2
@@ -1,9 +1,14 @@
-from collections.abc import Mapping, Sequence
+import dataclasses
+import logging
+from collections.abc import Collection, Iterable, Mapping, Sequence
 from dataclasses import dataclass
-from typing import Generic, Protocol, TypeVar
+from typing import Any, Generic, Protocol, TypeVar
 
 from .destination.destination import DeletePrompts, PromptDestinationCommand, PushPrompts
 from .source.prompts.prompt import BasePrompt, DestinationPrompt
+from .utils.metrics import stage
+
+log = logging.getLogger(__name__)
 
 K = TypeVar("K")
 T = TypeVar("T")
@@ -28,23 +33,155 @@ class GeneralSyncer(Generic[K, T, S]):
         return [value for key, value in self.destination.items() if key not in self.source]
 
 
+@dataclass(frozen=True)
+class PromptDiff:
+    to_delete: Sequence[DestinationPrompt]
+    to_push: Sequence[BasePrompt]
+    n_unchanged: int
+    n_updated: int
+    n_added: int
+
+    @property
+    def n_deleted(self) -> int:
+        return len(self.to_delete)
+
+    def keeping(self, scheduling_uids: Collection[int]) -> "PromptDiff":
+        """The diff without deleting the prompts with the scheduling UIDs, e.g. from documents which could not be read."""
+        return dataclasses.replace(
+            self,
+            to_delete=[p for p in self.to_delete if p.prompt.scheduling_uid not in scheduling_uids],
+        )
+
+    @property
+    def commands(self) -> Sequence[PromptDestinationCommand]:
+        return [DeletePrompts(self.to_delete), PushPrompts(self.to_push)]
+
+    def __str__(self) -> str:
+        return f"{self.n_unchanged} unchanged, {self.n_updated} updated, {self.n_added} added, {self.n_deleted} deleted"
+
+
 class PromptDiffDeterminer(BaseDiffDeterminer):
+    def diff(
+        self, source_prompts: Sequence[BasePrompt], destination_prompts: Sequence[DestinationPrompt]
+    ) -> PromptDiff:
+        # UIDs are expensive to compute, so compute each prompt's UIDs exactly once.
+        with stage("uid_hashing", n_items=len(source_prompts) + len(destination_prompts)):
+            source_keys = [(prompt.scheduling_uid, prompt.update_uid) for prompt in source_prompts]
+            destination_keys = [
+                (prompt.prompt.scheduling_uid, prompt.prompt.update_uid)
+                for prompt in destination_prompts
+            ]
+        with stage("diff", n_items=len(source_prompts) + len(destination_prompts)):
+            # Index from UID to position. As with a dict of prompts, the last prompt with a given UID wins.
+            source_by_update_uid = {update_uid: i for i, (_, update_uid) in enumerate(source_keys)}
+            source_scheduling_uids = {scheduling_uid for scheduling_uid, _ in source_keys}
+            destination_by_scheduling_uid = {
+                scheduling_uid: i for i, (scheduling_uid, _) in enumerate(destination_keys)
+            }
+            destination_update_uids = {update_uid for _, update_uid in destination_keys}
+
+            # Update prompts if content or tags have changed. This doesn't affect scheduling.
+            push_indices = [
+                i
+                for update_uid, i in source_by_update_uid.items()
+                if update_uid not in destination_update_uids
+            ]
+            n_added = sum(
+                source_keys[i][0] not in destination_by_scheduling_uid for i in push_indices
+            )
+
+            # Only delete prompts whose content have changed. This essentially resets their scheduling.
+            to_delete = [
+                destination_prompts[i]
+                for scheduling_uid, i in destination_by_scheduling_uid.items()
+                if scheduling_uid not in source_scheduling_uids
+            ]
+
+            return PromptDiff(
+                to_delete=to_delete,
+                to_push=[source_prompts[i] for i in push_indices],
+                n_unchanged=len(source_by_update_uid) - len(push_indices),
+                n_updated=len(push_indices) - n_added,
+                n_added=n_added,
+            )
+
     def sync(
         self, source_prompts: Sequence[BasePrompt], destination_prompts: Sequence[DestinationPrompt]
     ) -> Sequence[PromptDestinationCommand]:
-        # Update prompts if content or tags have changed. This doesn't affect scheduling.
-        prompts_to_update = GeneralSyncer(
-            source={prompt.update_uid: prompt for prompt in source_prompts},
-            destination={prompt.prompt.update_uid: prompt for prompt in destination_prompts},
-        ).only_in_source()
-
-        # Only delete prompts whose content have changed. This essentially resets their scheduling.
-        prompts_to_delete = GeneralSyncer(
-            source={prompt.scheduling_uid: prompt for prompt in source_prompts},
-            destination={
-                dest_prompt.prompt.scheduling_uid: dest_prompt
-                for dest_prompt in destination_prompts
-            },
-        ).only_in_destination()
-
-        return [DeletePrompts(prompts_to_delete), PushPrompts(prompts_to_update)]
+        diff = self.diff(source_prompts=source_prompts, destination_prompts=destination_prompts)
+        log.info(f"Diff: {diff}")
+        return diff.commands
+
+
+class NumpyPromptDiffDeterminer(PromptDiffDeterminer):
+    """Diffs very large decks with UIDs stored in NumPy arrays, using a few bytes per prompt instead of dictionaries.
+
+    The result is identical to PromptDiffDeterminer. Requires numpy, e.g. `pip install memium[numpy]`.
+    """
+
+    def diff(
+        self, source_prompts: Sequence[BasePrompt], destination_prompts: Sequence[DestinationPrompt]
+    ) -> PromptDiff:
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError(
+                "NumpyPromptDiffDeterminer requires numpy. Install it with `pip install memium[numpy]`."
+            ) from e
+
+        def uids(values: Iterable[int], count: int) -> Any:
+            return np.fromiter(values, dtype=np.uint64, count=count)
+
+        def uid_index(uid_array: Any) -> tuple[Any, Any, Any]:
+            """Sorted unique UIDs, with the positions of their first and last occurrence."""
+            unique, first = np.unique(uid_array, return_index=True)
+            _, last_reversed = np.unique(uid_array[::-1], return_index=True)
+            return unique, first, len(uid_array) - 1 - last_reversed
+
+        def contains(sorted_uids: Any, needles: Any) -> Any:
+            if len(sorted_uids) == 0:
+                return np.zeros(len(needles), dtype=np.bool_)
+            positions = np.minimum(np.searchsorted(sorted_uids, needles), len(sorted_uids) - 1)
+            return sorted_uids[positions] == needles
+
+        def select(unique_first_last: tuple[Any, ...], mask: Any) -> Any:
+            """Positions of the selected UIDs. As with a dict of prompts, ordered by first occurrence, with the last prompt winning."""
+            _, first, last = unique_first_last
+            order = np.argsort(first[mask], kind="stable")
+            return last[mask][order]
+
+        n_source, n_destination = len(source_prompts), len(destination_prompts)
+        with stage("uid_hashing", n_items=n_source + n_destination):
+            source_scheduling = uids((p.scheduling_uid for p in source_prompts), n_source)
+            source_update = uids((p.update_uid for p in source_prompts), n_source)
+            destination_scheduling = uids(
+                (p.prompt.scheduling_uid for p in destination_prompts), n_destination
+            )
+            destination_update = uids(
+                (p.prompt.update_uid for p in destination_prompts), n_destination
+            )
+        with stage("diff", n_items=n_source + n_destination):
+            source_update_index = uid_index(source_update)
+            destination_scheduling_index = uid_index(destination_scheduling)
+
+            push_positions = select(
+                source_update_index,
+                ~contains(np.unique(destination_update), source_update_index[0]),
+            )
+            delete_positions = select(
+                destination_scheduling_index,
+                ~contains(np.unique(source_scheduling), destination_scheduling_index[0]),
+            )
+            n_added = int(
+                np.count_nonzero(
+                    ~contains(destination_scheduling_index[0], source_scheduling[push_positions])
+                )
+            )
+
+            return PromptDiff(
+                to_delete=[destination_prompts[i] for i in delete_positions.tolist()],
+                to_push=[source_prompts[i] for i in push_positions.tolist()],
+                n_unchanged=len(source_update_index[0]) - len(push_positions),
+                n_updated=len(push_positions) - n_added,
+                n_added=n_added,
+            )
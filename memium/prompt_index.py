@@ -0,0 +1,314 @@
+import logging
+import sqlite3
+from collections.abc import Collection, Iterable, Sequence
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .source.document import DocumentHandle
+from .source.prompts.prompt import BasePrompt
+from .source.prompts.prompt_from_doc import PromptFromDocMixin
+from .source.prompts.prompt_uid import UIDPrompt
+from .source.scope import SyncScope
+from .utils.metrics import stage
+
+if TYPE_CHECKING:
+    from .destination.ankiconnect.anki_converter import AnkiPromptConverter
+    from .source.prompt_source import ExtractedPrompt
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prompts (
+    scheduling_uid INTEGER PRIMARY KEY,
+    update_uid INTEGER NOT NULL,
+    path TEXT NOT NULL REFERENCES documents (path) ON DELETE CASCADE,
+    line_nr INTEGER,
+    deck TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT NOT NULL REFERENCES documents (path) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (tag, path)
+);
+CREATE INDEX IF NOT EXISTS prompts_path ON prompts (path);
+CREATE INDEX IF NOT EXISTS prompts_deck ON prompts (deck);
+CREATE INDEX IF NOT EXISTS tags_path ON tags (path);
+"""
+
+
+def prompt_index_path(input_dir: Path) -> Path:
+    return input_dir / ".memium" / "prompt_index.sqlite"
+
+
+@dataclass(frozen=True)
+class IndexedPrompt:
+    scheduling_uid: int
+    update_uid: int
+    path: Path
+    """Relative to the indexed directory."""
+    line_nr: int | None
+    deck: str
+    kind: str
+    text: str
+    """The question of Q/A prompts, the text of cloze prompts."""
+
+
+@dataclass(frozen=True)
+class IndexedDocument:
+    path: Path
+    """Relative to the indexed directory."""
+    tags: tuple[str, ...]
+    scheduling_uids: tuple[int, ...]
+
+
+_PROMPT_COLUMNS = "scheduling_uid, update_uid, path, line_nr, deck, kind, text"
+
+
+def _to_indexed_prompt(row: tuple[int, int, str, int | None, str, str, str]) -> IndexedPrompt:
+    scheduling_uid, update_uid, path, line_nr, deck, kind, text = row
+    return IndexedPrompt(
+        scheduling_uid=scheduling_uid,
+        update_uid=update_uid,
+        path=Path(path),
+        line_nr=line_nr,
+        deck=deck,
+        kind=kind,
+        text=text,
+    )
+
+
+class PromptIndex:
+    """A local SQLite index of the documents, prompts, tags and decks of a directory, for fast lookups without extracting prompts.
+
+    On each update, only documents whose content or prompt UIDs changed since the previous update are re-indexed. Paths are stored relative to root_dir. The converter determines the deck of each prompt, and is only needed for updates.
+    """
+
+    def __init__(
+        self, index_path: Path, root_dir: Path, converter: "AnkiPromptConverter | None" = None
+    ) -> None:
+        self.index_path = index_path
+        self.root_dir = root_dir
+        self.converter = converter
+
+    def _connect(self) -> sqlite3.Connection:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _relative(self, path: Path) -> str:
+        """Paths under root_dir are made relative to it. Other paths are assumed to already be relative to it."""
+        for candidate, root_dir in [
+            (path, self.root_dir),
+            (path.resolve(), self.root_dir.resolve()),
+        ]:
+            try:
+                return candidate.relative_to(root_dir).as_posix()
+            except ValueError:
+                continue
+        return path.as_posix()
+
+    @staticmethod
+    def _kind_and_text(prompt: BasePrompt) -> tuple[str, str]:
+        # Imported here, so lookups do not load BeautifulSoup etc.
+        from .source.prompts.prompt_cloze import ClozePrompt
+        from .source.prompts.prompt_qa import QAPrompt
+
+        match prompt:
+            case QAPrompt():
+                return "qa", prompt.question
+            case ClozePrompt():
+                return "cloze", prompt.text
+            case _:
+                return type(prompt).__name__, ""
+
+    def update(
+        self,
+        prompts: Iterable["ExtractedPrompt"],
+        only_paths: Collection[Path] | None = None,
+        keep_paths: Collection[Path] = (),
+    ) -> None:
+        """Index the prompts, which should be all prompts from the directory. Their UIDs are taken from extraction. Documents without prompts are removed from the index.
+
+        For scoped syncs, pass the documents in the scope as only_paths. Then only those are removed if they have no prompts. Documents in keep_paths are left as they were indexed, e.g. if not all their prompts could be extracted.
+        """
+        converter = self.converter
+        if converter is None:
+            raise ValueError("A converter is required to update the index")
+
+        prompts_by_document: dict[DocumentHandle, list[tuple[PromptFromDocMixin, UIDPrompt]]] = {}
+        for extracted in prompts:
+            if isinstance(extracted.prompt, PromptFromDocMixin):
+                prompts_by_document.setdefault(extracted.prompt.parent_doc, []).append(
+                    (extracted.prompt, extracted.uids)
+                )
+
+        with stage("index") as timer, closing(self._connect()) as conn, conn:
+            base_deck = conn.execute("SELECT value FROM meta WHERE key = 'base_deck'").fetchone()
+            if base_deck != (converter.base_deck,):
+                # Decks depend on the base deck, so all documents must be re-indexed
+                conn.execute("DELETE FROM documents")
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('base_deck', ?)", (converter.base_deck,)
+                )
+
+            indexed_hashes = dict(conn.execute("SELECT path, content_hash FROM documents"))
+            indexed_update_uids = dict(
+                conn.execute("SELECT scheduling_uid, update_uid FROM prompts")
+            )
+            current_paths = {self._relative(handle.source_path) for handle in prompts_by_document}
+            kept_paths = {self._relative(path) for path in keep_paths}
+            removable_paths = (
+                indexed_hashes.keys()
+                if only_paths is None
+                else {self._relative(path) for path in only_paths}
+            )
+            conn.executemany(
+                "DELETE FROM documents WHERE path = ?",
+                [(path,) for path in removable_paths - current_paths - kept_paths],
+            )
+
+            for handle, document_prompts in prompts_by_document.items():
+                path = self._relative(handle.source_path)
+                if path in kept_paths:
+                    continue
+                # The update UIDs also depend on media, which may change without the document changing
+                if indexed_hashes.get(path) == handle.content_hash and all(
+                    indexed_update_uids.get(uids.scheduling_uid) == uids.update_uid
+                    for _, uids in document_prompts
+                ):
+                    continue
+
+                timer.add_items(len(document_prompts))
+                conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+                conn.execute("INSERT INTO documents VALUES (?, ?)", (path, handle.content_hash))
+                conn.executemany(
+                    "INSERT INTO tags VALUES (?, ?)", [(path, tag) for tag in set(handle.tags)]
+                )
+                rows: list[tuple[object, ...]] = []
+                for prompt, uids in document_prompts:
+                    card = converter.prompt_to_card(prompt, uids=uids)
+                    rows.append(
+                        (
+                            uids.scheduling_uid,
+                            uids.update_uid,
+                            path,
+                            prompt.line_nr,
+                            card.deck,
+                            *self._kind_and_text(prompt),
+                        )
+                    )
+                # A prompt may be duplicated in another document, in which case the last one indexed wins
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO prompts ({_PROMPT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def _query(self, where: str, params: Sequence[object]) -> Sequence[IndexedPrompt]:
+        with closing(self._connect()) as conn:
+            return [
+                _to_indexed_prompt(row)
+                for row in conn.execute(
+                    f"SELECT {_PROMPT_COLUMNS} FROM prompts WHERE {where} ORDER BY path, line_nr",
+                    params,
+                )
+            ]
+
+    def _folder_range(self, folder: Path) -> tuple[str, str]:
+        # All paths in the folder sort between "folder/" and "folder0", since "0" follows "/". Unlike LIKE, this range uses the index.
+        prefix = self._relative(folder).rstrip("/")
+        if prefix in ("", "."):
+            return "", "\U0010ffff"
+        return f"{prefix}/", f"{prefix}0"
+
+    def get_documents(self, paths: Sequence[Path] = ()) -> Sequence[IndexedDocument]:
+        """Documents at or under any of paths, or all documents if none are given."""
+        conditions: list[str] = []
+        params: list[str] = []
+        for path in paths:
+            conditions.append("(path = ? OR (path >= ? AND path < ?))")
+            params += [self._relative(path), *self._folder_range(path)]
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"""SELECT path,
+                    (SELECT group_concat(tag, ' ') FROM tags WHERE tags.path = documents.path),
+                    (SELECT group_concat(scheduling_uid, ' ') FROM prompts WHERE prompts.path = documents.path)
+                FROM documents WHERE {" OR ".join(conditions) or "1"}""",
+                params,
+            ).fetchall()
+        return [
+            IndexedDocument(
+                path=Path(path),
+                tags=tuple(tags.split()) if tags else (),
+                scheduling_uids=tuple(int(uid) for uid in uids.split()) if uids else (),
+            )
+            for path, tags, uids in rows
+        ]
+
+    def get_scheduling_uids(self, paths: Collection[Path]) -> set[int]:
+        """The scheduling UIDs of the documents at paths, as last indexed."""
+        if not paths:
+            return set()
+        return {
+            uid for document in self.get_documents(list(paths)) for uid in document.scheduling_uids
+        }
+
+    def get_scope_documents(
+        self, scope: SyncScope, existing_paths: Collection[Path], in_scope_paths: Collection[Path]
+    ) -> Sequence[IndexedDocument]:
+        """The indexed documents whose prompts a scoped sync may update or delete.
+
+        Existing documents are included if they are in in_scope_paths, i.e. have the scope's tags now. Deleted documents are included if they had the scope's tags when indexed.
+        """
+        existing = {self._relative(path) for path in existing_paths}
+        in_scope = {self._relative(path) for path in in_scope_paths}
+        return [
+            document
+            for document in self.get_documents(scope.paths)
+            if (
+                document.path.as_posix() in in_scope
+                if document.path.as_posix() in existing
+                else scope.includes_tags(document.tags)
+            )
+        ]
+
+    def get_prompt(self, scheduling_uid: int) -> IndexedPrompt | None:
+        """E.g. to find the document of an Anki card, from the UUID field on the card."""
+        prompts = self._query("scheduling_uid = ?", (scheduling_uid,))
+        return prompts[0] if prompts else None
+
+    def get_document_prompts(self, document: Path) -> Sequence[IndexedPrompt]:
+        return self._query("path = ?", (self._relative(document),))
+
+    def get_folder_prompts(self, folder: Path) -> Sequence[IndexedPrompt]:
+        return self._query("path >= ? AND path < ?", self._folder_range(folder))
+
+    def count_folder_prompts(self, folder: Path) -> int:
+        with closing(self._connect()) as conn:
+            (count,) = conn.execute(
+                "SELECT count(*) FROM prompts WHERE path >= ? AND path < ?",
+                self._folder_range(folder),
+            ).fetchone()
+        return count
+
+    def get_tag_prompts(self, tag: str) -> Sequence[IndexedPrompt]:
+        """Prompts from documents with the tag, or a child of it, e.g. 'anki/deck' also matches 'anki/deck/child'."""
+        return self._query(
+            "path IN (SELECT path FROM tags WHERE tag = ? OR (tag >= ? AND tag < ?))",
+            (tag, f"{tag}/", f"{tag}0"),
+        )
+
+    def get_deck_prompts(self, deck: str) -> Sequence[IndexedPrompt]:
+        """Prompts in the deck, or one of its subdecks."""
+        return self._query("deck = ? OR (deck >= ? AND deck < ?)", (deck, f"{deck}::", f"{deck}:;"))
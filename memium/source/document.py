@@ -1,18 +1,43 @@
+import hashlib
 import re
-from collections.abc import Sequence
-from dataclasses import dataclass
+import sys
+from dataclasses import InitVar, dataclass, field
 from pathlib import Path
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
+class DocumentHandle:
+    """What prompts need to know about their document, without its content. Lets the content be released once prompts are extracted."""
+
+    source_path: Path
+    tags: tuple[str, ...]
+    content_hash: str
+
+    @property
+    def title(self) -> str:
+        return self.source_path.stem
+
+
+@dataclass(frozen=True, slots=True)
 class Document:
     content: str
     source_path: Path
+    content_hash: InitVar[str | None] = None
+    """Identifies the content, e.g. a hash of the file before sanitizing, if the source already computed one. Otherwise, the content is hashed."""
+    handle: DocumentHandle = field(init=False, repr=False, compare=False)
+    """Computed once, and shared by all prompts from the document."""
 
-    @property
-    def tags(self) -> Sequence[str]:
+    def __post_init__(self, content_hash: str | None) -> None:
         tag_strings: list[str] = list(re.findall(r"#[\w\/]+", self.content))
-        return [tag_string.replace("#", "") for tag_string in tag_strings]
+        # Tag strings are interned, since the same tags recur across documents
+        tags = tuple(sys.intern(tag_string.replace("#", "")) for tag_string in tag_strings)
+        if content_hash is None:
+            content_hash = hashlib.sha256(self.content.encode()).hexdigest()
+        object.__setattr__(self, "handle", DocumentHandle(self.source_path, tags, content_hash))
+
+    @property
+    def tags(self) -> tuple[str, ...]:
+        return self.handle.tags
 
     @property
     def title(self) -> str:
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import re
 from collections.abc import Sequence
@@ -7,7 +8,10 @@ from typing import Protocol
 
 from tqdm import tqdm
 
+from ..utils.metrics import stage
 from .document import Document
+from .scope import SyncScope
+from .time_budget import TimeBudget, TimeBudgetExceededError
 
 log = logging.getLogger(__name__)
 
@@ -24,14 +28,28 @@ class FileNotRetrievedError(Exception):
 class BaseDocumentSource(Protocol):
     def get_documents(self) -> Sequence[Document]: ...
 
+    def mark_incomplete(self, path: Path) -> None:
+        """Record that not all prompts could be extracted from the document at path. Sources which do not track this ignore it."""
+
 
 class MarkdownDocumentSource(BaseDocumentSource):
-    """Gets markdown documents. Returns valid markdown."""
+    """Gets markdown documents. Returns valid markdown.
+
+    If a scope is given, only its paths are walked, and only documents with its tags are returned. If a time_budget is given, documents which take longer to sanitize are skipped.
+
+    Documents which could not be retrieved, or which not all prompts could be extracted from, are kept in incomplete_paths until they are retrieved again, so syncs can keep their notes.
+    """
 
-    def __init__(self, directory: Path) -> None:
+    def __init__(
+        self, directory: Path, scope: SyncScope | None = None, time_budget: TimeBudget | None = None
+    ) -> None:
         self.directory = directory
+        self.scope = scope
+        self.time_budget = time_budget
+        self.incomplete_paths: set[Path] = set()
 
-    def _replace_wikilinks_with_styling(self, input_str: str) -> str:
+    @staticmethod
+    def _replace_wikilinks_with_styling(input_str: str) -> str:
         return input_str.replace("[[", "_").replace("]]", "_")
 
     @staticmethod
@@ -55,30 +73,70 @@ class MarkdownDocumentSource(BaseDocumentSource):
 
         return text
 
-    def _sanitize_to_valid_markdown(self, input_str: str) -> str:
-        aliases_handled = self._replace_alias_wiki_links(input_str)
-        wikilinks_replaced = self._replace_wikilinks_with_styling(aliases_handled)
+    @staticmethod
+    def _sanitize_to_valid_markdown(input_str: str) -> str:
+        aliases_handled = MarkdownDocumentSource._replace_alias_wiki_links(input_str)
+        wikilinks_replaced = MarkdownDocumentSource._replace_wikilinks_with_styling(aliases_handled)
         return wikilinks_replaced
 
     def _get_document_from_file(self, file_path: Path) -> Document | FileNotRetrievedError:
         try:
             try:
-                contents = file_path.read_text(encoding="utf8")
+                with stage("read", n_items=1):
+                    contents = file_path.read_text(encoding="utf8")
             except Exception as e:
                 raise Exception(f"Could not read file {file_path}") from e
 
+            # Shared by the time budget and the document, so the content is only hashed once
+            content_hash = hashlib.sha256(contents.encode()).hexdigest()
             try:
-                sanitized = self._sanitize_to_valid_markdown(contents)
+                with stage("sanitize", n_items=1):
+                    sanitized = (
+                        self._sanitize_to_valid_markdown(contents)
+                        if self.time_budget is None
+                        else self.time_budget.run(
+                            file_path,
+                            content_hash,
+                            "sanitize",
+                            MarkdownDocumentSource._sanitize_to_valid_markdown,
+                            contents,
+                        )
+                    )
+            except TimeBudgetExceededError:
+                raise
             except Exception as e:
                 raise Exception(f"Could not sanitize file {file_path}") from e
 
-            return Document(content=sanitized, source_path=file_path)
+            self.incomplete_paths.discard(file_path)
+            return Document(content=sanitized, source_path=file_path, content_hash=content_hash)
         except Exception as e:
             log.warning(f"Could not retrieve {file_path}: {e}")
+            self.mark_incomplete(file_path)
             return FileNotRetrievedError(file_path, e)
 
+    def mark_incomplete(self, path: Path) -> None:
+        self.incomplete_paths.add(path)
+
+    def get_paths(self) -> Sequence[Path]:
+        roots = self.scope.paths if self.scope and self.scope.paths else [self.directory]
+        with stage("file_walk") as timer:
+            paths = [
+                path
+                for root in roots
+                for path in ([root] if root.is_file() else root.rglob("*.md"))
+                if path.suffix == ".md"
+            ]
+            timer.add_items(len(paths))
+        return paths
+
+    def in_scope(self, document: Document) -> bool:
+        return self.scope is None or self.scope.includes_tags(document.tags)
+
+    def get_document(self, file_path: Path) -> Document | FileNotRetrievedError:
+        return self._get_document_from_file(file_path)
+
     def get_documents(self) -> Sequence[Document]:
-        md_files = list(self.directory.rglob("*.md"))
+        md_files = self.get_paths()
 
         notes: list[Document | FileNotRetrievedError] = []
 
@@ -87,4 +145,8 @@ class MarkdownDocumentSource(BaseDocumentSource):
                 notes.append(self._get_document_from_file(filepath))
                 pbar.update(1)
 
-        return [note for note in notes if not isinstance(note, FileNotRetrievedError)]
+        return [
+            note
+            for note in notes
+            if not isinstance(note, FileNotRetrievedError) and self.in_scope(note)
+        ]
@@ -82,7 +82,9 @@ class ClozePromptExtractor(BasePromptExtractor):
 
                     prompts.append(
                         ClozeFromDoc(
-                            text=prompt_content, parent_doc=document, line_nr=block_starting_line_nr
+                            text=prompt_content,
+                            parent_doc=document.handle,
+                            line_nr=block_starting_line_nr,
                         )
                     )
 
@@ -67,7 +67,7 @@ class QAPromptExtractor(BasePromptExtractor):
                     QAFromDoc(
                         question=question,
                         answer=answer,
-                        parent_doc=document,
+                        parent_doc=document.handle,
                         line_nr=block_starting_line_nr,
                     )
                 )
@@ -1,8 +1,8 @@
 import enum
+import itertools
 import re
-from collections.abc import Sequence
+from collections.abc import Iterator, Mapping, Sequence
 from dataclasses import dataclass
-from typing import Literal
 
 from memium.source.document import Document
 from memium.source.extractors.to_line_blocks import LineBlock, to_line_blocks
@@ -10,6 +10,10 @@ from memium.source.extractors.to_line_blocks import LineBlock, to_line_blocks
 from ..prompts.prompt_qa import QAFromDoc, QAPrompt
 from .extractor import BasePromptExtractor
 
+PLACEHOLDER = re.compile(r"\|(.+?)\|")
+# A pipe which is not inside a wikilink, e.g. not the one in [[Name|Alias]]
+CELL_SEPARATOR = re.compile(r"\|(?![^\[]*\]\])")
+
 
 class TableParseMode(enum.Enum):
     ASCENDING = "Ascending"
@@ -17,151 +21,133 @@ class TableParseMode(enum.Enum):
     ROWWISE = "Rowwise"
 
 
-@dataclass(frozen=True)
-class ParsedTable:
-    rows: list[dict[str, str]]
-    mode: TableParseMode
-    front: str
-    back: str
-    end_line_nr: int
+_MODES = {
+    "Ascending": TableParseMode.ASCENDING,
+    "Descending": TableParseMode.DESCENDING,
+    "Rowwise": TableParseMode.ROWWISE,
+    "Row-wise": TableParseMode.ROWWISE,
+}
+
+
+def split_cells(line: str) -> Sequence[str]:
+    """The stripped cells of a table row. Empty cells are kept, so later cells stay in their column. Pipes in wikilinks do not separate cells."""
+    segments = CELL_SEPARATOR.split(line) if "[[" in line else line.split("|")
+    # Text before the first and after the last pipe is not a cell, unless the row lacks them
+    start = 1 if segments[0] == "" else 0
+    end = -1 if len(segments) > 1 and segments[-1] == "" else len(segments)
+    return [cell.strip() for cell in segments[start:end]]
 
 
 @dataclass(frozen=True)
-class RowPair:
-    front: dict[str, str]
-    back: dict[str, str]
+class TemplatePlan:
+    """A template such as '|Column one|?', compiled against a table's header.
+
+    Literals and placeholders alternate, starting and ending with a literal.
+    """
+
+    literals: Sequence[str]
+    columns: Sequence[Sequence[int]]
+    """The indices of each placeholder's columns, last first, since the last column with a name wins. Empty if the table has no such column."""
+
+    def render(self, row: Sequence[str]) -> str | None:
+        """None if any placeholder has no value in the row."""
+        rendered = [self.literals[0]]
+        for columns, literal in zip(self.columns, self.literals[1:], strict=True):
+            # Rows may have fewer cells than the header
+            value = next((row[column] for column in columns if column < len(row)), "")
+            if not value:
+                return None
+            rendered += [value, literal]
+        return "".join(rendered)
+
+
+def compile_template(template: str, column_indices: Mapping[str, Sequence[int]]) -> TemplatePlan:
+    parts = PLACEHOLDER.split(template)
+    return TemplatePlan(
+        literals=parts[0::2], columns=[column_indices.get(name, ()) for name in parts[1::2]]
+    )
 
 
 @dataclass(frozen=True)
-class FrontBack:
-    front: str
-    back: str
+class ParsedTable:
+    rows: Sequence[Sequence[str]]
+    mode: TableParseMode
+    front: TemplatePlan
+    back: TemplatePlan
+    end_line_nr: int
 
 
 class TableExtractor(BasePromptExtractor):
     def _parse_table(self, block: LineBlock) -> Sequence[ParsedTable]:
+        """Each description line, e.g. 'Ascending // |Column one|? // |Column two|.', yields a table with all rows in the block."""
         if not block.content.startswith("|"):
             return []
 
-        rows: list[dict[str, str]] = []
-        parsed_tables: Sequence[ParsedTable] = []
-        for n, line in enumerate(block.content.strip().split("\n")):
-            data: dict[str, str] = {}
-            if n == 0:
-                header = [cell.strip() for cell in line.split("|") if cell]
-            if n > 1:
-                # Is a row
-                if line.startswith("|"):
-                    values = [cell.strip() for cell in line.split("|") if cell]
-                    for col, value in zip(header, values, strict=False):  # type: ignore
-                        data[col] = value
-                    rows.append(data)
-                # Is description
-                elif "//" in line:
-                    metadata = line.split("//")
-                    mode_string: Literal["Ascending", "Descending", "Rowwise", "Row-wise"] = (
-                        metadata[0].strip()
-                    )  # type: ignore
-
-                    match mode_string:
-                        case "Ascending":
-                            mode = TableParseMode.ASCENDING
-                        case "Descending":
-                            mode = TableParseMode.DESCENDING
-                        case "Rowwise" | "Row-wise":
-                            mode = TableParseMode.ROWWISE
-
-                    parsed_tables.append(
-                        ParsedTable(
-                            rows=rows,
-                            mode=mode,
-                            front=metadata[1].strip(),
-                            back=metadata[2].strip(),
-                            end_line_nr=block.end_line,
-                        )
-                    )
+        lines = block.content.strip().split("\n")
+        header = split_cells(lines[0])
+        column_indices: dict[str, list[int]] = {}
+        for i, name in enumerate(header):
+            column_indices.setdefault(name, []).insert(0, i)
+
+        rows: list[Sequence[str]] = []
+        descriptions: list[Sequence[str]] = []
+        for line in lines[2:]:
+            if line.startswith("|"):
+                rows.append(split_cells(line))
+            elif "//" in line:
+                descriptions.append(line.split("//"))
+
+        parsed_tables: list[ParsedTable] = []
+        for metadata in descriptions:
+            mode_string = metadata[0].strip()
+            if mode_string not in _MODES:
+                raise ValueError(f"Unknown table mode '{mode_string}' in {block.content}")
+            parsed_tables.append(
+                ParsedTable(
+                    rows=rows,
+                    mode=_MODES[mode_string],
+                    front=compile_template(metadata[1].strip(), column_indices),
+                    back=compile_template(metadata[2].strip(), column_indices),
+                    end_line_nr=block.end_line,
+                )
+            )
         return parsed_tables
 
-    def _get_row_pair(self, parsed_table: ParsedTable, i: int) -> RowPair:
+    @staticmethod
+    def _row_pairs(parsed_table: ParsedTable) -> Iterator[tuple[Sequence[str], Sequence[str]]]:
+        rows = parsed_table.rows
         match parsed_table.mode:
             case TableParseMode.ASCENDING:
-                front_row = parsed_table.rows[-1 - i]
-                back_row = parsed_table.rows[-2 - i]
+                # From the bottom row up, each row is the front of the row above it
+                for i in range(len(rows) - 1, 0, -1):
+                    yield rows[i], rows[i - 1]
             case TableParseMode.DESCENDING:
-                front_row = parsed_table.rows[i]
-                back_row = parsed_table.rows[i + 1]
+                yield from itertools.pairwise(rows)
             case TableParseMode.ROWWISE:
-                front_row = parsed_table.rows[i]
-                back_row = parsed_table.rows[i]
-
-        return RowPair(front_row, back_row)
-
-    def _replace_placeholders(
-        self, parsed_table: ParsedTable, row_pair: RowPair
-    ) -> FrontBack | None:
-        def replace_side_placeholders(template: str, data: dict[str, str]) -> str | None:
-            """Replace placeholders in a template string using provided data."""
-            result = template
-            placeholders = re.findall(r"\|(.+?)\|", template)
-
-            for placeholder in placeholders:
-                replacement = data.get(placeholder, "")
-                if not replacement:
-                    return None
-                result = result.replace(f"|{placeholder}|", replacement)
-
-            return result
-
-        # Process front and back sides
-        processed_front = replace_side_placeholders(parsed_table.front, row_pair.front)
-        if processed_front is None:
-            return None
-
-        processed_back = replace_side_placeholders(parsed_table.back, row_pair.back)
-        if processed_back is None:
-            return None
-
-        return FrontBack(front=processed_front, back=processed_back)
+                for row in rows:
+                    yield row, row
 
-    def _parsed_table_to_prompt(
+    def _parsed_table_to_prompts(
         self, parsed_table: ParsedTable, doc: Document
-    ) -> Sequence[QAPrompt]:
-        prompts: Sequence[QAPrompt] = []
-        match parsed_table.mode:
-            case TableParseMode.ASCENDING | TableParseMode.DESCENDING:
-                break_index = len(parsed_table.rows) - 2
-            case TableParseMode.ROWWISE:
-                break_index = len(parsed_table.rows) - 1
-
-        for i in range(len(parsed_table.rows)):
-            row_pair = self._get_row_pair(parsed_table, i)
-
-            card = self._replace_placeholders(parsed_table, row_pair)
-
+    ) -> Iterator[QAPrompt]:
+        for front_row, back_row in self._row_pairs(parsed_table):
             # Skip rows with empty fronts or backs
-            if card:
-                prompts.append(
-                    QAFromDoc(
-                        question=card.front,
-                        answer=card.back,
-                        parent_doc=doc,
-                        line_nr=parsed_table.end_line_nr,
-                    )
+            front = parsed_table.front.render(front_row)
+            if front is None:
+                continue
+            back = parsed_table.back.render(back_row)
+            if back is not None:
+                yield QAFromDoc(
+                    question=front,
+                    answer=back,
+                    parent_doc=doc.handle,
+                    line_nr=parsed_table.end_line_nr,
                 )
-            if i == break_index:
-                break
-        return prompts
 
     def extract_prompts(self, document: Document) -> Sequence[QAPrompt]:
-        blocks = to_line_blocks(document.content)
-
-        parsed_tables = [self._parse_table(block) for block in blocks]
-        flattened_parsed_tables = [
-            parsed_table for sublist in parsed_tables for parsed_table in sublist
-        ]
-        prompts = [
-            self._parsed_table_to_prompt(parsed_table, document)
-            for parsed_table in flattened_parsed_tables
+        return [
+            prompt
+            for block in to_line_blocks(document.content)
+            for parsed_table in self._parse_table(block)
+            for prompt in self._parsed_table_to_prompts(parsed_table, document)
         ]
-        flattened_prompts = [prompt for sublist in prompts for prompt in sublist]
-        return flattened_prompts
@@ -16,8 +16,6 @@ class TableExtractorExample:
     table_prompt: str  # What the example is testing
     expectation: Sequence[FakeQAPrompt]  # Expected prompts
 
-# fix: if the row contains a wikilink with a pipe, it will be split into two cells
-# e.g. [[Name|Alias]] will be parsed incorrectly.
 
 @pytest.mark.parametrize(
     ("example"),
@@ -72,3 +70,48 @@ With multiline"""
         LineBlock(starting_line=0, lines=["Block 1"]),
         LineBlock(starting_line=2, lines=["Block 2", "With multiline"]),
     ]
+
+
+def test_table_extractor_wikilink_with_alias():
+    input_doc = Document(
+        content="""| Person | Known for |
+| --- | --- |
+| [[Ada Lovelace|Ada]] | The first program |
+Rowwise // What is |Person| known for? // |Known for|""",
+        source_path=Path(__file__),
+    )
+
+    assert [
+        (prompt.question, prompt.answer) for prompt in TableExtractor().extract_prompts(input_doc)
+    ] == [("What is [[Ada Lovelace|Ada]] known for?", "The first program")]
+
+
+def test_table_extractor_keeps_empty_cells_in_their_column():
+    input_doc = Document(
+        content="""| Term | Synonym | Definition |
+| --- | --- | --- |
+| Cell || The unit of life |
+| Gene | Locus | A unit of heredity |
+Rowwise // What is |Term|? // |Definition|""",
+        source_path=Path(__file__),
+    )
+
+    # An empty cell does not shift the later cells into its column
+    assert [
+        (prompt.question, prompt.answer) for prompt in TableExtractor().extract_prompts(input_doc)
+    ] == [("What is Cell?", "The unit of life"), ("What is Gene?", "A unit of heredity")]
+
+
+def test_table_extractor_skips_rows_with_empty_placeholder_cells():
+    input_doc = Document(
+        content="""| Term | Synonym |
+| --- | --- |
+| Cell ||
+| Gene | Locus |
+Rowwise // What is a synonym of |Term|? // |Synonym|""",
+        source_path=Path(__file__),
+    )
+
+    assert [
+        (prompt.question, prompt.answer) for prompt in TableExtractor().extract_prompts(input_doc)
+    ] == [("What is a synonym of Gene?", "Locus")]
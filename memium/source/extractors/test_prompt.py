@@ -12,7 +12,7 @@ class FakeQAPrompt(QAPrompt):
 
     def to_qa_from_doc(self, doc: Document, line_nr: int) -> QAPrompt:
         return QAFromDoc(
-            parent_doc=doc, line_nr=line_nr, question=self.question, answer=self.answer
+            parent_doc=doc.handle, line_nr=line_nr, question=self.question, answer=self.answer
         )
 
     def __repr__(self) -> str:
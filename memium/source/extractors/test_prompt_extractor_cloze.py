@@ -23,7 +23,7 @@ This is another block without any cloze prompts.
 
     assert len(extractor) == 1
     assert extractor[0].text == r"What is the meaning of life? {{c734::42}}"
-    assert extractor[0].tags == ["anki/tag/test_tag"]
+    assert extractor[0].tags == ("anki/tag/test_tag",)
 
 
 import pytest
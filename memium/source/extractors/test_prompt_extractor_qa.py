@@ -23,5 +23,7 @@ A. 42
     prompt = extractor[0]
     assert prompt.question == "What is the meaning of life?"
     assert prompt.answer == "42"
-    assert prompt.tags == ["anki/tag/test_tag"]
+    assert prompt.tags == ("anki/tag/test_tag",)
     assert prompt.scheduling_uid == 3643087944
+    # Prompts share the document's handle, rather than keeping its content
+    assert prompt.parent_doc is doc.handle
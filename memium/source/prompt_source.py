@@ -1,14 +1,18 @@
 import logging
 from collections.abc import Sequence
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Protocol
 
 from iterpy import Iter
 
+from ..utils.metrics import stage
 from .document import Document
-from .document_source import BaseDocumentSource
+from .document_source import BaseDocumentSource, FileNotRetrievedError, MarkdownDocumentSource
 from .extractors.extractor import BasePromptExtractor
 from .prompts.prompt import BasePrompt
+from .prompts.prompt_uid import UIDPrompt
+from .time_budget import TimeBudget
 
 log = logging.getLogger(__name__)
 
@@ -19,20 +23,31 @@ class BasePromptSource(Protocol):
 
 @dataclass(frozen=True)
 class DocumentPromptSource(BasePromptSource):
+    """If a time_budget is given, extractors which take longer on a document are skipped for it."""
+
     document_ingester: BaseDocumentSource
     prompt_extractors: Sequence[BasePromptExtractor]
+    time_budget: TimeBudget | None = None
 
-    def _get_prompts_from_document(self, document: Document) -> Sequence[BasePrompt]:
+    def get_prompts_from_document(self, document: Document) -> Sequence[BasePrompt]:
+        """The prompts of a single document. Unlike get_prompts_from_documents, they are not deduplicated."""
         prompts: list[BasePrompt] = []
 
         for extractor in self.prompt_extractors:
             try:
-                extractor_prompts = list(extractor.extract_prompts(document))
+                with stage(f"extract.{type(extractor).__name__}") as timer:
+                    extractor_prompts = (
+                        list(extractor.extract_prompts(document))
+                        if self.time_budget is None
+                        else self.time_budget.extract(extractor, document)
+                    )
+                    timer.add_items(len(extractor_prompts))
                 prompts += extractor_prompts
             except Exception as e:
                 log.error(
                     f"Failed to extract prompts with {extractor} from {document.source_path.name} using {extractor}. Reason: {e}"
                 )
+                self.document_ingester.mark_incomplete(document.source_path)
 
         return prompts
 
@@ -57,9 +72,11 @@ class DocumentPromptSource(BasePromptSource):
 
     def _deduplicate_prompts(self, prompts: Sequence[BasePrompt]) -> Sequence[BasePrompt]:
         """Deduplicate prompts based on scheduling UID. If the scheduling UID is the same, the prompt is considered a duplicate."""
-        scheduling_uuid_groups = Iter(prompts).groupby(lambda prompt: str(prompt.scheduling_uid))
-
-        unique_prompts = scheduling_uuid_groups.map(self._deduplicate_group).to_list()
+        with stage("dedup", n_items=len(prompts)):
+            scheduling_uuid_groups = Iter(prompts).groupby(
+                lambda prompt: str(prompt.scheduling_uid)
+            )
+            unique_prompts = scheduling_uuid_groups.map(self._deduplicate_group).to_list()
 
         n_duplicates = len(prompts) - len(unique_prompts)
         if n_duplicates != 0:
@@ -67,12 +84,104 @@ class DocumentPromptSource(BasePromptSource):
 
         return unique_prompts
 
-    def get_prompts(self) -> Sequence[BasePrompt]:
-        prompts = (
-            Iter(self.document_ingester.get_documents())
-            .map(self._get_prompts_from_document)
-            .flatten()
-            .to_list()
-        )
+    def get_prompts_from_documents(self, documents: Sequence[Document]) -> Sequence[BasePrompt]:
+        prompts = Iter(documents).map(self.get_prompts_from_document).flatten().to_list()
 
         return self._deduplicate_prompts(prompts)
+
+    def get_prompts(self) -> Sequence[BasePrompt]:
+        return self.get_prompts_from_documents(self.document_ingester.get_documents())
+
+
+@dataclass(frozen=True)
+class ExtractedPrompt:
+    prompt: BasePrompt
+    uids: UIDPrompt
+    """The prompt's UIDs, computed once at extraction."""
+
+
+def with_uids(prompts: Sequence[BasePrompt]) -> Sequence[ExtractedPrompt]:
+    with stage("uid_hashing", n_items=len(prompts)):
+        return [
+            ExtractedPrompt(
+                prompt=prompt,
+                uids=UIDPrompt(
+                    scheduling_uid=prompt.scheduling_uid,
+                    update_uid=prompt.update_uid,
+                    tags=prompt.tags,
+                ),
+            )
+            for prompt in prompts
+        ]
+
+
+def deduplicate_extracted_prompts(prompts: Sequence[ExtractedPrompt]) -> Sequence[ExtractedPrompt]:
+    """As in DocumentPromptSource, the first prompt with a given scheduling UID wins."""
+    unique_prompts: dict[int, ExtractedPrompt] = {}
+    with stage("dedup", n_items=len(prompts)):
+        for prompt in prompts:
+            unique_prompts.setdefault(prompt.uids.scheduling_uid, prompt)
+
+    if len(prompts) != len(unique_prompts):
+        log.warning(f"Found a total of {len(prompts) - len(unique_prompts)} duplicate prompts")
+
+    return list(unique_prompts.values())
+
+
+@dataclass(frozen=True)
+class _CachedDocument:
+    mtime_ns: int
+    size: int
+    prompts: Sequence[ExtractedPrompt]
+
+
+@dataclass
+class IncrementalDocumentPromptSource:
+    """Keeps prompts between calls, and only re-extracts prompts from documents which changed since the last call, based on their modification time and size."""
+
+    document_source: MarkdownDocumentSource
+    prompt_extractors: Sequence[BasePromptExtractor]
+    n_documents: int = 0
+    n_documents_extracted: int = 0
+    _cache: dict[Path, _CachedDocument] = field(default_factory=dict)
+
+    def _extract(self, path: Path) -> Sequence[ExtractedPrompt]:
+        document = self.document_source.get_document(path)
+        if isinstance(document, FileNotRetrievedError):
+            return []
+
+        prompts = DocumentPromptSource(
+            document_ingester=self.document_source,
+            prompt_extractors=self.prompt_extractors,
+            time_budget=self.document_source.time_budget,
+        ).get_prompts_from_document(document)
+        return with_uids(prompts)
+
+    def get_prompts(self) -> Sequence[ExtractedPrompt]:
+        paths = self.document_source.get_paths()
+        self.n_documents = len(paths)
+        self.n_documents_extracted = 0
+
+        cache: dict[Path, _CachedDocument] = {}
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError as e:
+                log.warning(f"Could not stat {path}: {e}")
+                continue
+
+            cached = self._cache.get(path)
+            if cached is None or (cached.mtime_ns, cached.size) != (stat.st_mtime_ns, stat.st_size):
+                cached = _CachedDocument(
+                    mtime_ns=stat.st_mtime_ns, size=stat.st_size, prompts=self._extract(path)
+                )
+                self.n_documents_extracted += 1
+            cache[path] = cached
+        # Replacing the cache also drops deleted documents
+        self._cache = cache
+        # Deleted documents' notes are deleted, even if the document was incomplete
+        self.document_source.incomplete_paths.intersection_update(cache)
+
+        return deduplicate_extracted_prompts(
+            [prompt for cached_document in cache.values() for prompt in cached_document.prompts]
+        )
@@ -2,8 +2,16 @@ from collections.abc import Sequence
 from typing import Protocol, runtime_checkable
 
 
+def tags_str(tags: Sequence[str]) -> str:
+    """Tags as formatted when hashing UIDs. Always formatted as a list, so UIDs do not depend on the type of sequence."""
+    return str(list(tags))
+
+
 @runtime_checkable
 class BasePrompt(Protocol):
+    # Allows subclasses to use __slots__ instead of a per-instance __dict__
+    __slots__ = ()
+
     @property
     def scheduling_uid(self) -> int:
         """UID used when scheduling the prompt. If this UID changes, the old prompt is deleted and a new prompt is created."""
@@ -26,7 +34,7 @@ class BasePrompt(Protocol):
 from dataclasses import dataclass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DestinationPrompt:
     prompt: BasePrompt
     destination_id: str
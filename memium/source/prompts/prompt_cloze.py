@@ -2,11 +2,11 @@ from collections.abc import Sequence
 from dataclasses import dataclass
 
 from ...utils.hash_cleaned_str import clean_str, hash_str_to_int
-from .prompt import BasePrompt
+from .prompt import BasePrompt, tags_str
 from .prompt_from_doc import PromptFromDocMixin
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ClozePrompt(BasePrompt):
     text: str
 
@@ -16,14 +16,14 @@ class ClozePrompt(BasePrompt):
 
     @property
     def update_uid(self) -> int:
-        return hash_str_to_int(f"{(self.text)}{self.tags}")
+        return hash_str_to_int(f"{(self.text)}{tags_str(self.tags)}")
 
     @property
     def tags(self) -> Sequence[str]:
         return ()
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ClozeWithoutDoc(ClozePrompt):
     add_tags: Sequence[str]
 
@@ -36,7 +36,7 @@ class ClozeWithoutDoc(ClozePrompt):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ClozeFromDoc(ClozePrompt, PromptFromDocMixin):
     text: str
 
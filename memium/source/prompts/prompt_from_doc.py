@@ -3,13 +3,16 @@ from collections.abc import Sequence
 from dataclasses import dataclass
 from urllib.parse import quote
 
-from ..document import Document
+from ..document import DocumentHandle
 from .prompt import BasePrompt
 
 
 @dataclass(frozen=True)
 class PromptFromDocMixin(BasePrompt, ABC):
-    parent_doc: Document
+    # Fields are stored in the slots of the concrete prompt classes, since a class can only inherit slots from one base
+    __slots__ = ()
+
+    parent_doc: DocumentHandle
     line_nr: int
 
     @property
@@ -2,11 +2,11 @@ from collections.abc import Sequence
 from dataclasses import dataclass
 
 from ...utils.hash_cleaned_str import clean_str, hash_str_to_int
-from .prompt import BasePrompt
+from .prompt import BasePrompt, tags_str
 from .prompt_from_doc import PromptFromDocMixin
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class QAPrompt(BasePrompt):
     question: str
     answer: str
@@ -23,7 +23,7 @@ class QAPrompt(BasePrompt):
     @property
     def update_uid_str(self) -> str:
         """Str used for generating the update_uid. Super helpful for debugging."""
-        return f"{self.question}_{self.answer}_{self.tags}"
+        return f"{self.question}_{self.answer}_{tags_str(self.tags)}"
 
     @property
     def update_uid(self) -> int:
@@ -34,7 +34,7 @@ class QAPrompt(BasePrompt):
         return ()
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class QAWithoutDoc(QAPrompt):
     add_tags: Sequence[str]
 
@@ -47,7 +47,7 @@ class QAWithoutDoc(QAPrompt):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class QAFromDoc(QAPrompt, PromptFromDocMixin):
     @property
     def tags(self) -> Sequence[str]:
@@ -0,0 +1,18 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class UIDPrompt:
+    """A prompt which is only known by its UIDs, e.g. when the UIDs are stored on the destination.
+
+    Structurally satisfies BasePrompt, but does not subclass it, since the UIDs are stored rather than computed.
+    """
+
+    scheduling_uid: int
+    update_uid: int
+    tags: Sequence[str]
+
+    @property
+    def edit_url(self) -> str | None:
+        return None
@@ -0,0 +1,21 @@
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class SyncScope:
+    """Restricts a sync to documents under one of paths, which have one of tags or a child of it, e.g. 'biology' also matches 'biology/cells'.
+
+    Empty paths or tags do not restrict. Prompts outside the scope are neither pushed nor deleted.
+    """
+
+    paths: Sequence[Path] = ()
+    tags: Sequence[str] = ()
+
+    def includes_tags(self, tags: Iterable[str]) -> bool:
+        return not self.tags or any(
+            tag == scope_tag or tag.startswith(f"{scope_tag}/")
+            for tag in tags
+            for scope_tag in self.tags
+        )
@@ -1,10 +1,11 @@
+import hashlib
 import logging
 from dataclasses import dataclass
 from pathlib import Path
 
 import pytest
 
-from .document_source import MarkdownDocumentSource
+from .document_source import FileNotRetrievedError, MarkdownDocumentSource
 
 
 class TestMarkdownIngester:
@@ -21,7 +22,17 @@ class TestMarkdownIngester:
         assert len(documents) == 1
         document = documents[0]
         assert document.title == "test"
-        assert document.tags == ["anki/tag/test_tag", "anki/tag/test_tag2", "comment_tag"]
+        assert document.tags == ("anki/tag/test_tag", "anki/tag/test_tag2", "comment_tag")
+
+    def test_content_hash_is_of_the_file_before_sanitizing(self, tmp_path: Path):
+        path = tmp_path / "test.md"
+        path.write_text("Q. What is [[Note|an alias]]?\nA. A link\n")
+
+        document = MarkdownDocumentSource(directory=tmp_path).get_document(path)
+
+        # The same hash the time budget records slow documents by
+        assert not isinstance(document, FileNotRetrievedError)
+        assert document.handle.content_hash == hashlib.sha256(path.read_bytes()).hexdigest()
 
     def test_should_log_error_if_file_not_retrieved(
         self, tmp_path: Path, caplog: pytest.LogCaptureFixture
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+import pytest
+
+from ..utils.metrics import stage
+from .document import Document
+from .document_source import FileNotRetrievedError, MarkdownDocumentSource
+from .extractors.extractor_qa import QAPromptExtractor
+from .prompt_source import DocumentPromptSource
+from .prompts.prompt import BasePrompt
+from .prompts.prompt_from_doc import PromptFromDocMixin
+from .time_budget import TimeBudget, TimeBudgetExceededError
+
+
+class SlowExtractor:
+    """Hangs on documents containing 'slow', like an extractor stuck in regex backtracking."""
+
+    def extract_prompts(self, document: Document) -> Sequence[BasePrompt]:
+        if "slow" in document.content:
+            time.sleep(60)
+        return []
+
+
+def test_time_budget_skips_slow_documents(tmp_path: Path):
+    (tmp_path / "fast.md").write_text("Q. Fast?\nA. Yes\n")
+    (tmp_path / "slow.md").write_text("Q. Is this slow?\nA. Yes\n")
+    record_path = tmp_path / ".memium" / "slow_documents.json"
+
+    def extract(time_budget: TimeBudget) -> Sequence[BasePrompt]:
+        try:
+            return DocumentPromptSource(
+                document_ingester=MarkdownDocumentSource(
+                    directory=tmp_path, time_budget=time_budget
+                ),
+                prompt_extractors=[
+                    QAPromptExtractor(question_prefix="Q.", answer_prefix="A."),
+                    SlowExtractor(),
+                ],
+                time_budget=time_budget,
+            ).get_prompts()
+        finally:
+            time_budget.close()
+
+    # The slow extractor is stopped, and the other extractor's prompts are kept
+    start = time.perf_counter()
+    prompts = extract(TimeBudget(budget_seconds=1, record_path=record_path))
+    assert time.perf_counter() - start < 30
+    assert sorted(p.question for p in prompts) == ["Fast?", "Is this slow?"]  # type: ignore
+    assert all(
+        p.parent_doc.source_path.parent == tmp_path
+        for p in prompts
+        if isinstance(p, PromptFromDocMixin)
+    )
+    assert "SlowExtractor" in record_path.read_text()
+
+    # On the next run, the slow document is skipped without waiting for the budget
+    time_budget = TimeBudget(budget_seconds=30, record_path=record_path)
+    start = time.perf_counter()
+    assert len(extract(time_budget)) == 2
+    assert time.perf_counter() - start < 20
+
+
+def test_time_budget_error_is_raised_through_stage(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+):
+    with (
+        pytest.raises(TimeBudgetExceededError, match="sanitize took longer than 1s"),
+        stage("sanitize"),
+    ):
+        raise TimeBudgetExceededError(tmp_path / "a.md", "sanitize", 1, skipped=False)
+
+    # A document skipped on an earlier run is not sanitized, and is logged with the budget error
+    document_path = tmp_path / "slow.md"
+    document_path.write_text("Q. Is this slow?\nA. Yes\n")
+    record_path = tmp_path / ".memium" / "slow_documents.json"
+    record_path.parent.mkdir()
+    record_path.write_text(
+        json.dumps(
+            {
+                hashlib.sha256(document_path.read_bytes()).hexdigest(): {
+                    "path": str(document_path),
+                    "steps": ["sanitize"],
+                }
+            }
+        )
+    )
+    time_budget = TimeBudget(budget_seconds=30, record_path=record_path)
+    source = MarkdownDocumentSource(directory=tmp_path, time_budget=time_budget)
+
+    document = source.get_document(document_path)
+
+    assert isinstance(document, FileNotRetrievedError)
+    assert isinstance(document.error, TimeBudgetExceededError)
+    assert (
+        f"{document_path}: sanitize took longer than 30s on an earlier run, skipping until the file changes"
+        in caplog.text
+    )
@@ -0,0 +1,188 @@
+import dataclasses
+import json
+import logging
+import multiprocessing
+import threading
+from collections.abc import Callable, Sequence
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from typing import Any, TypeVar
+
+from .document import Document
+from .extractors.extractor import BasePromptExtractor
+from .prompts.prompt import BasePrompt
+from .prompts.prompt_from_doc import PromptFromDocMixin
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TimeBudgetExceededError(Exception):
+    def __init__(self, path: Path, step: str, budget_seconds: float, skipped: bool) -> None:
+        # Not a frozen dataclass, since raising sets attributes such as __traceback__
+        super().__init__(path, step, budget_seconds, skipped)
+        self.path = path
+        self.step = step
+        self.budget_seconds = budget_seconds
+        self.skipped = skipped
+        """Whether the step was skipped, because it exceeded the budget on an earlier run."""
+
+    def __str__(self) -> str:
+        when = "on an earlier run, skipping until the file changes" if self.skipped else ""
+        return f"{self.path}: {self.step} took longer than {self.budget_seconds}s {when}".strip()
+
+
+def _serve(conn: Connection) -> None:
+    conn.send("ready")
+    while True:
+        fn, args = conn.recv()
+        try:
+            conn.send((True, fn(*args)))
+        except Exception as e:
+            try:
+                conn.send((False, e))
+            except Exception:
+                # E.g. if the exception cannot be pickled
+                conn.send((False, Exception(repr(e))))
+
+
+class _Worker:
+    """A process for running steps, which can be killed if a step exceeds its budget."""
+
+    def __init__(self) -> None:
+        # Spawned rather than forked, since the parent may be running other threads
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process: BaseProcess = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        # Only the child writes to its end, so closing it here lets recv() raise EOFError if the child dies
+        child_conn.close()
+        # Wait for imports to finish, so they do not count towards the first step's budget
+        self.conn.recv()
+
+    def run(self, timeout: float, fn: Callable[..., T], *args: Any) -> tuple[bool, T | None]:
+        """Returns whether fn finished in time, and its result."""
+        self.conn.send((fn, args))
+        if not self.conn.poll(timeout):
+            return False, None
+        succeeded, result = self.conn.recv()
+        if not succeeded:
+            raise result
+        return True, result
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def _extract(extractor: BasePromptExtractor, document: Document) -> Sequence[BasePrompt]:
+    return list(extractor.extract_prompts(document))
+
+
+class TimeBudget:
+    """Runs steps for a document, e.g. an extractor, in a worker process, and kills it if the step takes longer than budget_seconds.
+
+    Steps which exceed the budget are recorded in record_path by a hash of the document's content, and skipped until the document changes. Each thread gets its own worker, so documents can be processed concurrently.
+    """
+
+    def __init__(self, budget_seconds: float, record_path: Path) -> None:
+        self.budget_seconds = budget_seconds
+        self.record_path = record_path
+        self._local = threading.local()
+        self._workers: list[_Worker] = []
+        self._lock = threading.Lock()
+        self._record: dict[str, dict[str, Any]] | None = None
+
+    def _load_record(self) -> dict[str, dict[str, Any]]:
+        if self._record is None:
+            self._record = {}
+            if self.record_path.exists():
+                try:
+                    self._record = json.loads(self.record_path.read_text())
+                except ValueError as e:
+                    log.warning(
+                        f"Ignoring unreadable record of slow documents at {self.record_path}: {e}"
+                    )
+        return self._record
+
+    def _is_recorded(self, content_hash: str, step: str) -> bool:
+        with self._lock:
+            entry = self._load_record().get(content_hash)
+        return entry is not None and step in entry["steps"]
+
+    def _add_to_record(self, content_hash: str, step: str, path: Path) -> None:
+        with self._lock:
+            record = self._load_record()
+            entry = record.setdefault(content_hash, {"path": str(path), "steps": []})
+            entry["steps"].append(step)
+            # Entries for earlier versions of the document can never match again
+            for other_hash in [h for h, e in record.items() if e["path"] == str(path)]:
+                if other_hash != content_hash:
+                    del record[other_hash]
+
+            self.record_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.record_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(record, indent=2))
+            tmp_path.replace(self.record_path)
+
+    def _worker(self) -> _Worker:
+        worker: _Worker | None = getattr(self._local, "worker", None)
+        if worker is None:
+            worker = _Worker()
+            self._local.worker = worker
+            with self._lock:
+                self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        self._local.worker = None
+        with self._lock:
+            self._workers.remove(worker)
+
+    def run(self, path: Path, content_hash: str, step: str, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(*args) in the worker. fn, args and the result must be picklable.
+
+        Raises TimeBudgetExceededError if the step exceeds the budget, or did on an earlier run with the same content_hash.
+        """
+        if self._is_recorded(content_hash, step):
+            raise TimeBudgetExceededError(path, step, self.budget_seconds, skipped=True)
+
+        worker = self._worker()
+        try:
+            finished, result = worker.run(self.budget_seconds, fn, *args)
+        except (EOFError, OSError):
+            # The worker died, e.g. out of memory, so start a new one for the next step
+            self._discard(worker)
+            raise
+        if not finished:
+            self._discard(worker)
+            self._add_to_record(content_hash, step, path)
+            raise TimeBudgetExceededError(path, step, self.budget_seconds, skipped=False)
+        return result  # type: ignore
+
+    def extract(self, extractor: BasePromptExtractor, document: Document) -> Sequence[BasePrompt]:
+        prompts = self.run(
+            document.source_path,
+            document.handle.content_hash,
+            type(extractor).__name__,
+            _extract,
+            extractor,
+            document,
+        )
+        # Prompts from the worker reference a copy of the handle, so point them to the document's own
+        return [
+            dataclasses.replace(prompt, parent_doc=document.handle)  # type: ignore
+            if isinstance(prompt, PromptFromDocMixin)
+            else prompt
+            for prompt in prompts
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.kill()
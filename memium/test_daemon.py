@@ -0,0 +1,102 @@
+import json
+import os
+from collections.abc import Collection, Sequence
+from pathlib import Path
+
+from .daemon import SyncDaemon
+from .destination.destination import DeletePrompts, PromptDestinationCommand, PushPrompts
+from .source.document_source import MarkdownDocumentSource
+from .source.extractors.extractor_qa import QAPromptExtractor
+from .source.prompt_source import IncrementalDocumentPromptSource
+from .source.prompts.prompt import DestinationPrompt
+from .source.prompts.prompt_uid import UIDPrompt
+
+
+class InMemoryDestination:
+    def __init__(self) -> None:
+        self.prompts: dict[str, DestinationPrompt] = {}
+
+    def get_all_prompts(self) -> Sequence[DestinationPrompt]:
+        return list(self.prompts.values())
+
+    def get_prompts(self, scheduling_uids: Collection[int]) -> Sequence[DestinationPrompt]:
+        return [p for p in self.prompts.values() if p.scheduling_uid in scheduling_uids]
+
+    def update(self, commands: Sequence[PromptDestinationCommand]) -> None:
+        for command in commands:
+            match command:
+                case DeletePrompts(prompts):
+                    for prompt in prompts:
+                        del self.prompts[prompt.destination_id]
+                case PushPrompts(prompts):
+                    for prompt in prompts:
+                        self.prompts[str(prompt.scheduling_uid)] = DestinationPrompt(
+                            UIDPrompt(prompt.scheduling_uid, prompt.update_uid, prompt.tags),
+                            destination_id=str(prompt.scheduling_uid),
+                        )
+
+
+class FailingOnceDestination(InMemoryDestination):
+    def __init__(self) -> None:
+        super().__init__()
+        self.commands: list[Sequence[PromptDestinationCommand]] = []
+
+    def update(self, commands: Sequence[PromptDestinationCommand]) -> None:
+        self.commands.append(commands)
+        if len(self.commands) == 1:
+            raise ConnectionError("Anki went away")
+        super().update(commands)
+
+
+def test_daemon_push_all_is_retried_after_failed_sync(tmp_path: Path):
+    (tmp_path / "doc.md").write_text("Q. Question?\nA. Answer\n")
+    destination = FailingOnceDestination()
+    daemon = SyncDaemon(
+        prompt_source=IncrementalDocumentPromptSource(
+            document_source=MarkdownDocumentSource(directory=tmp_path),
+            prompt_extractors=[QAPromptExtractor(question_prefix="Q.", answer_prefix="A.")],
+        ),
+        destination=destination,
+        status_path=tmp_path / ".memium" / "daemon_status.json",
+        push_all=True,
+    )
+
+    daemon.run(interval_seconds=0, max_iterations=2)
+
+    assert daemon.n_failed_syncs == 1
+    # The retry pushes everything again, rather than diffing
+    assert destination.commands[1] == destination.commands[0]
+    assert not daemon.push_all
+
+
+def test_daemon_only_re_extracts_changed_documents(tmp_path: Path):
+    for i in range(3):
+        (tmp_path / f"doc_{i}.md").write_text(f"Q. Question {i}?\nA. Answer {i}\n")
+    status_path = tmp_path / ".memium" / "daemon_status.json"
+    daemon = SyncDaemon(
+        prompt_source=IncrementalDocumentPromptSource(
+            document_source=MarkdownDocumentSource(directory=tmp_path),
+            prompt_extractors=[QAPromptExtractor(question_prefix="Q.", answer_prefix="A.")],
+        ),
+        destination=InMemoryDestination(),
+        status_path=status_path,
+    )
+
+    first_sync = daemon.sync_once()
+    assert (first_sync.n_documents_extracted, first_sync.n_pushed) == (3, 3)
+
+    edited = tmp_path / "doc_0.md"
+    edited.write_text("Q. Question 0?\nA. Changed answer\n")
+    # Ensure the modification time changes, even on file systems with coarse timestamps
+    os.utime(edited, ns=(0, edited.stat().st_mtime_ns + 1_000_000_000))
+    (tmp_path / "doc_1.md").unlink()
+
+    second_sync = daemon.sync_once()
+    assert second_sync.n_documents == 2
+    assert second_sync.n_documents_extracted == 1
+    assert (second_sync.n_pushed, second_sync.n_deleted) == (1, 2)
+
+    status = json.loads(status_path.read_text())
+    assert status["healthy"]
+    assert status["n_syncs"] == 2
+    assert status["last_sync"]["n_prompts"] == 2
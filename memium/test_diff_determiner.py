@@ -1,3 +1,4 @@
+import random
 from collections.abc import Sequence
 
 import pytest
@@ -5,9 +6,10 @@ import pytest
 from memium.source.extractors.test_prompt import FakeQAPrompt
 
 from .destination.destination import DeletePrompts, PushPrompts
-from .diff_determiner import GeneralSyncer, PromptDiffDeterminer
+from .diff_determiner import GeneralSyncer, NumpyPromptDiffDeterminer, PromptDiffDeterminer
 from .source.prompts.prompt import BasePrompt, DestinationPrompt
 from .source.prompts.prompt_qa import QAWithoutDoc
+from .source.prompts.prompt_uid import UIDPrompt
 
 
 @pytest.fixture()
@@ -75,3 +77,46 @@ def test_prompt_diff_determiner(
         source_prompts=example.source_prompts, destination_prompts=example.destination_prompts
     )
     assert diff == [DeletePrompts(example.delete_prompts), PushPrompts(example.push_prompts)]
+
+
+def test_prompt_diff_counts(diff_determiner: PromptDiffDeterminer):
+    diff = diff_determiner.diff(
+        source_prompts=[
+            QAWithoutDoc(question="unchanged", answer="a", add_tags=[]),
+            QAWithoutDoc(question="updated", answer="a", add_tags=["NewTag"]),
+            QAWithoutDoc(question="added", answer="a", add_tags=[]),
+        ],
+        destination_prompts=[
+            DestinationPrompt(
+                QAWithoutDoc(question="unchanged", answer="a", add_tags=[]), destination_id="1"
+            ),
+            DestinationPrompt(
+                QAWithoutDoc(question="updated", answer="a", add_tags=["OldTag"]),
+                destination_id="2",
+            ),
+            DestinationPrompt(
+                QAWithoutDoc(question="deleted", answer="a", add_tags=[]), destination_id="3"
+            ),
+        ],
+    )
+
+    assert (diff.n_unchanged, diff.n_updated, diff.n_added, diff.n_deleted) == (1, 1, 1, 1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_diff_determiner_matches_prompt_diff_determiner(seed: int):
+    pytest.importorskip("numpy")
+    rng = random.Random(seed)
+
+    def random_prompt() -> UIDPrompt:
+        # Small UID ranges, so there are duplicates and overlaps between source and destination
+        return UIDPrompt(scheduling_uid=rng.randrange(30), update_uid=rng.randrange(40), tags=[])
+
+    source_prompts = [random_prompt() for _ in range(rng.randrange(50))]
+    destination_prompts = [
+        DestinationPrompt(random_prompt(), destination_id=str(i)) for i in range(rng.randrange(50))
+    ]
+
+    assert NumpyPromptDiffDeterminer().diff(
+        source_prompts, destination_prompts
+    ) == PromptDiffDeterminer().diff(source_prompts, destination_prompts)
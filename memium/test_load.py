@@ -0,0 +1,272 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from .benchmarks.synthetic_vault import VaultSpec, generate_vault
+from .core import _extract_prompts, main, restyle_models
+from .destination.ankiconnect.fake_ankiconnect_server import FakeAnkiConnect
+from .source.document_source import MarkdownDocumentSource
+from .source.scope import SyncScope
+
+
+@pytest.fixture()
+def anki():
+    with FakeAnkiConnect(latency_seconds=0.002) as fake:
+        yield fake
+
+
+def sync(vault_dir: Path, anki: FakeAnkiConnect) -> float:
+    start = time.perf_counter()
+    main(
+        base_deck="Memium",
+        input_dir=vault_dir,
+        max_deletions_per_run=100,
+        dry_run=False,
+        ankiconnect_url=anki.url,
+    )
+    return time.perf_counter() - start
+
+
+def test_sync_request_budgets(
+    tmp_path: Path, anki: FakeAnkiConnect, monkeypatch: pytest.MonkeyPatch
+):
+    # The fake server reads packages from the same file system, also when running in Docker
+    monkeypatch.setenv("HOST_INPUT_DIR", str(tmp_path))
+    vault = generate_vault(tmp_path, VaultSpec(n_files=30, prompts_per_file=10, cloze_fraction=0))
+    n_prompts = vault.n_qa + vault.n_table_prompts
+
+    # Cold sync: read the deck, create models, import everything
+    cold_seconds = sync(tmp_path, anki)
+    assert len(anki.notes) == n_prompts
+    assert anki.stats.n_requests <= 15, anki.stats
+    assert anki.stats.bytes_received + anki.stats.bytes_sent < 1_000_000, anki.stats
+    assert cold_seconds < 30, anki.stats
+
+    # Warm sync without changes: diffs against the manifest, no reads from Anki
+    anki.reset_stats()
+    sync(tmp_path, anki)
+    assert anki.stats.n_read_actions == 0, anki.stats
+    assert anki.stats.n_requests <= 1, anki.stats
+    assert anki.stats.bytes_received + anki.stats.bytes_sent < 1_000, anki.stats
+
+    # Editing a prompt's text changes its scheduling UID, so the note is replaced
+    edited = vault.paths[0]
+    edited.write_text(edited.read_text().replace("?\nA. ", "?\nA. Edited ", 1))
+    anki.reset_stats()
+    sync(tmp_path, anki)
+    assert len(anki.notes) == n_prompts
+    assert anki.stats.actions["importPackage"] == 1
+    assert anki.stats.actions["deleteNotes"] == 1
+    assert anki.stats.n_requests <= 15, anki.stats
+    assert anki.stats.bytes_received + anki.stats.bytes_sent < 50_000, anki.stats
+
+    # Tagging a document only changes its prompts' update UIDs, so its notes are updated directly
+    tagged = vault.paths[1]
+    tagged.write_text(tagged.read_text() + "\n#tagged\n")
+    anki.reset_stats()
+    sync(tmp_path, anki)
+    assert len(anki.notes) == n_prompts
+    assert anki.stats.actions["importPackage"] == 0
+    n_tagged = sum("tagged" in note.tags for note in anki.notes.values())
+    assert 0 < n_tagged <= 25
+    assert anki.stats.actions["updateNoteFields"] == n_tagged
+
+
+def test_restyle_only_updates_models(
+    tmp_path: Path, anki: FakeAnkiConnect, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("HOST_INPUT_DIR", str(tmp_path))
+    generate_vault(tmp_path, VaultSpec(n_files=30, prompts_per_file=10, cloze_fraction=0))
+    sync(tmp_path, anki)
+
+    anki.reset_stats()
+    restyle_models(
+        base_deck="Memium",
+        input_dir=tmp_path,
+        dry_run=False,
+        card_css=".card { color: red; }",
+        ankiconnect_url=anki.url,
+    )
+    assert all(model.css == ".card { color: red; }" for model in anki.models.values())
+    assert anki.stats.n_read_actions == 0, anki.stats
+    assert anki.stats.actions["importPackage"] == 0
+    assert anki.stats.n_requests <= 10, anki.stats
+
+
+def test_scoped_sync_only_touches_scope(
+    tmp_path: Path, anki: FakeAnkiConnect, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("HOST_INPUT_DIR", str(tmp_path))
+    spec = VaultSpec(n_files=20, prompts_per_file=5, cloze_fraction=0, table_fraction=0)
+    vault = generate_vault(tmp_path, spec)
+    sync(tmp_path, anki)
+    assert len(anki.notes) == 100
+
+    # Delete a document in and out of the scope
+    vault.paths[10].unlink()  # folder_0
+    vault.paths[1].unlink()  # folder_1
+
+    anki.reset_stats()
+    main(
+        base_deck="Memium",
+        input_dir=tmp_path,
+        max_deletions_per_run=100,
+        dry_run=False,
+        ankiconnect_url=anki.url,
+        scope=SyncScope(paths=[tmp_path / "folder_0"]),
+    )
+    assert len(anki.notes) == 95
+    # The manifest knows the notes in scope, so nothing is read from Anki
+    assert anki.stats.n_read_actions == 0, anki.stats
+
+    sync(tmp_path, anki)
+    assert len(anki.notes) == 90
+
+
+def test_pipelined_sync_matches_sequential(tmp_path: Path):
+    vault_dir = tmp_path / "vault"
+    generate_vault(vault_dir, VaultSpec(n_files=40, prompts_per_file=5))
+
+    exports: list[bytes] = []
+    for workers in [None, 4]:
+        export_path = tmp_path / f"workers_{workers}.apkg"
+        main(
+            base_deck="Memium",
+            input_dir=vault_dir,
+            max_deletions_per_run=100,
+            dry_run=False,
+            export_apkg=export_path,
+            workers=workers,
+        )
+        exports.append(export_path.read_bytes())
+
+    assert exports[0] == exports[1]
+
+    # The export is sorted, so also check that prompts are extracted in the same order
+    sequential, pipelined = (
+        _extract_prompts(MarkdownDocumentSource(directory=vault_dir), workers=workers)
+        for workers in [None, 4]
+    )
+    assert [p.uids for p in sequential[0]] == [p.uids for p in pipelined[0]]
+    assert sequential[1] == pipelined[1]
+
+
+def test_changed_image_updates_note(
+    tmp_path: Path, anki: FakeAnkiConnect, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("HOST_INPUT_DIR", str(tmp_path))
+    (tmp_path / "cell.png").write_bytes(b"cell")
+    (tmp_path / "biology.md").write_text("Q. What does a cell look like?\nA. ![A cell](cell.png)\n")
+    sync(tmp_path, anki)
+    ((note_id, note),) = anki.notes.items()
+    (old_filename,) = anki.media
+
+    # The prompt's text is unchanged, but its note must point to the new image
+    (tmp_path / "cell.png").write_bytes(b"changed cell")
+    anki.reset_stats()
+    sync(tmp_path, anki)
+    (new_filename,) = set(anki.media) - {old_filename}
+    assert anki.media[new_filename] == b"changed cell"
+    assert list(anki.notes) == [note_id]
+    assert new_filename in note.fields["Answer"]
+    assert anki.stats.actions["updateNoteFields"] == 1, anki.stats
+
+    # Without further changes, nothing is pushed
+    anki.reset_stats()
+    sync(tmp_path, anki)
+    assert anki.stats.actions["updateNoteFields"] == 0, anki.stats
+    assert anki.stats.actions["importPackage"] == 0, anki.stats
+
+    # Images deleted in Anki are stored again when their note is pushed
+    del anki.media[new_filename]
+    (tmp_path / "biology.md").write_text(
+        "#tagged\n\nQ. What does a cell look like?\nA. ![A cell](cell.png)\n"
+    )
+    sync(tmp_path, anki)
+    assert anki.media[new_filename] == b"changed cell"
+
+
+def test_budget_skipped_document_keeps_its_notes(
+    tmp_path: Path, anki: FakeAnkiConnect, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("HOST_INPUT_DIR", str(tmp_path))
+    (tmp_path / "fast.md").write_text("Q. Fast?\nA. Yes\n")
+    slow = tmp_path / "slow.md"
+    slow.write_text("Q. Slow?\nA. Yes\n\nQ. Also slow?\nA. Yes\n")
+    sync(tmp_path, anki)
+    assert len(anki.notes) == 3
+
+    # Record that sanitizing the slow document exceeded the budget, as TimeBudget does
+    (tmp_path / ".memium" / "slow_documents.json").write_text(
+        json.dumps(
+            {
+                hashlib.sha256(slow.read_bytes()).hexdigest(): {
+                    "path": str(slow),
+                    "steps": ["sanitize"],
+                }
+            }
+        )
+    )
+
+    anki.reset_stats()
+    main(
+        base_deck="Memium",
+        input_dir=tmp_path,
+        max_deletions_per_run=100,
+        dry_run=False,
+        ankiconnect_url=anki.url,
+        document_time_budget=30,
+    )
+    assert len(anki.notes) == 3
+    assert anki.stats.actions["deleteNotes"] == 0, anki.stats
+
+    # The index still has the skipped document, so its notes are also kept on later syncs
+    main(
+        base_deck="Memium",
+        input_dir=tmp_path,
+        max_deletions_per_run=100,
+        dry_run=False,
+        ankiconnect_url=anki.url,
+        document_time_budget=30,
+    )
+    assert len(anki.notes) == 3
+
+    # Once the document is deleted, so are its notes
+    slow.unlink()
+    sync(tmp_path, anki)
+    assert len(anki.notes) == 1
+
+
+def test_scoped_sync_after_dry_run_deletes_removed_prompts(
+    tmp_path: Path, anki: FakeAnkiConnect, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("HOST_INPUT_DIR", str(tmp_path))
+    spec = VaultSpec(n_files=20, prompts_per_file=5, cloze_fraction=0, table_fraction=0)
+    vault = generate_vault(tmp_path, spec)
+    sync(tmp_path, anki)
+    vault.paths[10].unlink()  # folder_0
+
+    # Neither a dry run nor an export writes to Anki, so they do not mark the deletion as synced
+    for export_apkg in [None, tmp_path / "export.apkg"]:
+        main(
+            base_deck="Memium",
+            input_dir=tmp_path,
+            max_deletions_per_run=100,
+            dry_run=export_apkg is None,
+            ankiconnect_url=anki.url,
+            export_apkg=export_apkg,
+        )
+    assert len(anki.notes) == 100
+
+    main(
+        base_deck="Memium",
+        input_dir=tmp_path,
+        max_deletions_per_run=100,
+        dry_run=False,
+        ankiconnect_url=anki.url,
+        scope=SyncScope(paths=[tmp_path / "folder_0"]),
+    )
+    assert len(anki.notes) == 95
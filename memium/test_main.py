@@ -3,6 +3,8 @@ from pathlib import Path
 
 import pytest
 
+from memium import core
+from memium.benchmarks.bench_import_time import loaded_heavy_modules
 from memium.core import main
 
 from .destination.ankiconnect.ankiconnect_gateway import anki_connect_is_live
@@ -42,3 +44,32 @@ A. å
         max_deletions_per_run=0,  # 0 deletions allowed to test idempotency
         dry_run=False,
     )
+
+
+def test_main_exports_apkg_without_anki(tmp_path: Path):
+    (tmp_path / "test.md").write_text("Q. What are [[Trees]]?\nA. å\n")
+
+    main(
+        base_deck="FakeDeck",
+        input_dir=tmp_path,
+        max_deletions_per_run=0,
+        dry_run=False,
+        export_apkg=tmp_path / "export.apkg",
+    )
+
+    assert (tmp_path / "export.apkg").exists()
+
+
+def test_main_raises_errors_from_background_fetch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def failing_create_destination(**kwargs: object):  # noqa: ARG001
+        raise ConnectionError("Could not connect to AnkiConnect")
+
+    monkeypatch.setattr(core, "_create_destination", failing_create_destination)
+
+    with pytest.raises(ConnectionError):
+        main(base_deck="FakeDeck", input_dir=tmp_path, max_deletions_per_run=0, dry_run=False)
+
+
+def test_cli_import_does_not_load_sync_dependencies():
+    """Heavy dependencies should only load when syncing, so e.g. --help starts quickly."""
+    assert loaded_heavy_modules() == []
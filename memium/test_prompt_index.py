@@ -0,0 +1,134 @@
+import dataclasses
+from collections.abc import Sequence
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from .__main__ import app
+from .destination.ankiconnect.anki_converter import AnkiPromptConverter
+from .prompt_index import PromptIndex, prompt_index_path
+from .source.document_source import MarkdownDocumentSource
+from .source.extractors.extractor_qa import QAPromptExtractor
+from .source.prompt_source import DocumentPromptSource, ExtractedPrompt, with_uids
+from .source.prompts.prompt_uid import UIDPrompt
+from .source.scope import SyncScope
+from .utils.metrics import recording
+
+
+def write(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def extract(input_dir: Path) -> Sequence[ExtractedPrompt]:
+    return with_uids(
+        DocumentPromptSource(
+            document_ingester=MarkdownDocumentSource(directory=input_dir),
+            prompt_extractors=[QAPromptExtractor(question_prefix="Q.", answer_prefix="A.")],
+        ).get_prompts()
+    )
+
+
+def update_index(input_dir: Path, base_deck: str = "Memium") -> int:
+    """Returns the number of prompts which were (re-)indexed."""
+    index = PromptIndex(
+        prompt_index_path(input_dir), input_dir, AnkiPromptConverter(base_deck, card_css="")
+    )
+    with recording() as recorder:
+        index.update(extract(input_dir))
+    return recorder.stages["index"].n_items
+
+
+def test_prompt_index(tmp_path: Path):
+    write(tmp_path / "biology" / "cells.md", "#biology\n\nQ. Cell?\nA. Unit\n\nQ. DNA?\nA. Code\n")
+    write(tmp_path / "history.md", "#history/rome\n\nQ. Rome?\nA. Empire\n")
+    assert update_index(tmp_path) == 3
+
+    index = PromptIndex(prompt_index_path(tmp_path), tmp_path)
+    assert index.count_folder_prompts(Path("biology")) == 2
+    assert index.count_folder_prompts(tmp_path) == 3
+    assert [p.text for p in index.get_tag_prompts("history")] == ["Rome?"]
+    assert len(index.get_deck_prompts("Memium")) == 3
+
+    cell = index.get_document_prompts(Path("biology/cells.md"))[0]
+    found = index.get_prompt(cell.scheduling_uid)
+    assert found is not None
+    assert (found.path, found.line_nr, found.text) == (Path("biology/cells.md"), 3, "Cell?")
+
+    # Only changed documents are re-indexed, and deleted documents are removed
+    write(tmp_path / "history.md", "#history/rome\n\nQ. Rome?\nA. Republic\n")
+    (tmp_path / "biology" / "cells.md").unlink()
+    assert update_index(tmp_path) == 1
+    assert index.count_folder_prompts(tmp_path) == 1
+    assert index.get_prompt(cell.scheduling_uid) is None
+
+    # Decks depend on the base deck, so changing it re-indexes everything
+    assert update_index(tmp_path, base_deck="Other") == 1
+    assert index.get_deck_prompts("Memium") == []
+
+
+def test_index_command(tmp_path: Path):
+    write(tmp_path / "notes" / "a.md", "Q. Question?\nA. Answer\n")
+    update_index(tmp_path)
+
+    result = CliRunner().invoke(
+        app, ["index", "--input-dir", str(tmp_path), "--folder", "notes", "--count"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == "1"
+
+
+def test_scope_documents(tmp_path: Path):
+    write(tmp_path / "kept.md", "#biology\n\nQ. Kept?\nA. Yes\n")
+    write(tmp_path / "untagged.md", "#biology/cells\n\nQ. Untagged?\nA. Yes\n")
+    write(tmp_path / "deleted.md", "#biology\n\nQ. Deleted?\nA. Yes\n")
+    write(tmp_path / "other.md", "#history\n\nQ. Other?\nA. Yes\n")
+    update_index(tmp_path)
+
+    (tmp_path / "deleted.md").unlink()
+    write(tmp_path / "untagged.md", "Q. Untagged?\nA. Yes\n")
+    scope = SyncScope(tags=["biology"])
+    source = MarkdownDocumentSource(directory=tmp_path, scope=scope)
+    in_scope_paths = [document.source_path for document in source.get_documents()]
+    assert in_scope_paths == [tmp_path / "kept.md"]
+
+    # Deleted documents are in scope if they were when indexed, existing documents if they are now
+    scope_documents = PromptIndex(prompt_index_path(tmp_path), tmp_path).get_scope_documents(
+        scope, existing_paths=source.get_paths(), in_scope_paths=in_scope_paths
+    )
+    assert sorted(document.path for document in scope_documents) == [
+        Path("deleted.md"),
+        Path("kept.md"),
+    ]
+
+
+def test_index_uses_uids_from_extraction(tmp_path: Path):
+    write(tmp_path / "a.md", "Q. Question?\nA. Answer\n")
+    (prompt,) = (p.prompt for p in extract(tmp_path))
+    index = PromptIndex(
+        prompt_index_path(tmp_path), tmp_path, AnkiPromptConverter("Memium", card_css="")
+    )
+
+    index.update([ExtractedPrompt(prompt, UIDPrompt(scheduling_uid=1, update_uid=2, tags=[]))])
+
+    found = index.get_prompt(1)
+    assert found is not None
+    assert (found.update_uid, found.deck) == (2, "Memium")
+
+
+def test_index_updates_changed_uids_of_unchanged_document(tmp_path: Path):
+    write(tmp_path / "a.md", "Q. Question?\nA. ![](image.png)\n")
+    update_index(tmp_path)
+    (extracted,) = extract(tmp_path)
+    index = PromptIndex(
+        prompt_index_path(tmp_path), tmp_path, AnkiPromptConverter("Memium", card_css="")
+    )
+
+    # E.g. the image changed, which changes the update UID but not the document
+    new_uids = dataclasses.replace(extracted.uids, update_uid=extracted.uids.update_uid + 1)
+    index.update([ExtractedPrompt(extracted.prompt, new_uids)])
+
+    found = index.get_prompt(new_uids.scheduling_uid)
+    assert found is not None
+    assert found.update_uid == new_uids.update_uid
@@ -0,0 +1,27 @@
+import contextvars
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def run_in_background(fn: Callable[[], T]) -> "Future[T]":
+    """Run fn in a daemon thread, so it overlaps with work on the calling thread.
+
+    Exceptions are re-raised on Future.result(). fn runs in a copy of the calling context, so e.g. context variables are inherited. Since the thread is a daemon, a still-running fn does not block exiting, e.g. if the calling thread fails.
+    """
+    future: Future[T] = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), daemon=True).start()
+    return future
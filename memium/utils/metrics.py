@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+
+@dataclass
+class StageMetric:
+    seconds: float = 0.0
+    n_items: int = 0
+    n_calls: int = 0
+
+    @property
+    def items_per_second(self) -> float | None:
+        return self.n_items / self.seconds if self.seconds > 0 else None
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self.n_items = 0
+
+    def add_items(self, n: int) -> None:
+        self.n_items += n
+
+
+class MetricsRecorder:
+    """Accumulates the duration and number of items of each stage in a sync.
+
+    Stages which run many times, e.g. once per document, are summed. Stages may run concurrently on different threads, so their sum can exceed the total duration.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: dict[str, StageMetric] = {}
+
+    def add(self, stage: str, seconds: float, n_items: int) -> None:
+        with self._lock:
+            metric = self.stages.setdefault(stage, StageMetric())
+            metric.seconds += seconds
+            metric.n_items += n_items
+            metric.n_calls += 1
+
+    @property
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> Mapping[str, object]:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "total_seconds": round(self.total_seconds, 6),
+            "stages": {
+                name: {
+                    "seconds": round(metric.seconds, 6),
+                    "n_items": metric.n_items,
+                    "n_calls": metric.n_calls,
+                    "items_per_second": metric.items_per_second,
+                }
+                for name, metric in self.stages.items()
+            },
+        }
+
+
+_recorder: ContextVar[MetricsRecorder | None] = ContextVar("metrics_recorder", default=None)
+
+
+@contextmanager
+def recording() -> Iterator[MetricsRecorder]:
+    """Record all stages in the current context. Threads started with utils.background.run_in_background inherit the recorder."""
+    recorder = MetricsRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def stage(name: str, n_items: int = 0) -> Iterator[StageTimer]:
+    """Time a stage. Items processed can be given upfront, or added with StageTimer.add_items. A no-op outside of recording()."""
+    timer = StageTimer()
+    timer.add_items(n_items)
+    recorder = _recorder.get()
+    if recorder is None:
+        yield timer
+        return
+
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        recorder.add(name, seconds=time.perf_counter() - start, n_items=timer.n_items)
+
+
+def _prometheus_lines(recorder: MetricsRecorder) -> Iterator[str]:
+    yield "# HELP memium_sync_duration_seconds Duration of the last sync."
+    yield "# TYPE memium_sync_duration_seconds gauge"
+    yield f"memium_sync_duration_seconds {recorder.total_seconds}"
+    yield "# HELP memium_sync_timestamp_seconds When the last sync started."
+    yield "# TYPE memium_sync_timestamp_seconds gauge"
+    yield f"memium_sync_timestamp_seconds {recorder.started_at.timestamp()}"
+
+    for metric_name, help_text, attribute in [
+        ("memium_stage_duration_seconds", "Time spent in each stage of the last sync.", "seconds"),
+        ("memium_stage_items", "Items processed by each stage of the last sync.", "n_items"),
+        ("memium_stage_calls", "Times each stage ran in the last sync.", "n_calls"),
+    ]:
+        yield f"# HELP {metric_name} {help_text}"
+        yield f"# TYPE {metric_name} gauge"
+        for name, metric in recorder.stages.items():
+            yield f'{metric_name}{{stage="{name}"}} {getattr(metric, attribute)}'
+
+
+@dataclass(frozen=True)
+class MetricsWriter:
+    """Appends the metrics of each sync as a line to jsonl_path. Optionally also writes them to a Prometheus textfile, e.g. for node_exporter's textfile collector."""
+
+    jsonl_path: Path
+    prometheus_textfile: Path | None = None
+
+    def write(self, recorder: MetricsRecorder) -> None:
+        self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.jsonl_path.open("a") as f:
+            f.write(json.dumps(recorder.to_dict()) + "\n")
+
+        if self.prometheus_textfile is not None:
+            # The textfile collector may read at any time, so replace the file atomically
+            tmp_path = self.prometheus_textfile.with_suffix(".tmp")
+            tmp_path.write_text("\n".join(_prometheus_lines(recorder)) + "\n")
+            tmp_path.replace(self.prometheus_textfile)
@@ -0,0 +1,137 @@
+import contextvars
+import itertools
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from .metrics import stage
+
+_POLL_SECONDS = 0.1
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class PipelineStage:
+    """A step in a pipeline, which maps each item to a new item on its own worker threads."""
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+@dataclass(frozen=True)
+class _Failure:
+    error: BaseException
+
+
+class _PipelineRun:
+    def __init__(self, stages: Sequence[PipelineStage], max_in_flight: int) -> None:
+        self.stages = stages
+        # queues[i] is the input of stage i, the last queue holds the results
+        self.queues: list[queue.Queue[Any]] = [
+            queue.Queue(maxsize=max_in_flight) for _ in range(len(stages) + 1)
+        ]
+        self.in_flight = threading.Semaphore(max_in_flight)
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._n_running = [pipeline_stage.workers for pipeline_stage in stages]
+
+    def _put(self, i: int, entry: Any) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.queues[i].put(entry, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, i: int) -> Any:
+        while not self.stopped.is_set():
+            try:
+                return self.queues[i].get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _finish(self, i: int) -> None:
+        """Tell the readers of queue i that no more items are coming."""
+        n_readers = self.stages[i].workers if i < len(self.stages) else 1
+        for _ in range(n_readers):
+            self._put(i, _DONE)
+
+    def feed(self, items: Iterable[Any]) -> None:
+        try:
+            iterator = iter(items)
+            for index in itertools.count():
+                # Wait for room before taking the next item, so e.g. files are not read ahead
+                while not self.in_flight.acquire(timeout=_POLL_SECONDS):
+                    if self.stopped.is_set():
+                        return
+                if (item := next(iterator, _DONE)) is _DONE:
+                    break
+                self._put(0, (index, item))
+        except BaseException as e:
+            self._put(-1, (-1, _Failure(e)))
+            return
+        self._finish(0)
+
+    def work(self, i: int) -> None:
+        pipeline_stage = self.stages[i]
+        while (entry := self._get(i)) is not _DONE:
+            index, item = entry
+            try:
+                with stage(f"pipeline.{pipeline_stage.name}", n_items=1):
+                    result = pipeline_stage.fn(item)
+            except BaseException as e:
+                self._put(-1, (index, _Failure(e)))
+                return
+            self._put(i + 1, (index, result))
+
+        # The last worker of a stage to finish closes the next stage
+        with self._lock:
+            self._n_running[i] -= 1
+            is_last = self._n_running[i] == 0
+        if is_last:
+            self._finish(i + 1)
+
+    def results(self) -> Iterator[Any]:
+        # Results arrive in the order they finish, so hold them until all earlier results are yielded
+        finished: dict[int, Any] = {}
+        next_index = 0
+        while (entry := self.queues[-1].get()) is not _DONE:
+            index, result = entry
+            if isinstance(result, _Failure):
+                raise result.error
+            finished[index] = result
+            while next_index in finished:
+                result = finished.pop(next_index)
+                next_index += 1
+                self.in_flight.release()
+                yield result
+
+
+def _start(fn: Callable[..., None], *args: Any) -> None:
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(fn, *args), daemon=True).start()
+
+
+def run_pipeline(
+    items: Iterable[Any], stages: Sequence[PipelineStage], max_in_flight: int = 64
+) -> Iterator[Any]:
+    """Run each item through the stages, yielding the results in the order of items.
+
+    Stages are connected by bounded queues, so they run concurrently, e.g. reading files while earlier files are parsed. At most max_in_flight items are between being taken from items and being yielded, including results waiting for an earlier item to finish, so a fast stage never buffers all items. Each item is timed as pipeline.<stage name>.
+
+    The first exception from items or a stage is re-raised, and the remaining work is abandoned. Workers run in a copy of the calling context, so e.g. metrics are recorded.
+    """
+    run = _PipelineRun(stages, max_in_flight)
+    _start(run.feed, items)
+    for i, pipeline_stage in enumerate(stages):
+        for _ in range(pipeline_stage.workers):
+            _start(run.work, i)
+
+    try:
+        yield from run.results()
+    finally:
+        run.stopped.set()
@@ -0,0 +1,36 @@
+import cProfile
+import io
+import logging
+import pstats
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+@contextmanager
+def profiled(output_dir: Path, top_n: int = 40) -> Iterator[None]:
+    """Profile the calling thread with cProfile.
+
+    Writes the full profile as a .prof file, which can be opened with e.g. snakeviz, and a text summary of the top_n functions by cumulative time. Work in background threads, e.g. fetching from Anki, is not included.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        profiler.dump_stats(output_dir / f"{stem}.prof")
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary).strip_dirs()
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top_n)
+        (output_dir / f"{stem}.txt").write_text(summary.getvalue())
+
+        log.info(f"Wrote profile to {output_dir / stem}.prof, and a summary to {stem}.txt")
@@ -0,0 +1,18 @@
+import threading
+
+import pytest
+
+from .background import run_in_background
+
+
+def test_run_in_background_returns_result_from_other_thread():
+    future = run_in_background(lambda: threading.current_thread().name)
+    assert future.result(timeout=5) != threading.current_thread().name
+
+
+def test_run_in_background_propagates_exceptions():
+    def fail() -> None:
+        raise ConnectionError("Anki is not running")
+
+    with pytest.raises(ConnectionError, match="Anki is not running"):
+        run_in_background(fail).result(timeout=5)
@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+from .background import run_in_background
+from .metrics import MetricsWriter, recording, stage
+
+
+def test_stages_are_summed_and_recorded_from_background_threads():
+    with recording() as recorder:
+        for _ in range(3):
+            with stage("read", n_items=1):
+                pass
+
+        def fetch() -> None:
+            with stage("remote_fetch") as timer:
+                timer.add_items(10)
+
+        run_in_background(fetch).result(timeout=5)
+
+    assert recorder.stages["read"].n_calls == 3
+    assert recorder.stages["read"].n_items == 3
+    assert recorder.stages["remote_fetch"].n_items == 10
+
+
+def test_stage_outside_recording_is_a_no_op():
+    with stage("read", n_items=1) as timer:
+        timer.add_items(1)
+
+
+def test_metrics_writer(tmp_path: Path):
+    writer = MetricsWriter(
+        jsonl_path=tmp_path / "metrics.jsonl", prometheus_textfile=tmp_path / "memium.prom"
+    )
+    for _ in range(2):
+        with recording() as recorder, stage("diff", n_items=5):
+            pass
+        writer.write(recorder)
+
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["stages"]["diff"]["n_items"] == 5
+    assert 'memium_stage_items{stage="diff"} 5' in (tmp_path / "memium.prom").read_text()
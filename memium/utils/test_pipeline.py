@@ -0,0 +1,53 @@
+import random
+import threading
+import time
+
+import pytest
+
+from .pipeline import PipelineStage, run_pipeline
+
+
+def test_run_pipeline_keeps_order():
+    def slow_square(x: int) -> int:
+        time.sleep(random.uniform(0, 0.002))
+        return x * x
+
+    results = run_pipeline(
+        range(200),
+        stages=[
+            PipelineStage("square", slow_square, workers=4),
+            PipelineStage("negate", lambda x: -x, workers=2),
+        ],
+        max_in_flight=8,
+    )
+    assert list(results) == [-(x * x) for x in range(200)]
+
+
+def test_run_pipeline_bounds_items_in_flight():
+    lock = threading.Lock()
+    n_taken = 0
+
+    def items():
+        nonlocal n_taken
+        for i in range(100):
+            with lock:
+                n_taken += 1
+            yield i
+
+    results = run_pipeline(
+        items(), stages=[PipelineStage("identity", lambda x: x, workers=4)], max_in_flight=5
+    )
+    for n_yielded, _ in enumerate(results, start=1):
+        time.sleep(0.001)
+        with lock:
+            assert n_taken - n_yielded <= 5
+
+
+def test_run_pipeline_propagates_exceptions():
+    def fail_on_three(x: int) -> int:
+        if x == 3:
+            raise ValueError("Could not parse 3")
+        return x
+
+    with pytest.raises(ValueError, match="Could not parse 3"):
+        list(run_pipeline(range(10), stages=[PipelineStage("parse", fail_on_three, workers=2)]))
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+from .profiling import profiled
+
+
+def test_profiled_writes_profile_and_summary(tmp_path: Path):
+    with profiled(tmp_path, top_n=5):
+        sorted(range(1000), key=lambda i: -i)
+
+    assert len(list(tmp_path.glob("profile_*.prof"))) == 1
+    summary = next(tmp_path.glob("profile_*.txt")).read_text()
+    assert "cumulative" in summary